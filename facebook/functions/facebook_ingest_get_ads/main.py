@@ -1,11 +1,12 @@
 import logging
 from google.cloud import secretmanager
 from google.cloud import firestore
-from elasticsearch import Elasticsearch, helpers
+from elasticsearch import Elasticsearch
 import requests
 import json
 import datetime
 import time
+import bulk
 
 # format logs
 formatter = '%(asctime)s - %(levelname)s - %(message)s'
@@ -109,7 +110,7 @@ def loop(token, after, errors):
                     },
                     "doc_as_upsert": True
                 })
-            helpers.bulk(es, actions)
+            bulk.write(es, actions)
             logger.info(' - '.join(['ADS INDEXED', str(num)]))
 
     return {"after": after, "errors": errors}
@@ -1,15 +1,18 @@
 import logging
 from google.cloud import secretmanager
 from google.cloud import bigquery
-from elasticsearch import Elasticsearch, helpers
+from google.cloud import firestore
+from elasticsearch import Elasticsearch
 import pytz
 import datetime
 import pandas
 import numpy as np
 import time
-import random
 import json
 import utilities
+import watermark
+import bigquery_reader
+import bulk
 
 # format logs
 formatter = '%(asctime)s - %(levelname)s - %(message)s'
@@ -26,6 +29,7 @@ elastic_password_data = secrets.access_secret_version(request={"name": "projects
 # connect to resources
 es = Elasticsearch(elastic_host, http_auth=(elastic_username_data, elastic_password_data), scheme="https", port=443)
 client = bigquery.Client()
+db = firestore.Client()
 
 # helper function to generate a new job config
 def gen_job_config():
@@ -33,181 +37,255 @@ def gen_job_config():
     job_config.use_legacy_sql = False
     return job_config
 
-# helper function to get values string from array of values
-def get_values_string(values):
-    values_string = ""
-    for value in values:
-        values_string += "("
-        try:
-            values_string += "'" + value + "'"
-        except:
-            values_string += str(value)
-        values_string += "), "
-    values_string = values_string[:-2]
-    return values_string
-
-# helper function to parse unaware date into datetime object in UTC
-def parse_date(date):
-    if date is None or date == "":
-        return None
-    else:
-        unaware = datetime.datetime.strptime(date, "%Y-%m-%d")
-        tz = pytz.timezone("America/New_York")
-        aware = tz.localize(unaware)
-        return aware.astimezone(pytz.utc)
+# number of unloaded rows staged in BigQuery on each loop
+batch_size = 250000
 
-# main helper function to help with looping
-def loop():
-
-    # randomly select loaded contributions table to get around 1000 inserts per day
-    loaded_contributions_tables = [
-        "loaded_contributions22_1",
-        "loaded_contributions22_2",
-        "loaded_contributions22_3",
-        "loaded_contributions22_4",
-        "loaded_contributions22_5",
-        "loaded_contributions22_6"
-    ]
-    loaded_contributions_table = random.choice(loaded_contributions_tables)
+# number of parallel streams used to read each staged slice
+read_streams = 4
 
-    # count total rows inserted
-    count = 0
+# number of parallel workers writing each slice to elasticsearch
+bulk_workers = 4
 
-    query_job = client.query("""
-    SELECT a.classification, a.donor_entity_tp, a.donor_name, a.donor_state, a.donor_zip_code, a.donor_employer, a.donor_occupation, a.source, a.source_cand_name, a.source_cand_pty_affiliation, a.source_cand_election_yr, a.source_cand_office_st, a.source_cand_office, a.source_cand_office_district, a.source_cand_ici, a.source_cand_pcc, a.source_cand_zip, a.source_cmte_nm, a.source_cmte_zip, a.source_cmte_dsgn, a.source_cmte_tp, a.source_cmte_pty_affiliation, a.source_cmte_filing_freq, a.source_org_tp, a.source_connected_org_nm, a.target, a.target_cmte_nm, a.target_cmte_zip, a.target_cmte_dsgn, a.target_cmte_tp, a.target_cmte_pty_affiliation, a.target_cmte_filing_freq, a.target_org_tp, a.target_connected_org_nm, a.transaction_dt, a.transaction_amt, a.amndt_ind, a.rpt_tp, a.transaction_pgi, a.transaction_tp, a.image_num, a.file_num, a.tran_id, a.sub_id
-    FROM `federal_fec.contributions_elastic22` a
-    LEFT JOIN `federal_fec.loaded_contributions22` b
-    ON a.sub_id = b.sub_id
-    WHERE b.sub_id IS NULL
-    LIMIT 1000
-    """, job_config=gen_job_config())
-    df = query_job.result().to_dataframe()
-    df = df.replace({np.nan: None})
-    assert query_job.state == "DONE"
+# columns used to build the nested parts of each document
+target_committee_columns = {
+    "target": "cmte_id",
+    "target_cmte_nm": "cmte_nm",
+    "target_cmte_zip": "cmte_zip",
+    "target_cmte_dsgn": "cmte_dsgn",
+    "target_cmte_tp": "cmte_tp",
+    "target_cmte_pty_affiliation": "cmte_pty_affiliation",
+    "target_cmte_filing_freq": "cmte_filing_freq",
+    "target_org_tp": "org_tp",
+    "target_connected_org_nm": "connected_org_nm"
+}
+donor_columns = {
+    "donor_entity_tp": "entity_tp",
+    "donor_name": "name",
+    "donor_state": "state",
+    "donor_zip_code": "zip_code",
+    "donor_employer": "employer",
+    "donor_occupation": "occupation"
+}
+source_candidate_columns = {
+    "source": "cand_id",
+    "source_cand_name": "cand_name",
+    "source_cand_pty_affiliation": "cand_pty_affiliation",
+    "source_cand_election_yr": "cand_election_yr",
+    "source_cand_office_st": "cand_office_st",
+    "source_cand_office": "cand_office",
+    "source_cand_office_district": "cand_office_district",
+    "source_cand_ici": "cand_ici",
+    "source_cand_pcc": "cand_pcc",
+    "source_cand_zip": "cand_zip"
+}
+source_committee_columns = {
+    "source": "cmte_id",
+    "source_cmte_nm": "cmte_nm",
+    "source_cmte_zip": "cmte_zip",
+    "source_cmte_dsgn": "cmte_dsgn",
+    "source_cmte_tp": "cmte_tp",
+    "source_cmte_pty_affiliation": "cmte_pty_affiliation",
+    "source_cmte_filing_freq": "cmte_filing_freq",
+    "source_org_tp": "org_tp",
+    "source_connected_org_nm": "connected_org_nm"
+}
+transaction_columns = ["transaction_amt", "amndt_ind", "rpt_tp", "transaction_pgi", "transaction_tp", "image_num", "file_num", "tran_id"]
+
+# helper function to parse a column of unaware dates into datetime objects in UTC
+def parse_dates(dates):
+    dates = pandas.to_datetime(dates.replace({"": None}), format="%Y-%m-%d")
+    dates = dates.dt.tz_localize("America/New_York").dt.tz_convert(pytz.utc)
+    return [None if pandas.isnull(date) else date.to_pydatetime() for date in dates]
+
+# helper function to process a column of names, only processing each distinct name once
+def process_names(names, mask):
+    unique = names[mask].unique()
+    processed = dict(zip(unique, utilities.process_names(unique)))
+    return [processed[name] if keep else None for name, keep in zip(names, mask)]
+
+# helper function to get a list of nested records from a group of columns
+def get_records(df, columns):
+    return df[list(columns)].rename(columns=columns).to_dict("records")
+
+# helper function to generate bulk actions column-wise from a dataframe of contributions
+def gen_actions(df):
+
+    # build each part of the documents one column group at a time
+    classifications = df["classification"].tolist()
+    is_donor = df["classification"].isin(["individual", "organization"]).tolist()
+    is_candidate = (df["classification"] == "candidate").tolist()
+    is_committee = (df["classification"] == "committee").tolist()
+    targets = get_records(df, target_committee_columns)
+    donors = get_records(df, donor_columns)
+    candidates = get_records(df, source_candidate_columns)
+    committees = get_records(df, source_committee_columns)
+    transactions = df[transaction_columns].to_dict("records")
+    transaction_dts = parse_dates(df["transaction_dt"])
+    processed_donor_names = process_names(df["donor_name"], is_donor)
+    processed_cand_names = process_names(df["source_cand_name"], is_candidate)
+    sub_ids = df["sub_id"].tolist()
+    now = datetime.datetime.now(datetime.timezone.utc)
 
-    values = []
-    actions = []
-    for index, row in df.iterrows():
+    # stitch the parts together row by row
+    for i, sub_id in enumerate(sub_ids):
+        source = {
+            "classification": classifications[i]
+        }
+        if is_donor[i]:
+            source["donor"] = donors[i]
+        elif is_candidate[i]:
+            source["candidate"] = candidates[i]
+        elif is_committee[i]:
+            source["committee"] = committees[i]
         doc = {
-            "source": {
-                "classification": row["classification"],
-            },
+            "source": source,
             "target": {
-                "committee": {
-                    "cmte_id": row["target"],
-                    "cmte_nm": row["target_cmte_nm"],
-                    "cmte_zip": row["target_cmte_zip"],
-                    "cmte_dsgn": row["target_cmte_dsgn"],
-                    "cmte_tp": row["target_cmte_tp"],
-                    "cmte_pty_affiliation": row["target_cmte_pty_affiliation"],
-                    "cmte_filing_freq": row["target_cmte_filing_freq"],
-                    "org_tp": row["target_org_tp"],
-                    "connected_org_nm": row["target_connected_org_nm"]
-                }
+                "committee": targets[i]
             },
-            "transaction_dt": parse_date(row["transaction_dt"]),
-            "transaction_amt": row["transaction_amt"],
-            "amndt_ind": row["amndt_ind"],
-            "rpt_tp": row["rpt_tp"],
-            "transaction_pgi": row["transaction_pgi"],
-            "transaction_tp": row["transaction_tp"],
-            "image_num": row["image_num"],
-            "file_num": row["file_num"],
-            "tran_id": row["tran_id"],
-            "sub_id": str(row["sub_id"])
+            "transaction_dt": transaction_dts[i],
+            **transactions[i],
+            "sub_id": str(sub_id)
         }
-        if doc["source"]["classification"] == "individual" or doc["source"]["classification"] == "organization":
-            doc["source"]["donor"] = {
-                "entity_tp": row["donor_entity_tp"],
-                "name": row["donor_name"],
-                "state": row["donor_state"],
-                "zip_code": row["donor_zip_code"],
-                "employer": row["donor_employer"],
-                "occupation": row["donor_occupation"]
-            }
-        elif doc["source"]["classification"] == "candidate":
-            doc["source"]["candidate"] = {
-                "cand_id": row["source"],
-                "cand_name": row["source_cand_name"],
-                "cand_pty_affiliation": row["source_cand_pty_affiliation"],
-                "cand_election_yr": row["source_cand_election_yr"],
-                "cand_office_st": row["source_cand_office_st"],
-                "cand_office": row["source_cand_office"],
-                "cand_office_district": row["source_cand_office_district"],
-                "cand_ici": row["source_cand_ici"],
-                "cand_pcc": row["source_cand_pcc"],
-                "cand_zip": row["source_cand_zip"]
-            }
-        elif doc["source"]["classification"] == "committee":
-            doc["source"]["committee"] = {
-                "cmte_id": row["source"],
-                "cmte_nm": row["source_cmte_nm"],
-                "cmte_zip": row["source_cmte_zip"],
-                "cmte_dsgn": row["source_cmte_dsgn"],
-                "cmte_tp": row["source_cmte_tp"],
-                "cmte_pty_affiliation": row["source_cmte_pty_affiliation"],
-                "cmte_filing_freq": row["source_cmte_filing_freq"],
-                "org_tp": row["source_org_tp"],
-                "connected_org_nm": row["source_connected_org_nm"]
-            }
-        processed_donor_name = None
-        if doc["source"]["classification"] == "individual" or doc["source"]["classification"] == "organization":
-            processed_donor_name = doc["source"]["donor"]["name"]
-            try:
-                processed_donor_name = utilities.process_name(processed_donor_name)
-            except:
-                pass
-        processed_cand_name = None
-        if doc["source"]["classification"] == "candidate":
-            processed_cand_name = doc["source"]["candidate"]["cand_name"]
-            try:
-                processed_cand_name = utilities.process_name(processed_cand_name)
-            except:
-                pass
         record = {
             "row": doc,
             "context": {
-                "last_bulked": datetime.datetime.now(datetime.timezone.utc),
-                "last_indexed": datetime.datetime.now(datetime.timezone.utc)
+                "last_bulked": now,
+                "last_indexed": now
             }
         }
-        if doc["transaction_dt"] is not None or processed_donor_name is not None or processed_cand_name is not None:
+        if transaction_dts[i] is not None or processed_donor_names[i] is not None or processed_cand_names[i] is not None:
             record["processed"] = dict()
-            if doc["transaction_dt"] is not None:
-                record["processed"]["date"] = doc["transaction_dt"]
-            if processed_donor_name is not None:
+            if transaction_dts[i] is not None:
+                record["processed"]["date"] = transaction_dts[i]
+            if processed_donor_names[i] is not None:
                 record["processed"]["source"] = {
                     "donor": {
-                        "name": processed_donor_name
+                        "name": processed_donor_names[i]
                     }
                 }
-            if processed_cand_name is not None:
+            if processed_cand_names[i] is not None:
                 record["processed"]["source"] = {
                     "candidate": {
-                        "cand_name": processed_cand_name
+                        "cand_name": processed_cand_names[i]
                     }
                 }
-        actions.append({
+        yield {
             "_op_type": "update",
             "_index": "federal_fec_contributions",
-            "_id": row["sub_id"],
+            "_id": sub_id,
             "doc": record,
             "doc_as_upsert": True
-        })
-        values.append(row["sub_id"])
-
-    if len(values) > 0:
-        helpers.bulk(es, actions)
-        values_string = get_values_string(values)
-        query_job = client.query(f"""
-        INSERT INTO `federal_fec.{loaded_contributions_table}` (sub_id)
-        VALUES %s
-        """ % (values_string), job_config=gen_job_config())
-        query_job.result()
-        assert query_job.state == "DONE"
-        count += query_job.num_dml_affected_rows
-
-    return count
+        }
+
+# helper function to generate bulk actions from a stream of record batches, keeping track of the rows seen and the last one in cursor order
+def gen_stream_actions(batches, stats):
+    for batch in batches:
+        df = batch.to_pandas()
+        if len(df) == 0:
+            continue
+        last = df.sort_values(["loaded_at", "sub_id"]).iloc[-1]
+        stats["count"] += len(df)
+        stats["cursor"] = max(stats["cursor"], (last["loaded_at"].to_pydatetime(), int(last["sub_id"])))
+        df = df.replace({np.nan: None})
+        yield from gen_actions(df)
+
+# helper function to get the version of the contributions delta table, so that a new delta starts over from the beginning
+def get_delta_version():
+    return client.get_table(client.dataset('federal_fec').table("contributions_delta22")).modified.isoformat()
+
+# time stamped on contributions that were in contributions22 before it kept loaded_at, which sort before every contribution loaded since
+epoch = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+# helper function to get the cursor of the last loaded contribution, as the time it was loaded into BigQuery and its sub_id
+# a watermark from before the cursor only kept the sub_id, which carries on through the contributions stamped with the epoch
+def get_cursor(ref):
+    cursor = watermark.get_watermark(ref, "cursor", None)
+    if cursor is None:
+        return epoch, watermark.get_watermark(ref, "sub_id", 0)
+    return datetime.datetime.fromisoformat(cursor["loaded_at"]), cursor["sub_id"]
+
+# helper function to save the cursor of the last loaded contribution
+def set_cursor(ref, cursor):
+    watermark.set_watermark(ref, "cursor", {
+        "loaded_at": cursor[0].isoformat(),
+        "sub_id": cursor[1]
+    })
+
+# main helper function to help with looping
+# contributions are paged in the order they were loaded into BigQuery, so the changed contributions from a delta and the new ones from a rebuild come after the cursor
+def loop(ref):
+
+    # get the last loaded contribution
+    cursor = get_cursor(ref)
+
+    job_config = gen_job_config()
+    job_config.query_parameters = [
+        bigquery.ScalarQueryParameter("loaded_at", "TIMESTAMP", cursor[0]),
+        bigquery.ScalarQueryParameter("sub_id", "INT64", cursor[1]),
+        bigquery.ScalarQueryParameter("batch_size", "INT64", batch_size)
+    ]
+    query_job = client.query("""
+    SELECT a.classification, a.donor_entity_tp, a.donor_name, a.donor_state, a.donor_zip_code, a.donor_employer, a.donor_occupation, a.source, a.source_cand_name, a.source_cand_pty_affiliation, a.source_cand_election_yr, a.source_cand_office_st, a.source_cand_office, a.source_cand_office_district, a.source_cand_ici, a.source_cand_pcc, a.source_cand_zip, a.source_cmte_nm, a.source_cmte_zip, a.source_cmte_dsgn, a.source_cmte_tp, a.source_cmte_pty_affiliation, a.source_cmte_filing_freq, a.source_org_tp, a.source_connected_org_nm, a.target, a.target_cmte_nm, a.target_cmte_zip, a.target_cmte_dsgn, a.target_cmte_tp, a.target_cmte_pty_affiliation, a.target_cmte_filing_freq, a.target_org_tp, a.target_connected_org_nm, a.transaction_dt, a.transaction_amt, a.amndt_ind, a.rpt_tp, a.transaction_pgi, a.transaction_tp, a.image_num, a.file_num, a.tran_id, a.sub_id, a.loaded_at
+    FROM `federal_fec.contributions_elastic22` a
+    WHERE a.loaded_at > @loaded_at OR (a.loaded_at = @loaded_at AND a.sub_id > @sub_id)
+    ORDER BY a.loaded_at, a.sub_id
+    LIMIT @batch_size
+    """, job_config=job_config)
+    rows = query_job.result()
+    assert query_job.state == "DONE"
+    if rows.total_rows == 0:
+        return 0
+
+    # stream the staged slice straight into elasticsearch
+    destination = query_job.destination
+    stats = {
+        "count": 0,
+        "cursor": cursor
+    }
+    batches = bigquery_reader.read_batches(".".join([destination.project, destination.dataset_id, destination.table_id]), max_stream_count=read_streams)
+
+    # bulk.write raises if any document failed, so the cursor stays put and the slice is tried again
+    load_stats = bulk.write(es, gen_stream_actions(batches, stats), workers=bulk_workers)
+    logger.info(' - '.join(['SLICE OF CONTRIBUTIONS INDEXED', str(load_stats["indexed"]), str(int(load_stats["rate"])) + ' docs/s']))
+
+    # only move the cursor once the whole slice is indexed
+    set_cursor(ref, stats["cursor"])
+
+    return stats["count"]
+
+# helper function to delete a slice of the contributions that the delta table marks as deleted
+def loop_deletes(ref):
+
+    # get the last deleted sub_id
+    last_sub_id = watermark.get_watermark(ref, "deleted_sub_id", 0)
+
+    job_config = gen_job_config()
+    job_config.query_parameters = [
+        bigquery.ScalarQueryParameter("last_sub_id", "INT64", last_sub_id),
+        bigquery.ScalarQueryParameter("batch_size", "INT64", batch_size)
+    ]
+    query_job = client.query("""
+    SELECT sub_id
+    FROM `federal_fec.contributions_delta22`
+    WHERE change_type = 'delete' AND sub_id > @last_sub_id
+    ORDER BY sub_id
+    LIMIT @batch_size
+    """, job_config=job_config)
+    sub_ids = [row["sub_id"] for row in query_job.result()]
+    assert query_job.state == "DONE"
+    if len(sub_ids) == 0:
+        return 0
+
+    # delete the slice from elasticsearch
+    actions = ({"_op_type": "delete", "_index": "federal_fec_contributions", "_id": sub_id} for sub_id in sub_ids)
+    # deletes of documents that were never indexed are only counted, and bulk.write raises if any other delete failed, so the watermark stays put and the slice is tried again
+    load_stats = bulk.write(es, actions, workers=bulk_workers, ignore_status=(404,))
+    logger.info(' - '.join(['SLICE OF CONTRIBUTIONS DELETED', str(load_stats["indexed"]), str(load_stats["ignored"]) + ' already gone', str(int(load_stats["rate"])) + ' docs/s']))
+
+    # only move the watermark once the whole slice is deleted
+    watermark.set_watermark(ref, "deleted_sub_id", sub_ids[-1])
+
+    return len(sub_ids)
 
 # load contributions from BigQuery into Elasticsearch
 def federal_fec_compute_load_elastic_contributions(message, context):
@@ -218,12 +296,39 @@ def federal_fec_compute_load_elastic_contributions(message, context):
     # count rows loaded per batch
     count = 0
 
+    # also delete the contributions that the last delta removed if asked
+    delta = False
+    if 'attributes' in message:
+        if message['attributes'] is not None:
+            if "delta" in message["attributes"]:
+                delta = True
+
+    # get the watermark document, starting over from the beginning if asked
+    ref = watermark.get_ref(db, "contributions22")
+    if 'attributes' in message:
+        if message['attributes'] is not None:
+            if "reset" in message["attributes"]:
+                set_cursor(ref, (epoch, 0))
+                watermark.set_watermark(ref, "delta_version", None)
+
+    # start the delta watermarks over whenever there is a new delta
+    if delta:
+        delta_version = get_delta_version()
+        if watermark.get_watermark(ref, "delta_version", None) != delta_version:
+            watermark.set_watermark(ref, "deleted_sub_id", 0)
+            watermark.set_watermark(ref, "delta_version", delta_version)
+
     # get start time
     start = time.time()
 
-    # loop for 520s
+    # loop for 520s, moving on to the deletes in delta mode once there is nothing left to load
+    upserted = False
     while time.time()-start < 520:
-        count = loop()
+        if not upserted:
+            count = loop(ref)
+            upserted = count == 0
+        if upserted and delta:
+            count = loop_deletes(ref)
         loaded += count
         if count == 0:
             break
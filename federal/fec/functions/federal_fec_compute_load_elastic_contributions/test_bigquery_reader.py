@@ -0,0 +1,87 @@
+import os
+import time
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import pyarrow
+import pyarrow.parquet as pq
+
+import bigquery_reader
+
+# small table of rows with the types a staged slice has
+table = pyarrow.table({
+    "id": pyarrow.array(["%05d" % i for i in range(1000)]),
+    "transaction_amt": pyarrow.array([i / 4 for i in range(1000)], pyarrow.float64()),
+    "file_num": pyarrow.array([None if i % 7 == 0 else i for i in range(1000)], pyarrow.int64())
+})
+
+# helper function to wait for the threads started since before to finish
+def wait_for_threads(before, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if len([thread for thread in threading.enumerate() if thread not in before]) == 0:
+            return True
+        time.sleep(0.05)
+    return False
+
+class TestReadBatches(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+        # write the table as a parquet file of 10 row groups and an arrow file of 10 record batches
+        self.parquet = os.path.join(self.directory.name, "slice.parquet")
+        pq.write_table(table, self.parquet, row_group_size=100)
+        self.arrow = os.path.join(self.directory.name, "slice.arrow")
+        with pyarrow.OSFile(self.arrow, "wb") as sink:
+            with pyarrow.ipc.new_file(sink, table.schema) as writer:
+                for batch in table.to_batches(max_chunksize=100):
+                    writer.write_batch(batch)
+
+    # helper function to read a file and check every row comes back once with its types
+    def check_read(self, path, **kwargs):
+        batches = list(bigquery_reader.read_batches(path, **kwargs))
+        read = pyarrow.Table.from_batches(batches)
+        self.assertEqual(read.schema, table.schema)
+        self.assertEqual(read.sort_by("id").to_pylist(), table.to_pylist())
+        return batches
+
+    def test_parquet(self):
+        self.check_read(self.parquet)
+        self.check_read(self.parquet, max_stream_count=1)
+        self.check_read(self.parquet, max_stream_count=32, max_queued_batches=1)
+
+    def test_arrow(self):
+        self.assertEqual(len(self.check_read(self.arrow)), 10)
+        self.check_read(self.arrow, max_stream_count=3, max_queued_batches=2)
+
+    def test_streams(self):
+        streams = bigquery_reader.get_local_streams(self.parquet, 4)
+        self.assertEqual([args[1] for target, args in streams], [[0, 4, 8], [1, 5, 9], [2, 6], [3, 7]])
+        self.assertEqual(len(bigquery_reader.get_local_streams(self.arrow, 32)), 10)
+
+    def test_stop_early(self):
+        before = threading.enumerate()
+        batches = bigquery_reader.read_batches(self.parquet, max_stream_count=4, max_queued_batches=1)
+        next(batches)
+        batches.close()
+        self.assertTrue(wait_for_threads(before, 5))
+
+    def test_stream_error(self):
+
+        # helper function to read one batch and then fail, the way a dropped read stream would
+        def read_arrow_stream(path, indexes, put):
+            put(table.to_batches(max_chunksize=100)[0])
+            raise OSError("stream dropped")
+
+        before = threading.enumerate()
+        with mock.patch.object(bigquery_reader, "read_arrow_stream", read_arrow_stream):
+            with self.assertRaises(OSError):
+                list(bigquery_reader.read_batches(self.arrow, max_stream_count=2))
+        self.assertTrue(wait_for_threads(before, 5))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,57 +1,24 @@
-def remove_titles_end(name):
-    if name.endswith(" MR"):
-        name = name[:-3]
-    elif name.endswith(" MS"):
-        name = name[:-3]
-    elif name.endswith(" MRS"):
-        name = name[:-4]
-    elif name.endswith(" HON"):
-        name = name[:-4]
-    elif name.endswith(" ESQ"):
-        name = name[:-4]
-    elif name.endswith(" REV"):
-        name = name[:-4]
-    elif name.endswith(" FR"):
-        name = name[:-3]
-    elif name.endswith(" DR"):
-        name = name[:-3]
-    elif name.endswith(" DR ND"):
-        name = name[:-6]
-    elif name.endswith(" DR DO"):
-        name = name[:-6]
-    elif name.endswith(" MD"):
-        name = name[:-3]
-    elif name.endswith(" JD"):
-        name = name[:-3]
-    elif name.endswith(" MBA"):
-        name = name[:-4]
-    elif name.endswith(" PHD"):
-        name = name[:-4]
-    elif name.endswith(" RET"):
-        name = name[:-4]
-    elif name.endswith(" (RET)"):
-        name = name[:-6]
-    elif name.endswith(" MSGT"):
-        name = name[:-5]
-    elif name.endswith(" USAF"):
-        name = name[:-5]
-    elif name.endswith(" USN"):
-        name = name[:-4]
-    elif name.endswith(" CDR"):
-        name = name[:-4]
-    elif name.endswith(" SGT"):
-        name = name[:-4]
-    elif name.endswith(" MAJ"):
-        name = name[:-4]
-    elif name.endswith(" THE"):
-        name = name[:-4]
-    return name
+import re
+import functools
+
+# titles that get stripped from the end of names, each preceded by a space
+titles = ["MR", "MS", "MRS", "HON", "ESQ", "REV", "FR", "DR", "DR ND", "DR DO", "MD", "JD", "MBA", "PHD", "RET", "(RET)", "MSGT", "USAF", "USN", "CDR", "SGT", "MAJ", "THE"]
+
+# precompiled patterns that strip up to n trailing titles in one pass
+titles_end = {n: re.compile("(?: (?:%s)){1,%d}\\Z" % ("|".join([re.escape(title) for title in titles]), n)) for n in range(1, 5)}
+
+# generational suffixes that get moved to the end of reordered names
+generations = ["JR", "SR", "II", "III", "IV"]
+
+def remove_titles_end(name, n=1):
+    return titles_end[n].sub("", name, count=1)
 
 def remove_titles_start(name):
     if name.startswith("DR "):
         name = name[3:]
     return name
 
+@functools.lru_cache(maxsize=100000)
 def process_name(name):
     name = name.upper()
     name = name.replace(".", "")
@@ -59,28 +26,28 @@ def process_name(name):
         name = name.replace(", LLC", " LLC")
     if name.endswith(", INC"):
         name = name.replace(", INC", " INC")
-    name = remove_titles_end(name)
-    name = remove_titles_end(name)
-    name = remove_titles_end(name)
+    name = remove_titles_end(name, 3)
     if "," in name:
-        if name.endswith(" JR"):
-            name = name[:-3]
-            name = remove_titles_end(remove_titles_end(remove_titles_end(remove_titles_end(name.split(",")[1])))) + " " + remove_titles_end(remove_titles_end(remove_titles_end(remove_titles_end(name.split(",")[0])))) + " JR"
-        elif name.endswith(" SR"):
-            name = name[:-3]
-            name = remove_titles_end(remove_titles_end(remove_titles_end(remove_titles_end(name.split(",")[1])))) + " " + remove_titles_end(remove_titles_end(remove_titles_end(remove_titles_end(name.split(",")[0])))) + " SR"
-        elif name.endswith(" II"):
-            name = name[:-3]
-            name = remove_titles_end(remove_titles_end(remove_titles_end(remove_titles_end(name.split(",")[1])))) + " " + remove_titles_end(remove_titles_end(remove_titles_end(remove_titles_end(name.split(",")[0])))) + " II"
-        elif name.endswith(" III"):
-            name = name[:-4]
-            name = remove_titles_end(remove_titles_end(remove_titles_end(remove_titles_end(name.split(",")[1])))) + " " + remove_titles_end(remove_titles_end(remove_titles_end(remove_titles_end(name.split(",")[0])))) + " III"
-        elif name.endswith(" IV"):
-            name = name[:-3]
-            name = remove_titles_end(remove_titles_end(remove_titles_end(remove_titles_end(name.split(",")[1])))) + " " + remove_titles_end(remove_titles_end(remove_titles_end(remove_titles_end(name.split(",")[0])))) + " IV"
-        else:
-            name = remove_titles_end(remove_titles_end(remove_titles_end(remove_titles_end(name.split(",")[1])))) + " " + remove_titles_end(remove_titles_end(remove_titles_end(remove_titles_end(name.split(",")[0]))))
+        generation = None
+        for suffix in generations:
+            if name.endswith(" " + suffix):
+                generation = suffix
+                name = name[:-len(suffix)-1]
+                break
+        name = remove_titles_end(name.split(",")[1], 4) + " " + remove_titles_end(name.split(",")[0], 4)
+        if generation is not None:
+            name = name + " " + generation
     name = name.replace("  ", " ")
     name = name.strip()
     name = remove_titles_start(name)
     return name
+
+# process a whole column of names, leaving any names that cannot be processed as they are
+def process_names(names):
+    processed = []
+    for name in names:
+        try:
+            processed.append(process_name(name))
+        except:
+            processed.append(name)
+    return processed
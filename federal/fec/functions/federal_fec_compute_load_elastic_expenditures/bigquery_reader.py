@@ -0,0 +1,106 @@
+import os
+import queue
+import threading
+import pyarrow
+import pyarrow.parquet as pq
+from google.cloud import bigquery_storage
+
+# marker put on the queue when a stream is finished
+done = object()
+
+# helper function to read one bigquery read stream into the queue
+def read_bigquery_stream(read_client, session, stream, put):
+    reader = read_client.read_rows(stream.name)
+    for page in reader.rows(session).pages:
+        put(page.to_arrow())
+
+# helper function to read some of the row groups of a local parquet file into the queue
+def read_parquet_stream(path, row_groups, put):
+    if len(row_groups) == 0:
+        return
+    for batch in pq.ParquetFile(path).iter_batches(row_groups=row_groups):
+        put(batch)
+
+# helper function to read some of the record batches of a local arrow file into the queue
+def read_arrow_stream(path, indexes, put):
+    with pyarrow.memory_map(path) as source:
+        reader = pyarrow.ipc.open_file(source)
+        for i in indexes:
+            put(reader.get_batch(i))
+
+# helper function to split a local file into streams of row groups or record batches
+def get_local_streams(path, max_stream_count):
+    if path.endswith(".parquet"):
+        parts = pq.ParquetFile(path).num_row_groups
+        target = read_parquet_stream
+    else:
+        with pyarrow.memory_map(path) as source:
+            parts = pyarrow.ipc.open_file(source).num_record_batches
+        target = read_arrow_stream
+    streams = min(max_stream_count, max(parts, 1))
+    return [(target, (path, list(range(i, parts, streams)))) for i in range(streams)]
+
+# helper function to open read streams over a bigquery table given as project.dataset.table
+def get_bigquery_streams(table, max_stream_count, selected_fields):
+    project, dataset, table = table.split(".")
+    read_client = bigquery_storage.BigQueryReadClient()
+    requested_session = bigquery_storage.types.ReadSession(
+        table="projects/%s/datasets/%s/tables/%s" % (project, dataset, table),
+        data_format=bigquery_storage.types.DataFormat.ARROW
+    )
+    if selected_fields is not None:
+        requested_session.read_options.selected_fields = selected_fields
+    session = read_client.create_read_session(parent="projects/%s" % project, read_session=requested_session, max_stream_count=max_stream_count)
+    return [(read_bigquery_stream, (read_client, session, stream)) for stream in session.streams]
+
+# stream arrow record batches from a bigquery table or a local parquet/arrow file
+# batches are read on parallel streams and handed over through a bounded queue, so memory stays flat however big the table is
+def read_batches(source, max_stream_count=4, max_queued_batches=8, selected_fields=None):
+
+    # open the streams
+    if os.path.exists(source):
+        streams = get_local_streams(source, max_stream_count)
+    else:
+        streams = get_bigquery_streams(source, max_stream_count, selected_fields)
+    if len(streams) == 0:
+        return
+
+    # read every stream on its own thread
+    batches = queue.Queue(maxsize=max_queued_batches)
+    stopped = threading.Event()
+    def put(item):
+        while not stopped.is_set():
+            try:
+                batches.put(item, timeout=1)
+                return
+            except queue.Full:
+                pass
+        raise InterruptedError()
+    def run(target, args):
+        try:
+            target(*args, put)
+            put(done)
+        except InterruptedError:
+            pass
+        except Exception as e:
+            try:
+                put(e)
+            except InterruptedError:
+                pass
+    threads = [threading.Thread(target=run, args=stream, daemon=True) for stream in streams]
+    for thread in threads:
+        thread.start()
+
+    # hand batches over until every stream is done
+    try:
+        remaining = len(threads)
+        while remaining > 0:
+            item = batches.get()
+            if item is done:
+                remaining -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+    finally:
+        stopped.set()
@@ -0,0 +1,157 @@
+import logging
+import json
+import time
+import datetime
+import itertools
+import collections
+import threading
+from elasticsearch import helpers
+
+logger = logging.getLogger(__name__)
+
+# raised when documents failed to index, once every action has been tried and the failures are in the dead letter store
+class BulkWriteError(RuntimeError):
+
+    def __init__(self, stats):
+        super().__init__(str(stats["failed"]) + " documents failed to index")
+        self.stats = stats
+
+# helper function to describe an action that failed, with the action itself as a string so it can be replayed
+def get_dead_letter(action, result, failed_at):
+    op_type, info = next(iter(result.items()))
+    return {
+        "op_type": op_type,
+        "index": action.get("_index"),
+        "id": None if action.get("_id") is None else str(action.get("_id")),
+        "status": str(info.get("status")),
+        "error": json.dumps(info.get("error"), default=str),
+        "action": json.dumps(action, default=str),
+        "failed_at": failed_at
+    }
+
+# dead letter store that logs actions that failed to index
+def log_dead_letter(failures):
+    failed_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    for action, result in failures:
+        logger.error(' - '.join(['BULK FAILURE', json.dumps(get_dead_letter(action, result, failed_at))]))
+
+# dead letter store that keeps actions that failed to index in an elasticsearch index of their own
+# the action is kept as a string, so a document that broke the mapping of its index cannot break this one, and it is logged if it cannot be kept
+class ElasticDeadLetter:
+
+    def __init__(self, es, index="bulk_dead_letters"):
+        self.es = es
+        self.index = index
+
+    def __call__(self, failures):
+        failed_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        docs = [{"_op_type": "index", "_index": self.index, "_source": get_dead_letter(action, result, failed_at)} for action, result in failures]
+        try:
+            helpers.bulk(self.es, docs)
+        except Exception as e:
+            logger.error(' - '.join(['COULD NOT STORE BULK FAILURES', str(e)]))
+            log_dead_letter(failures)
+
+# dead letter store that appends actions that failed to index to a jsonl file
+class JsonlDeadLetter:
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def __call__(self, failures):
+        failed_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        with self.lock:
+            with open(self.path, "a") as f:
+                for action, result in failures:
+                    f.write(json.dumps(get_dead_letter(action, result, failed_at)) + "\n")
+
+# wraps an iterator so several workers can pull from it, one chunk at a time
+class SharedIterator:
+
+    def __init__(self, iterable):
+        self.iterator = iter(iterable)
+        self.lock = threading.Lock()
+
+    def take(self, n):
+        with self.lock:
+            return list(itertools.islice(self.iterator, n))
+
+# helper function to send actions to elasticsearch and pair every result with the action it came from
+# streaming_bulk only keeps its results in the order of the actions when it does not retry, so retries are left to the caller
+def send(es, actions, chunk_size, max_chunk_bytes):
+    pending = collections.deque()
+    def pull():
+        for action in actions:
+            pending.append(action)
+            yield action
+    for ok, result in helpers.streaming_bulk(es, pull(), chunk_size=chunk_size, max_chunk_bytes=max_chunk_bytes, max_retries=0, raise_on_error=False, raise_on_exception=False):
+        yield ok, result, pending.popleft()
+
+# write actions to elasticsearch on parallel workers and return throughput counters
+# actions are pulled lazily a chunk at a time as workers free up, so a generator is never materialized, and 429s are retried with exponential backoff
+# actions that still fail go to the dead letter store, by default an index next to the data, and unless told otherwise the write raises once every action has been tried
+# failures with a status in ignore_status, like a 404 on a delete, are only counted
+def write(es, actions, workers=4, chunk_size=500, max_chunk_bytes=10*1024*1024, max_retries=5, initial_backoff=2, max_backoff=60, dead_letter=None, raise_on_failure=True, ignore_status=()):
+
+    if dead_letter is None:
+        dead_letter = ElasticDeadLetter(es)
+    actions = SharedIterator(actions)
+    stats = {
+        "indexed": 0,
+        "ignored": 0,
+        "failed": 0
+    }
+    errors = []
+    lock = threading.Lock()
+
+    # each worker sends one chunk of the shared actions at a time, retrying the ones that were throttled before moving on
+    def work():
+        try:
+            while True:
+                chunk = actions.take(chunk_size)
+                if len(chunk) == 0:
+                    break
+                for attempt in range(max_retries + 1):
+                    throttled = []
+                    failures = []
+                    counts = collections.Counter()
+                    for ok, result, action in send(es, chunk, chunk_size, max_chunk_bytes):
+                        status = next(iter(result.values())).get("status")
+                        if ok:
+                            counts["indexed"] += 1
+                        elif status in ignore_status:
+                            counts["ignored"] += 1
+                        elif status == 429 and attempt < max_retries:
+                            throttled.append(action)
+                        else:
+                            counts["failed"] += 1
+                            failures.append((action, result))
+                    with lock:
+                        for key in counts:
+                            stats[key] += counts[key]
+                    if len(failures) > 0:
+                        dead_letter(failures)
+                    if len(throttled) == 0:
+                        break
+                    time.sleep(min(max_backoff, initial_backoff * 2 ** attempt))
+                    chunk = throttled
+        except Exception as e:
+            errors.append(e)
+
+    # run the workers until the actions run out
+    start = time.time()
+    threads = [threading.Thread(target=work) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if len(errors) > 0:
+        raise errors[0]
+
+    # get throughput counters
+    stats["elapsed"] = time.time() - start
+    stats["rate"] = stats["indexed"] / stats["elapsed"] if stats["elapsed"] > 0 else 0
+    if raise_on_failure and stats["failed"] > 0:
+        raise BulkWriteError(stats)
+    return stats
@@ -1,15 +1,18 @@
 import logging
 from google.cloud import secretmanager
 from google.cloud import bigquery
-from elasticsearch import Elasticsearch, helpers
+from google.cloud import firestore
+from elasticsearch import Elasticsearch
 import pytz
 import datetime
 import pandas
 import numpy as np
 import time
-import random
 import json
 import utilities
+import watermark
+import bigquery_reader
+import bulk
 
 # format logs
 formatter = '%(asctime)s - %(levelname)s - %(message)s'
@@ -26,6 +29,7 @@ elastic_password_data = secrets.access_secret_version(request={"name": "projects
 # connect to resources
 es = Elasticsearch(elastic_host, http_auth=(elastic_username_data, elastic_password_data), scheme="https", port=443)
 client = bigquery.Client()
+db = firestore.Client()
 
 # helper function to generate a new job config
 def gen_job_config():
@@ -33,19 +37,6 @@ def gen_job_config():
     job_config.use_legacy_sql = False
     return job_config
 
-# helper function to get values string from array of values
-def get_values_string(values):
-    values_string = ""
-    for value in values:
-        values_string += "("
-        try:
-            values_string += "'" + value + "'"
-        except:
-            values_string += str(value)
-        values_string += "), "
-    values_string = values_string[:-2]
-    return values_string
-
 # helper function to parse unaware date into datetime object in UTC
 def parse_date(date):
     if date is None or date == "":
@@ -56,34 +47,17 @@ def parse_date(date):
         aware = tz.localize(unaware)
         return aware.astimezone(pytz.utc)
 
-# main helper function to help with looping
-def loop():
+# number of unloaded rows staged in BigQuery on each loop
+batch_size = 100000
 
-    # randomly select loaded contributions table to get around 1000 inserts per day
-    loaded_expenditures_tables = [
-        "loaded_expenditures22_1",
-        "loaded_expenditures22_2",
-        "loaded_expenditures22_3"
-    ]
-    loaded_expenditures_table = random.choice(loaded_expenditures_tables)
+# number of parallel streams used to read each staged slice
+read_streams = 4
 
-    # count total rows inserted
-    count = 0
+# number of parallel workers writing each slice to elasticsearch
+bulk_workers = 4
 
-    query_job = client.query("""
-    SELECT a.id, a.type, a.cmte_id, a.cmte_nm, a.cmte_zip, a.cmte_dsgn, a.cmte_tp, a.cmte_pty_affiliation, a.cmte_filing_freq, a.org_tp, a.connected_org_nm, a.transaction_dt, a.transaction_amt, a.purpose, a.sup_opp, a.cand_id, a.cand_name, a.cand_pty_affiliation, a.cand_election_yr, a.cand_office_st, a.cand_office, a.cand_office_district, a.cand_ici, a.cand_pcc, a.cand_zip, a.category, a.category_desc, a.payee, a.entity_tp, a.state, a.zip_code, a.transaction_pgi, a.amndt_ind, a.image_num, a.file_num, a.tran_id, a.line_num, a.rpt_yr, a.rpt_tp, a.form_tp_cd, a.sched_tp_cd, a.rec_dt, a.prev_file_num, a.back_ref_tran_id, a.sub_id
-    FROM `federal_fec.expenditures22` a
-    LEFT JOIN `federal_fec.loaded_expenditures22` b
-    ON a.id = b.id
-    WHERE b.id IS NULL
-    LIMIT 1000
-    """, job_config=gen_job_config())
-    df = query_job.result().to_dataframe()
-    df = df.replace({np.nan: None})
-    assert query_job.state == "DONE"
-
-    values = []
-    actions = []
+# helper function to generate bulk actions from a dataframe of expenditures
+def gen_actions(df):
     for index, row in df.iterrows():
         doc = {
             "type": row["type"],
@@ -163,26 +137,84 @@ def loop():
             record["processed"]["content"] = {
                 "cand_name": processed_cand_name
             }
-        actions.append({
+        yield {
             "_op_type": "index",
             "_index": "federal_fec_expenditures",
             "_id": row["id"],
             "_source": record
-        })
-        values.append(row["id"])
-
-    if len(values) > 0:
-        helpers.bulk(es, actions)
-        values_string = get_values_string(values)
-        query_job = client.query(f"""
-        INSERT INTO `federal_fec.{loaded_expenditures_table}` (id)
-        VALUES %s
-        """ % (values_string), job_config=gen_job_config())
-        query_job.result()
-        assert query_job.state == "DONE"
-        count += query_job.num_dml_affected_rows
-
-    return count
+        }
+
+# helper function to generate bulk actions from a stream of record batches, keeping track of the rows seen and the last one in cursor order
+def gen_stream_actions(batches, stats):
+    for batch in batches:
+        df = batch.to_pandas()
+        if len(df) == 0:
+            continue
+        last = df.sort_values(["loaded_at", "id"]).iloc[-1]
+        stats["count"] += len(df)
+        stats["cursor"] = max(stats["cursor"], (last["loaded_at"].to_pydatetime(), last["id"]))
+        df = df.replace({np.nan: None})
+        yield from gen_actions(df)
+
+# time stamped on expenditures that were in expenditures22 before it kept loaded_at, which sort before every expenditure loaded since
+epoch = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+# helper function to get the cursor of the last loaded expenditure, as the time it was loaded into BigQuery and its id
+# a watermark from before the cursor only kept the id, which carries on through the expenditures stamped with the epoch
+def get_cursor(ref):
+    cursor = watermark.get_watermark(ref, "cursor", None)
+    if cursor is None:
+        return epoch, watermark.get_watermark(ref, "id", "")
+    return datetime.datetime.fromisoformat(cursor["loaded_at"]), cursor["id"]
+
+# helper function to save the cursor of the last loaded expenditure
+def set_cursor(ref, cursor):
+    watermark.set_watermark(ref, "cursor", {
+        "loaded_at": cursor[0].isoformat(),
+        "id": cursor[1]
+    })
+
+# main helper function to help with looping
+# ids mix sub_ids with file_num-tran_id and do not grow over time, so expenditures are paged in the order they were first loaded into BigQuery and the id only orders the ones loaded together
+def loop(ref):
+
+    # get the last loaded expenditure
+    cursor = get_cursor(ref)
+
+    job_config = gen_job_config()
+    job_config.query_parameters = [
+        bigquery.ScalarQueryParameter("loaded_at", "TIMESTAMP", cursor[0]),
+        bigquery.ScalarQueryParameter("id", "STRING", cursor[1]),
+        bigquery.ScalarQueryParameter("batch_size", "INT64", batch_size)
+    ]
+    query_job = client.query("""
+    SELECT a.id, a.type, a.cmte_id, a.cmte_nm, a.cmte_zip, a.cmte_dsgn, a.cmte_tp, a.cmte_pty_affiliation, a.cmte_filing_freq, a.org_tp, a.connected_org_nm, a.transaction_dt, a.transaction_amt, a.purpose, a.sup_opp, a.cand_id, a.cand_name, a.cand_pty_affiliation, a.cand_election_yr, a.cand_office_st, a.cand_office, a.cand_office_district, a.cand_ici, a.cand_pcc, a.cand_zip, a.category, a.category_desc, a.payee, a.entity_tp, a.state, a.zip_code, a.transaction_pgi, a.amndt_ind, a.image_num, a.file_num, a.tran_id, a.line_num, a.rpt_yr, a.rpt_tp, a.form_tp_cd, a.sched_tp_cd, a.rec_dt, a.prev_file_num, a.back_ref_tran_id, a.sub_id, a.loaded_at
+    FROM `federal_fec.expenditures22` a
+    WHERE a.loaded_at > @loaded_at OR (a.loaded_at = @loaded_at AND a.id > @id)
+    ORDER BY a.loaded_at, a.id
+    LIMIT @batch_size
+    """, job_config=job_config)
+    rows = query_job.result()
+    assert query_job.state == "DONE"
+    if rows.total_rows == 0:
+        return 0
+
+    # stream the staged slice straight into elasticsearch
+    destination = query_job.destination
+    stats = {
+        "count": 0,
+        "cursor": cursor
+    }
+    batches = bigquery_reader.read_batches(".".join([destination.project, destination.dataset_id, destination.table_id]), max_stream_count=read_streams)
+
+    # bulk.write raises if any document failed, so the cursor stays put and the slice is tried again
+    load_stats = bulk.write(es, gen_stream_actions(batches, stats), workers=bulk_workers)
+    logger.info(' - '.join(['SLICE OF EXPENDITURES INDEXED', str(load_stats["indexed"]), str(int(load_stats["rate"])) + ' docs/s']))
+
+    # only move the cursor once the whole slice is indexed
+    set_cursor(ref, stats["cursor"])
+
+    return stats["count"]
 
 # load expenditures from BigQuery into Elasticsearch
 def federal_fec_compute_load_elastic_expenditures(message, context):
@@ -193,13 +225,20 @@ def federal_fec_compute_load_elastic_expenditures(message, context):
     # count rows loaded per batch
     count = 0
 
+    # get the watermark document, starting over from the beginning if asked
+    ref = watermark.get_ref(db, "expenditures22")
+    if 'attributes' in message:
+        if message['attributes'] is not None:
+            if "reset" in message["attributes"]:
+                set_cursor(ref, (epoch, ""))
+
     # get start time
     start = time.time()
 
     # loop for 520s
     section = 0
     while time.time()-start < 520:
-        count = loop()
+        count = loop(ref)
         loaded += count
         if count == 0:
             break
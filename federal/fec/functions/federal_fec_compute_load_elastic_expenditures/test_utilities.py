@@ -0,0 +1,27 @@
+import os
+import json
+import unittest
+
+import utilities
+
+# names and what process_name gave for them before it was rewritten around one regex, recorded from the old chain of endswith checks
+fixture = os.path.join(os.path.dirname(os.path.abspath(__file__)), "testdata", "process_name.json")
+
+class TestProcessName(unittest.TestCase):
+
+    def test_matches_recorded(self):
+        with open(fixture) as f:
+            recorded = json.load(f)
+        for name, expected in recorded:
+            self.assertEqual(utilities.process_name(name), expected, name)
+
+    def test_examples(self):
+        self.assertEqual(utilities.process_name("SMITH, JOHN MR JR"), "JOHN SMITH JR")
+        self.assertEqual(utilities.process_name("Smith, Dr. Jane M.D."), "JANE SMITH")
+        self.assertEqual(utilities.process_name("ACME, INC."), "ACME INC")
+
+    def test_process_names(self):
+        self.assertEqual(utilities.process_names(["DOE, JOHN ESQ", None, "ACME, LLC"]), ["JOHN DOE", None, "ACME LLC"])
+
+if __name__ == "__main__":
+    unittest.main()
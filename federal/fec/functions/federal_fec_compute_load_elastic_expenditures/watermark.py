@@ -0,0 +1,57 @@
+import os
+import json
+import datetime
+
+# snapshot of a local watermark document, mirroring a firestore snapshot
+class LocalSnapshot:
+
+    def __init__(self, data):
+        self.exists = data is not None
+        self.data = data
+
+    def to_dict(self):
+        return self.data
+
+# json file that stands in for a firestore document when running offline
+class LocalDocument:
+
+    def __init__(self, path):
+        self.path = path
+
+    def get(self):
+        if not os.path.exists(self.path):
+            return LocalSnapshot(None)
+        with open(self.path) as f:
+            return LocalSnapshot(json.load(f))
+
+    def set(self, update, merge=False):
+        data = dict()
+        if merge and os.path.exists(self.path):
+            with open(self.path) as f:
+                data = json.load(f)
+        data.update(update)
+        with open(self.path, "w") as f:
+            json.dump(data, f, default=str)
+
+# get the document that stores the watermark for a table, using a local file if WATERMARK_PATH is set
+def get_ref(db, table):
+    path = os.environ.get("WATERMARK_PATH")
+    if path is not None:
+        return LocalDocument(os.path.join(path, table + ".json"))
+    return db.collection('federal').document('fec').collection('watermarks').document(table)
+
+# get the last loaded key, or the default if nothing has been loaded yet
+def get_watermark(ref, key, default):
+    snapshot = ref.get()
+    if snapshot.exists:
+        watermark = snapshot.to_dict().get(key)
+        if watermark is not None:
+            return watermark
+    return default
+
+# save the last loaded key
+def set_watermark(ref, key, value):
+    ref.set({
+        key: value,
+        "last_updated": datetime.datetime.now(datetime.timezone.utc)
+    }, merge=True)
@@ -0,0 +1,201 @@
+import os
+import json
+import uuid
+import logging
+import argparse
+from elasticsearch import Elasticsearch
+from elasticsearch_dsl import Search
+from elasticsearch_dsl.utils import AttrDict
+
+import utilities
+
+# format logs
+formatter = '%(asctime)s - %(levelname)s - %(message)s'
+logging.basicConfig(format=formatter, level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# number of docs grouped at a time
+page_size = 10000
+
+# node files for neo4j-admin import, with the label, identity and properties of each grouped node type
+# contributions are keyed on sub_id directly, every other node gets an id from an in-process hash map
+node_files = {
+    "committees": ("Committee", lambda i: i["cmte_id"], ["cmte_id"]),
+    "candidates": ("Candidate", lambda i: i["cand_id"], ["cand_id"]),
+    "donors_ind": ("Donor", lambda i: (i["name"], i["zip_code"]), ["name", "zip_code", "entity_tp", "state", "employer", "occupation"]),
+    "donors_org": ("Donor", lambda i: (i["name"], i["zip_code"]), ["name", "zip_code", "entity_tp", "state", "employer", "occupation"]),
+    "employers": ("Employer", lambda i: i["name"], ["name"]),
+    "jobs": ("Job", lambda i: i["name"], ["name"]),
+    "states": ("State", lambda i: i["abbreviation"], ["abbreviation"]),
+    "zips": ("Zip", lambda i: i["zip_code"], ["zip_code"]),
+    "days": ("Day", lambda i: (i["year"], i["month"], i["day"]), ["year:int", "month:int", "day:int"])
+}
+contribution_properties = ["transaction_amt:double", "amndt_ind", "rpt_tp", "transaction_pgi", "transaction_tp", "image_num", "file_num:long", "tran_id", "datetime:datetime"]
+
+# relationship files for neo4j-admin import, with the type and the start and end node of each relationship in a grouped record
+relationship_files = {
+    "committee_contributions": [
+        ("CONTRIBUTED_TO", "Committee", lambda i: i["source"], "Contribution", lambda i: i["sub_id"]),
+        ("CONTRIBUTED_TO", "Contribution", lambda i: i["sub_id"], "Committee", lambda i: i["target"])
+    ],
+    "candidate_contributions": [
+        ("CONTRIBUTED_TO", "Candidate", lambda i: i["source"], "Contribution", lambda i: i["sub_id"]),
+        ("CONTRIBUTED_TO", "Contribution", lambda i: i["sub_id"], "Committee", lambda i: i["target"])
+    ],
+    "donor_contributions": [
+        ("CONTRIBUTED_TO", "Donor", lambda i: (i["name"], i["zip_code"]), "Contribution", lambda i: i["sub_id"]),
+        ("CONTRIBUTED_TO", "Contribution", lambda i: i["sub_id"], "Committee", lambda i: i["target"])
+    ],
+    "committee_contributed_to": [
+        ("CONTRIBUTED_TO", "Committee", lambda i: i["source"], "Committee", lambda i: i["target"])
+    ],
+    "candidate_contributed_to": [
+        ("CONTRIBUTED_TO", "Candidate", lambda i: i["source"], "Committee", lambda i: i["target"])
+    ],
+    "donor_contributed_to": [
+        ("CONTRIBUTED_TO", "Donor", lambda i: (i["name"], i["zip_code"]), "Committee", lambda i: i["target"])
+    ],
+    "contribution_days": [
+        ("HAPPENED_ON", "Contribution", lambda i: i["sub_id"], "Day", lambda i: (i["year"], i["month"], i["day"]))
+    ],
+    "contribution_employers": [
+        ("ASSOCIATED_WITH", "Contribution", lambda i: i["sub_id"], "Employer", lambda i: i["employer"])
+    ],
+    "contribution_jobs": [
+        ("ASSOCIATED_WITH", "Contribution", lambda i: i["sub_id"], "Job", lambda i: i["occupation"])
+    ],
+    "donor_employers": [
+        ("ASSOCIATED_WITH", "Donor", lambda i: (i["name"], i["zip_code"]), "Employer", lambda i: i["employer"])
+    ],
+    "donor_jobs": [
+        ("ASSOCIATED_WITH", "Donor", lambda i: (i["name"], i["zip_code"]), "Job", lambda i: i["occupation"])
+    ],
+    "donor_states": [
+        ("LIVES_IN", "Donor", lambda i: (i["name"], i["zip_code"]), "State", lambda i: i["state"])
+    ],
+    "donor_zips": [
+        ("LIVES_IN", "Donor", lambda i: (i["name"], i["zip_code"]), "Zip", lambda i: i["zip_code"])
+    ]
+}
+
+# relationships keyed on a contribution are only ever seen once, the rest need to be deduplicated across pages
+deduplicated_relationships = ["committee_contributed_to", "candidate_contributed_to", "donor_contributed_to", "donor_employers", "donor_jobs", "donor_states", "donor_zips"]
+
+# helper function to format the datetime of a contribution the way neo4j-admin expects it, or None if it has no date
+def get_datetime(contribution):
+    if "year" not in contribution:
+        return None
+    return "%04d-%02d-%02dT%02d:%02dZ" % (contribution["year"], contribution["month"], contribution["day"], contribution["hour"], contribution["minute"])
+
+# helper function to format a row for neo4j-admin import
+# neo4j-admin leaves a property off for an empty field and keeps an empty string for a quoted one, so None is written as an empty field and every other value is quoted
+def format_row(row):
+    return ",".join("" if value is None else '"' + str(value).replace('"', '""') + '"' for value in row) + "\n"
+
+# writes grouped contributions out as neo4j-admin import csvs, resolving node identities with hash maps
+# properties that are None are left off the way cypher.py leaves them off, rather than set to an empty string
+class Writer:
+
+    def __init__(self, output):
+        self.output = output
+        self.files = []
+        self.writers = dict()
+        self.ids = {label: dict() for label, identity, properties in node_files.values()}
+        self.seen = {key: set() for key in deduplicated_relationships}
+        for label, identity, properties in node_files.values():
+            if label not in self.writers:
+                self.writers[label] = self.open(label, [":ID(%s)" % label] + properties + [":LABEL"])
+        self.writers["Contribution"] = self.open("Contribution", ["sub_id:ID(Contribution)"] + contribution_properties + [":LABEL"])
+
+    # helper function to open a csv with its header, returning a function that writes a row to it
+    def open(self, name, header):
+        f = open(os.path.join(self.output, name + ".csv"), "w", newline="")
+        self.files.append(f)
+        f.write(",".join(header) + "\n")
+        return lambda row: f.write(format_row(row))
+
+    # helper function to get the import id of a node
+    def get_id(self, label, key):
+        if label == "Contribution":
+            return key
+        return self.ids[label][key]
+
+    # write the nodes and relationships of a grouped page that have not been written yet
+    def write(self, grouped):
+        for key, (label, identity, properties) in node_files.items():
+            ids = self.ids[label]
+            writer = self.writers[label]
+            for node in grouped[key].values():
+                if identity(node) in ids:
+                    continue
+                ids[identity(node)] = len(ids)
+                writer([ids[identity(node)]] + [node.get(p.split(":")[0]) for p in properties] + [label])
+        writer = self.writers["Contribution"]
+        for contribution in grouped["contributions"].values():
+            contribution = dict(contribution, datetime=get_datetime(contribution))
+            writer([contribution["sub_id"]] + [contribution[p.split(":")[0]] for p in contribution_properties] + ["Contribution"])
+        for key, relationships in relationship_files.items():
+            for relationship_key, relationship in grouped[key].items():
+                if key in self.seen:
+                    if relationship_key in self.seen[key]:
+                        continue
+                    self.seen[key].add(relationship_key)
+                for rel_type, start_label, start, end_label, end in relationships:
+                    name = "_".join([start_label, rel_type, end_label])
+                    if name not in self.writers:
+                        self.writers[name] = self.open(name, [":START_ID(%s)" % start_label, ":END_ID(%s)" % end_label, "uuid", ":TYPE"])
+                    self.writers[name]([self.get_id(start_label, start(relationship)), self.get_id(end_label, end(relationship)), str(uuid.uuid4()), rel_type])
+
+    def close(self):
+        for f in self.files:
+            f.close()
+
+# helper function to stream contribution docs from a jsonl dump of elasticsearch hits
+def read_jsonl(path):
+    with open(path) as f:
+        for line in f:
+            if line.strip() == "":
+                continue
+            doc = json.loads(line)
+            yield AttrDict(doc.get("_source", doc))
+
+# helper function to stream contribution docs from elasticsearch
+def read_elasticsearch(host, username, password):
+    es = Elasticsearch(host, http_auth=(username, password), scheme='https', port=443, timeout=60)
+    s = Search(using=es, index="federal_fec_contributions")
+    q = s.filter("exists", field="row.source").filter("exists", field="row.target").params(size=page_size)
+    return q.scan()
+
+# build neo4j-admin import csvs for the whole contributions graph
+def bulk_import(docs, output):
+
+    os.makedirs(output, exist_ok=True)
+    writer = Writer(output)
+
+    # group and write a page at a time so only the identity maps stay in memory
+    count = 0
+    page = []
+    for doc in docs:
+        page.append(doc)
+        if len(page) == page_size:
+            writer.write(utilities.group_contributions(page))
+            count += len(page)
+            page = []
+            logger.info(' - '.join(['CONTRIBUTIONS WRITTEN', str(count)]))
+    writer.write(utilities.group_contributions(page))
+    count += len(page)
+    writer.close()
+    logger.info(' - '.join(['FINISHED WRITING CONTRIBUTIONS', str(count)]))
+
+    return count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build neo4j-admin import csvs for the FEC contributions graph")
+    parser.add_argument("output", help="directory to write the csvs to")
+    parser.add_argument("--input", help="jsonl dump of federal_fec_contributions hits to read instead of elasticsearch")
+    args = parser.parse_args()
+    if args.input is not None:
+        docs = read_jsonl(args.input)
+    else:
+        docs = read_elasticsearch(os.environ["ELASTIC_HOST"], os.environ["ELASTIC_USERNAME"], os.environ["ELASTIC_PASSWORD"])
+    bulk_import(docs, args.output)
@@ -1,4 +1,5 @@
 # Note that Neo4j has multiple constraints
+# they are required, since pages are loaded on several sessions at once and MERGE only keeps a node unique under a constraint
 # CREATE CONSTRAINT ON (a:Candidate) ASSERT a.cand_id IS UNIQUE;
 # CREATE CONSTRAINT ON (a:Committee) ASSERT a.cmte_id IS UNIQUE;
 # CREATE CONSTRAINT ON (a:Contribution) ASSERT a.sub_id IS UNIQUE;
@@ -7,157 +8,142 @@
 # CREATE CONSTRAINT ON (a:Job) ASSERT a.name IS UNIQUE;
 # CREATE CONSTRAINT ON (a:State) ASSERT a.abbreviation IS UNIQUE;
 # CREATE CONSTRAINT ON (a:Zip) ASSERT a.zip_code IS UNIQUE;
+# CREATE CONSTRAINT ON (a:Day) ASSERT (a.year, a.month, a.day) IS NODE KEY;
+# Day nodes duplicated before the Day constraint existed have to be merged first, for example with
+# MATCH (a:Day) WITH a.year AS year, a.month AS month, a.day AS day, collect(a) AS days WHERE size(days) > 1 CALL apoc.refactor.mergeNodes(days, {mergeRels: true}) YIELD node RETURN count(node);
 
-def merge_rel_committee_contributed_to_with_date(tx, batch):
-    tx.run("UNWIND $batch AS i "
-           "MERGE (a:Committee {cmte_id: i.source}) "
-           "MERGE (b:Committee {cmte_id: i.target}) "
-           "MERGE (r:Contribution {sub_id: toString(i.sub_id)}) "
-           "MERGE (a)-[x:CONTRIBUTED_TO]->(r)-[y:CONTRIBUTED_TO]->(b) "
-           "ON CREATE SET x.uuid = apoc.create.uuid(), y.uuid = apoc.create.uuid() "
-           "SET r.datetime=datetime({ year: i.year, month: i.month, day: i.day, hour: i.hour, minute: i.minute, timezone: 'Z' }), r.transaction_amt=i.transaction_amt, r.amndt_ind = i.amndt_ind, r.rpt_tp=i.rpt_tp, r.transaction_pgi=i.transaction_pgi, r.transaction_tp=i.transaction_tp, r.image_num=i.image_num, r.file_num=i.file_num, r.tran_id=i.tran_id "
-           "MERGE (c:Day {year: i.year, month: i.month, day: i.day}) "
-           "MERGE (r)-[s:HAPPENED_ON]->(c) "
-           "ON CREATE SET s.uuid = apoc.create.uuid() "
-           "MERGE (a)-[o:CONTRIBUTED_TO]->(b) "
-           "ON CREATE SET o.uuid = apoc.create.uuid() ",
-           batch=batch)
+# distinct nodes in a batch, each merged once
+nodes = [
+    ("committees",
+     "UNWIND $batch AS i "
+     "MERGE (a:Committee {cmte_id: i.cmte_id}) "),
+    ("candidates",
+     "UNWIND $batch AS i "
+     "MERGE (a:Candidate {cand_id: i.cand_id}) "),
+    ("donors_ind",
+     "UNWIND $batch AS i "
+     "MERGE (a:Donor {name: i.name, zip_code: i.zip_code}) "
+     "SET a.entity_tp = i.entity_tp, a.state = i.state, a.employer = i.employer, a.occupation = i.occupation "),
+    ("donors_org",
+     "UNWIND $batch AS i "
+     "MERGE (a:Donor {name: i.name, zip_code: i.zip_code}) "
+     "SET a.entity_tp = i.entity_tp, a.state = i.state "),
+    ("employers",
+     "UNWIND $batch AS i "
+     "MERGE (a:Employer {name: i.name}) "),
+    ("jobs",
+     "UNWIND $batch AS i "
+     "MERGE (a:Job {name: i.name}) "),
+    ("states",
+     "UNWIND $batch AS i "
+     "MERGE (a:State {abbreviation: i.abbreviation}) "),
+    ("zips",
+     "UNWIND $batch AS i "
+     "MERGE (a:Zip {zip_code: i.zip_code}) "),
+    ("days",
+     "UNWIND $batch AS i "
+     "MERGE (a:Day {year: i.year, month: i.month, day: i.day}) "),
+    ("contributions",
+     "UNWIND $batch AS i "
+     "MERGE (r:Contribution {sub_id: toString(i.sub_id)}) "
+     "SET r.transaction_amt=i.transaction_amt, r.amndt_ind = i.amndt_ind, r.rpt_tp=i.rpt_tp, r.transaction_pgi=i.transaction_pgi, r.transaction_tp=i.transaction_tp, r.image_num=i.image_num, r.file_num=i.file_num, r.tran_id=i.tran_id "
+     "WITH r, i WHERE i.year IS NOT NULL "
+     "SET r.datetime=datetime({ year: i.year, month: i.month, day: i.day, hour: i.hour, minute: i.minute, timezone: 'Z' }) ")
+]
 
-def merge_rel_committee_contributed_to_without_date(tx, batch):
-    tx.run("UNWIND $batch AS i "
-           "MERGE (a:Committee {cmte_id: i.source}) "
-           "MERGE (b:Committee {cmte_id: i.target}) "
-           "MERGE (r:Contribution {sub_id: toString(i.sub_id)}) "
-           "MERGE (a)-[x:CONTRIBUTED_TO]->(r)-[y:CONTRIBUTED_TO]->(b) "
-           "ON CREATE SET x.uuid = apoc.create.uuid(), y.uuid = apoc.create.uuid() "
-           "SET r.transaction_amt=i.transaction_amt, r.amndt_ind = i.amndt_ind, r.rpt_tp=i.rpt_tp, r.transaction_pgi=i.transaction_pgi, r.transaction_tp=i.transaction_tp, r.image_num=i.image_num, r.file_num=i.file_num, r.tran_id=i.tran_id "
-           "MERGE (a)-[o:CONTRIBUTED_TO]->(b) "
-           "ON CREATE SET o.uuid = apoc.create.uuid() ",
-           batch=batch)
+# relationships between nodes that already exist, so only the relationships are merged
+relationships = [
+    ("committee_contributions",
+     "UNWIND $batch AS i "
+     "MATCH (a:Committee {cmte_id: i.source}) "
+     "MATCH (r:Contribution {sub_id: toString(i.sub_id)}) "
+     "MATCH (b:Committee {cmte_id: i.target}) "
+     "MERGE (a)-[x:CONTRIBUTED_TO]->(r) "
+     "ON CREATE SET x.uuid = apoc.create.uuid() "
+     "MERGE (r)-[y:CONTRIBUTED_TO]->(b) "
+     "ON CREATE SET y.uuid = apoc.create.uuid() "),
+    ("candidate_contributions",
+     "UNWIND $batch AS i "
+     "MATCH (a:Candidate {cand_id: i.source}) "
+     "MATCH (r:Contribution {sub_id: toString(i.sub_id)}) "
+     "MATCH (b:Committee {cmte_id: i.target}) "
+     "MERGE (a)-[x:CONTRIBUTED_TO]->(r) "
+     "ON CREATE SET x.uuid = apoc.create.uuid() "
+     "MERGE (r)-[y:CONTRIBUTED_TO]->(b) "
+     "ON CREATE SET y.uuid = apoc.create.uuid() "),
+    ("donor_contributions",
+     "UNWIND $batch AS i "
+     "MATCH (a:Donor {name: i.name, zip_code: i.zip_code}) "
+     "MATCH (r:Contribution {sub_id: toString(i.sub_id)}) "
+     "MATCH (b:Committee {cmte_id: i.target}) "
+     "MERGE (a)-[x:CONTRIBUTED_TO]->(r) "
+     "ON CREATE SET x.uuid = apoc.create.uuid() "
+     "MERGE (r)-[y:CONTRIBUTED_TO]->(b) "
+     "ON CREATE SET y.uuid = apoc.create.uuid() "),
+    ("committee_contributed_to",
+     "UNWIND $batch AS i "
+     "MATCH (a:Committee {cmte_id: i.source}) "
+     "MATCH (b:Committee {cmte_id: i.target}) "
+     "MERGE (a)-[o:CONTRIBUTED_TO]->(b) "
+     "ON CREATE SET o.uuid = apoc.create.uuid() "),
+    ("candidate_contributed_to",
+     "UNWIND $batch AS i "
+     "MATCH (a:Candidate {cand_id: i.source}) "
+     "MATCH (b:Committee {cmte_id: i.target}) "
+     "MERGE (a)-[o:CONTRIBUTED_TO]->(b) "
+     "ON CREATE SET o.uuid = apoc.create.uuid() "),
+    ("donor_contributed_to",
+     "UNWIND $batch AS i "
+     "MATCH (a:Donor {name: i.name, zip_code: i.zip_code}) "
+     "MATCH (b:Committee {cmte_id: i.target}) "
+     "MERGE (a)-[o:CONTRIBUTED_TO]->(b) "
+     "ON CREATE SET o.uuid = apoc.create.uuid() "),
+    ("contribution_days",
+     "UNWIND $batch AS i "
+     "MATCH (r:Contribution {sub_id: toString(i.sub_id)}) "
+     "MATCH (c:Day {year: i.year, month: i.month, day: i.day}) "
+     "MERGE (r)-[s:HAPPENED_ON]->(c) "
+     "ON CREATE SET s.uuid = apoc.create.uuid() "),
+    ("contribution_employers",
+     "UNWIND $batch AS i "
+     "MATCH (r:Contribution {sub_id: toString(i.sub_id)}) "
+     "MATCH (d:Employer {name: i.employer}) "
+     "MERGE (r)-[t:ASSOCIATED_WITH]->(d) "
+     "ON CREATE SET t.uuid = apoc.create.uuid() "),
+    ("contribution_jobs",
+     "UNWIND $batch AS i "
+     "MATCH (r:Contribution {sub_id: toString(i.sub_id)}) "
+     "MATCH (e:Job {name: i.occupation}) "
+     "MERGE (r)-[v:ASSOCIATED_WITH]->(e) "
+     "ON CREATE SET v.uuid = apoc.create.uuid() "),
+    ("donor_employers",
+     "UNWIND $batch AS i "
+     "MATCH (a:Donor {name: i.name, zip_code: i.zip_code}) "
+     "MATCH (d:Employer {name: i.employer}) "
+     "MERGE (a)-[u:ASSOCIATED_WITH]->(d) "
+     "ON CREATE SET u.uuid = apoc.create.uuid() "),
+    ("donor_jobs",
+     "UNWIND $batch AS i "
+     "MATCH (a:Donor {name: i.name, zip_code: i.zip_code}) "
+     "MATCH (e:Job {name: i.occupation}) "
+     "MERGE (a)-[w:ASSOCIATED_WITH]->(e) "
+     "ON CREATE SET w.uuid = apoc.create.uuid() "),
+    ("donor_states",
+     "UNWIND $batch AS i "
+     "MATCH (a:Donor {name: i.name, zip_code: i.zip_code}) "
+     "MATCH (b:State {abbreviation: i.state}) "
+     "MERGE (a)-[r:LIVES_IN]->(b) "
+     "ON CREATE SET r.uuid = apoc.create.uuid() "),
+    ("donor_zips",
+     "UNWIND $batch AS i "
+     "MATCH (a:Donor {name: i.name, zip_code: i.zip_code}) "
+     "MATCH (b:Zip {zip_code: i.zip_code}) "
+     "MERGE (a)-[r:LIVES_IN]->(b) "
+     "ON CREATE SET r.uuid = apoc.create.uuid() ")
+]
 
-def merge_rel_candidate_contributed_to_with_date(tx, batch):
-    tx.run("UNWIND $batch AS i "
-           "MERGE (a:Candidate {cand_id: i.source}) "
-           "MERGE (b:Committee {cmte_id: i.target}) "
-           "MERGE (r:Contribution {sub_id: toString(i.sub_id)}) "
-           "MERGE (a)-[x:CONTRIBUTED_TO]->(r)-[y:CONTRIBUTED_TO]->(b) "
-           "ON CREATE SET x.uuid = apoc.create.uuid(), y.uuid = apoc.create.uuid() "
-           "SET r.datetime=datetime({ year: i.year, month: i.month, day: i.day, hour: i.hour, minute: i.minute, timezone: 'Z' }), r.transaction_amt=i.transaction_amt, r.amndt_ind = i.amndt_ind, r.rpt_tp=i.rpt_tp, r.transaction_pgi=i.transaction_pgi, r.transaction_tp=i.transaction_tp, r.image_num=i.image_num, r.file_num=i.file_num, r.tran_id=i.tran_id "
-           "MERGE (c:Day {year: i.year, month: i.month, day: i.day}) "
-           "MERGE (r)-[s:HAPPENED_ON]->(c) "
-           "ON CREATE SET s.uuid = apoc.create.uuid() "
-           "MERGE (a)-[o:CONTRIBUTED_TO]->(b) "
-           "ON CREATE SET o.uuid = apoc.create.uuid() ",
-           batch=batch)
-
-def merge_rel_candidate_contributed_to_without_date(tx, batch):
-    tx.run("UNWIND $batch AS i "
-           "MERGE (a:Candidate {cand_id: i.source}) "
-           "MERGE (b:Committee {cmte_id: i.target}) "
-           "MERGE (r:Contribution {sub_id: toString(i.sub_id)}) "
-           "MERGE (a)-[x:CONTRIBUTED_TO]->(r)-[y:CONTRIBUTED_TO]->(b) "
-           "ON CREATE SET x.uuid = apoc.create.uuid(), y.uuid = apoc.create.uuid() "
-           "SET r.transaction_amt=i.transaction_amt, r.amndt_ind = i.amndt_ind, r.rpt_tp=i.rpt_tp, r.transaction_pgi=i.transaction_pgi, r.transaction_tp=i.transaction_tp, r.image_num=i.image_num, r.file_num=i.file_num, r.tran_id=i.tran_id "
-           "MERGE (a)-[o:CONTRIBUTED_TO]->(b) "
-           "ON CREATE SET o.uuid = apoc.create.uuid() ",
-           batch=batch)
-
-def merge_rel_donor_ind_contributed_to_with_date(tx, batch):
-    tx.run("UNWIND $batch AS i "
-           "MERGE (a:Donor {name: i.name, zip_code: i.zip_code}) "
-           "SET a.entity_tp = i.entity_tp, a.state = i.state, a.employer = i.employer, a.occupation = i.occupation "
-           "MERGE (b:Committee {cmte_id: i.target}) "
-           "MERGE (r:Contribution {sub_id: toString(i.sub_id)}) "
-           "MERGE (a)-[x:CONTRIBUTED_TO]->(r)-[y:CONTRIBUTED_TO]->(b) "
-           "ON CREATE SET x.uuid = apoc.create.uuid(), y.uuid = apoc.create.uuid() "
-           "SET r.datetime=datetime({ year: i.year, month: i.month, day: i.day, hour: i.hour, minute: i.minute, timezone: 'Z' }), r.transaction_amt=i.transaction_amt, r.amndt_ind = i.amndt_ind, r.rpt_tp=i.rpt_tp, r.transaction_pgi=i.transaction_pgi, r.transaction_tp=i.transaction_tp, r.image_num=i.image_num, r.file_num=i.file_num, r.tran_id=i.tran_id "
-           "MERGE (c:Day {year: i.year, month: i.month, day: i.day}) "
-           "MERGE (r)-[s:HAPPENED_ON]->(c) "
-           "ON CREATE SET s.uuid = apoc.create.uuid() "
-           "MERGE (d:Employer {name: i.employer}) "
-           "MERGE (r)-[t:ASSOCIATED_WITH]->(d) "
-           "ON CREATE SET t.uuid = apoc.create.uuid() "
-           "MERGE (a)-[u:ASSOCIATED_WITH]->(d) "
-           "ON CREATE SET u.uuid = apoc.create.uuid() "
-           "MERGE (e:Job {name: i.occupation}) "
-           "MERGE (r)-[v:ASSOCIATED_WITH]->(e) "
-           "ON CREATE SET v.uuid = apoc.create.uuid() "
-           "MERGE (a)-[w:ASSOCIATED_WITH]->(e) "
-           "ON CREATE SET w.uuid = apoc.create.uuid() "
-           "MERGE (a)-[o:CONTRIBUTED_TO]->(b) "
-           "ON CREATE SET o.uuid = apoc.create.uuid() ",
-           batch=batch)
-
-def merge_rel_donor_ind_contributed_to_without_date(tx, batch):
-    tx.run("UNWIND $batch AS i "
-           "MERGE (a:Donor {name: i.name, zip_code: i.zip_code}) "
-           "SET a.entity_tp = i.entity_tp, a.state = i.state, a.employer = i.employer, a.occupation = i.occupation "
-           "MERGE (b:Committee {cmte_id: i.target}) "
-           "MERGE (r:Contribution {sub_id: toString(i.sub_id)}) "
-           "MERGE (a)-[x:CONTRIBUTED_TO]->(r)-[y:CONTRIBUTED_TO]->(b) "
-           "ON CREATE SET x.uuid = apoc.create.uuid(), y.uuid = apoc.create.uuid() "
-           "SET r.transaction_amt=i.transaction_amt, r.amndt_ind = i.amndt_ind, r.rpt_tp=i.rpt_tp, r.transaction_pgi=i.transaction_pgi, r.transaction_tp=i.transaction_tp, r.image_num=i.image_num, r.file_num=i.file_num, r.tran_id=i.tran_id "
-           "MERGE (d:Employer {name: i.employer}) "
-           "MERGE (r)-[t:ASSOCIATED_WITH]->(d) "
-           "ON CREATE SET t.uuid = apoc.create.uuid() "
-           "MERGE (a)-[u:ASSOCIATED_WITH]->(d) "
-           "ON CREATE SET u.uuid = apoc.create.uuid() "
-           "MERGE (e:Job {name: i.occupation}) "
-           "MERGE (r)-[v:ASSOCIATED_WITH]->(e) "
-           "ON CREATE SET v.uuid = apoc.create.uuid() "
-           "MERGE (a)-[w:ASSOCIATED_WITH]->(e) "
-           "ON CREATE SET w.uuid = apoc.create.uuid() "
-           "MERGE (a)-[o:CONTRIBUTED_TO]->(b) "
-           "ON CREATE SET o.uuid = apoc.create.uuid() ",
-           batch=batch)
-
-def merge_rel_donor_ind_state(tx, batch):
-    tx.run("UNWIND $batch AS i "
-           "MERGE (a:Donor {name: i.name, zip_code: i.zip_code}) "
-           "MERGE (b:State {abbreviation: i.state}) "
-           "MERGE (a)-[r:LIVES_IN]->(b) "
-           "ON CREATE SET r.uuid = apoc.create.uuid()",
-           batch=batch)
-
-def merge_rel_donor_ind_zip(tx, batch):
-    tx.run("UNWIND $batch AS i "
-           "MERGE (a:Donor {name: i.name, zip_code: i.zip_code}) "
-           "MERGE (b:Zip {zip_code: i.zip_code}) "
-           "MERGE (a)-[r:LIVES_IN]->(b) "
-           "ON CREATE SET r.uuid = apoc.create.uuid()",
-           batch=batch)
-
-def merge_rel_donor_org_contributed_to_with_date(tx, batch):
-    tx.run("UNWIND $batch AS i "
-           "MERGE (a:Donor {name: i.name, zip_code: i.zip_code}) "
-           "SET a.entity_tp = i.entity_tp, a.state = i.state "
-           "MERGE (b:Committee {cmte_id: i.target}) "
-           "MERGE (r:Contribution {sub_id: toString(i.sub_id)}) "
-           "MERGE (a)-[x:CONTRIBUTED_TO]->(r)-[y:CONTRIBUTED_TO]->(b) "
-           "ON CREATE SET x.uuid = apoc.create.uuid(), y.uuid = apoc.create.uuid() "
-           "SET r.datetime=datetime({ year: i.year, month: i.month, day: i.day, hour: i.hour, minute: i.minute, timezone: 'Z' }), r.transaction_amt=i.transaction_amt, r.amndt_ind = i.amndt_ind, r.rpt_tp=i.rpt_tp, r.transaction_pgi=i.transaction_pgi, r.transaction_tp=i.transaction_tp, r.image_num=i.image_num, r.file_num=i.file_num, r.tran_id=i.tran_id "
-           "MERGE (c:Day {year: i.year, month: i.month, day: i.day}) "
-           "MERGE (r)-[s:HAPPENED_ON]->(c) "
-           "ON CREATE SET s.uuid = apoc.create.uuid() "
-           "MERGE (d:Employer {name: i.name}) "
-           "MERGE (a)-[t:ASSOCIATED_WITH]->(d) "
-           "ON CREATE SET t.uuid = apoc.create.uuid() "
-           "MERGE (a)-[o:CONTRIBUTED_TO]->(b) "
-           "ON CREATE SET o.uuid = apoc.create.uuid() ",
-           batch=batch)
-
-def merge_rel_donor_org_contributed_to_without_date(tx, batch):
-    tx.run("UNWIND $batch AS i "
-           "MERGE (a:Donor {name: i.name, zip_code: i.zip_code}) "
-           "SET a.entity_tp = i.entity_tp, a.state = i.state "
-           "MERGE (b:Committee {cmte_id: i.target}) "
-           "MERGE (r:Contribution {sub_id: toString(i.sub_id)}) "
-           "MERGE (a)-[x:CONTRIBUTED_TO]->(r)-[y:CONTRIBUTED_TO]->(b) "
-           "ON CREATE SET x.uuid = apoc.create.uuid(), y.uuid = apoc.create.uuid() "
-           "SET r.transaction_amt=i.transaction_amt, r.amndt_ind = i.amndt_ind, r.rpt_tp=i.rpt_tp, r.transaction_pgi=i.transaction_pgi, r.transaction_tp=i.transaction_tp, r.image_num=i.image_num, r.file_num=i.file_num, r.tran_id=i.tran_id "
-           "MERGE (d:Employer {name: i.name}) "
-           "MERGE (a)-[t:ASSOCIATED_WITH]->(d) "
-           "ON CREATE SET t.uuid = apoc.create.uuid() "
-           "MERGE (a)-[o:CONTRIBUTED_TO]->(b) "
-           "ON CREATE SET o.uuid = apoc.create.uuid() ",
-           batch=batch)
+# load a grouped batch of contributions in one transaction, nodes first and then relationships
+def load_contributions(tx, batch):
+    for key, statement in nodes + relationships:
+        if len(batch[key]) > 0:
+            tx.run(statement, batch=batch[key])
@@ -5,8 +5,10 @@ from elasticsearch import Elasticsearch, helpers
 from elasticsearch_dsl import Search
 import datetime
 import time
+import concurrent.futures
 
 import cypher
+import utilities
 
 # format logs
 formatter = '%(asctime)s - %(levelname)s - %(message)s'
@@ -27,27 +29,38 @@ neo4j_password_data = secrets.access_secret_version(request={"name": "projects/9
 es = Elasticsearch(elastic_host, http_auth=(elastic_username_data, elastic_password_data), scheme='https', port=443, timeout=60)
 driver = GraphDatabase.driver(neo4j_connection, auth=(neo4j_username_data, neo4j_password_data))
 
-# helper function to update a record with the transaction date
-def add_date(record, date):
-    date = datetime.datetime.strptime(date, "%Y-%m-%dT%H:%M:%S%z")
-    record["year"] = date.year
-    record["month"] = date.month
-    record["day"] = date.day
-    record["hour"] = date.hour
-    record["minute"] = date.minute
-    return record
-
-# helper function to clean the zip code
-def clean_zip(zip_code):
-    if zip_code is None or zip_code == "":
-        return ""
-    try:
-        zip_code = int(zip_code)
-    except:
-        pass
-    if zip_code == 0:
-        return ""
-    return str(zip_code).zfill(5)
+# number of docs loaded in each neo4j transaction
+page_size = 1000
+
+# number of pages loaded into neo4j at the same time
+# pages share Day, State, Zip, Employer and Job nodes, so this relies on the constraints listed in cypher.py to keep concurrent merges from duplicating them
+graph_workers = 4
+
+# helper function to load a page of docs into neo4j and mark them as graphed in elasticsearch
+def load_page(docs):
+
+    # load into neo4j
+    batch = {key: list(values.values()) for key, values in utilities.group_contributions(docs).items()}
+    with driver.session() as neo4j:
+        neo4j.write_transaction(cypher.load_contributions, batch=batch)
+
+    # mark as graphed in elasticsearch
+    actions = []
+    for doc in docs:
+        actions.append({
+            "_op_type": "update",
+            "_index": "federal_fec_contributions",
+            "_id": doc.meta.id,
+            "doc": {
+                "context": {
+                    "last_graphed": datetime.datetime.now(datetime.timezone.utc)
+                }
+            }
+        })
+    helpers.bulk(es, actions)
+    logger.info(' - '.join(['CONTRIBUTIONS LOADED', str(len(actions))]))
+
+    return len(actions)
 
 # load FEC contributions into graph
 def federal_fec_compute_load_graph_contributions(message, context):
@@ -55,159 +68,36 @@ def federal_fec_compute_load_graph_contributions(message, context):
     # configure ElasticSearch search
     s = Search(using=es, index="federal_fec_contributions")
     q = s.filter("exists", field="row.source").filter("exists", field="row.target").exclude("exists", field="context.last_graphed")
+    q = q.sort("-context.last_indexed").params(preserve_order=True, size=page_size)
+
+    # count total number of docs loaded
+    loaded = 0
 
     # get start time
     start = time.time()
 
-    # loop for 520s
-    while time.time()-start < 510:
-
-        docs = q[0:1000].sort("-context.last_indexed").execute()
-        if len(docs) == 0:
-            logger.info(' - '.join(['NO CONTRIBUTIONS FOUND FOR LOADING']))
-            break
-
-        # batches for neo4j and elasticsearch
-        committee_rows_with_date = []
-        committee_rows_without_date = []
-        candidate_rows_with_date = []
-        candidate_rows_without_date = []
-        donor_ind_rows_with_date = []
-        donor_ind_rows_without_date = []
-        donor_ind_states = []
-        donor_ind_zips = []
-        donor_org_rows_with_date = []
-        donor_org_rows_without_date = []
-        actions = []
-
-        for doc in docs:
-
-            # prepare docs for loading
-            if doc.row.source.classification == "committee":
-                record = {
-                    "source": doc.row["source"]["committee"]["cmte_id"],
-                    "target": doc.row["target"]["committee"]["cmte_id"],
-                    "transaction_amt": doc.row["transaction_amt"],
-                    "amndt_ind": doc.row["amndt_ind"],
-                    "rpt_tp": doc.row["rpt_tp"],
-                    "transaction_pgi": doc.row["transaction_pgi"],
-                    "transaction_tp": doc.row["transaction_tp"],
-                    "image_num": doc.row["image_num"],
-                    "file_num": doc.row["file_num"],
-                    "tran_id": doc.row["tran_id"],
-                    "sub_id": doc.row["sub_id"]
-                }
-                if doc.row["transaction_dt"] is not None:
-                    record = add_date(record, doc.row["transaction_dt"])
-                    committee_rows_with_date.append(record)
-                else:
-                    committee_rows_without_date.append(record)
-            elif doc.row.source.classification == "candidate":
-                record = {
-                    "source": doc.row["source"]["candidate"]["cand_id"],
-                    "target": doc.row["target"]["committee"]["cmte_id"],
-                    "transaction_amt": doc.row["transaction_amt"],
-                    "amndt_ind": doc.row["amndt_ind"],
-                    "rpt_tp": doc.row["rpt_tp"],
-                    "transaction_pgi": doc.row["transaction_pgi"],
-                    "transaction_tp": doc.row["transaction_tp"],
-                    "image_num": doc.row["image_num"],
-                    "file_num": doc.row["file_num"],
-                    "tran_id": doc.row["tran_id"],
-                    "sub_id": doc.row["sub_id"]
-                }
-                if doc.row["transaction_dt"] is not None:
-                    record = add_date(record, doc.row["transaction_dt"])
-                    candidate_rows_with_date.append(record)
-                else:
-                    candidate_rows_without_date.append(record)
-            elif doc.row.source.classification == "individual":
-                if doc.row["source"]["donor"]["name"] is not None:
-                    record = {
-                        "entity_tp": doc.row["source"]["donor"]["entity_tp"],
-                        "name": doc.processed["source"]["donor"]["name"].strip() if doc.processed["source"]["donor"]["name"] is not None else "",
-                        "state": doc.row["source"]["donor"]["state"] or "",
-                        "zip_code": clean_zip(doc.row["source"]["donor"]["zip_code"]),
-                        "employer": doc.row["source"]["donor"]["employer"].strip() if doc.row["source"]["donor"]["employer"] is not None else "",
-                        "occupation": doc.row["source"]["donor"]["occupation"].strip() if doc.row["source"]["donor"]["occupation"] is not None else "",
-                        "target": doc.row["target"]["committee"]["cmte_id"],
-                        "transaction_amt": doc.row["transaction_amt"],
-                        "amndt_ind": doc.row["amndt_ind"],
-                        "rpt_tp": doc.row["rpt_tp"],
-                        "transaction_pgi": doc.row["transaction_pgi"],
-                        "transaction_tp": doc.row["transaction_tp"],
-                        "image_num": doc.row["image_num"],
-                        "file_num": doc.row["file_num"],
-                        "tran_id": doc.row["tran_id"],
-                        "sub_id": doc.row["sub_id"]
-                    }
-                    if doc.row["transaction_dt"] is not None:
-                        record = add_date(record, doc.row["transaction_dt"])
-                        donor_ind_rows_with_date.append(record)
-                    else:
-                        donor_ind_rows_without_date.append(record)
-                    if doc.row["source"]["donor"]["state"] is not None:
-                        donor_ind_states.append({
-                            "name": doc.processed["source"]["donor"]["name"].strip() if doc.processed["source"]["donor"]["name"] is not None else "",
-                            "zip_code": clean_zip(doc.row["source"]["donor"]["zip_code"]),
-                            "state": doc.row["source"]["donor"]["state"]
-                        })
-                    if doc.row["source"]["donor"]["zip_code"] is not None:
-                        donor_ind_zips.append({
-                            "name": doc.processed["source"]["donor"]["name"].strip() if doc.processed["source"]["donor"]["name"] is not None else "",
-                            "zip_code": clean_zip(doc.row["source"]["donor"]["zip_code"])
-                        })
-            elif doc.row.source.classification == "organization":
-                if doc.row["source"]["donor"]["name"] is not None:
-                    record = {
-                        "entity_tp": doc.row["source"]["donor"]["entity_tp"],
-                        "name": doc.processed["source"]["donor"]["name"].strip() if doc.processed["source"]["donor"]["name"] is not None else "",
-                        "state": doc.row["source"]["donor"]["state"] or "",
-                        "zip_code": clean_zip(doc.row["source"]["donor"]["zip_code"]),
-                        "target": doc.row["target"]["committee"]["cmte_id"],
-                        "transaction_amt": doc.row["transaction_amt"],
-                        "amndt_ind": doc.row["amndt_ind"],
-                        "rpt_tp": doc.row["rpt_tp"],
-                        "transaction_pgi": doc.row["transaction_pgi"],
-                        "transaction_tp": doc.row["transaction_tp"],
-                        "image_num": doc.row["image_num"],
-                        "file_num": doc.row["file_num"],
-                        "tran_id": doc.row["tran_id"],
-                        "sub_id": doc.row["sub_id"]
-                    }
-                    if doc.row["transaction_dt"] is not None:
-                        record = add_date(record, doc.row["transaction_dt"])
-                        donor_org_rows_with_date.append(record)
-                    else:
-                        donor_org_rows_without_date.append(record)
-
-            # prepare to mark as in graph in elasticsearch
-            actions.append({
-                "_op_type": "update",
-                "_index": "federal_fec_contributions",
-                "_id": doc.meta.id,
-                "doc": {
-                    "context": {
-                        "last_graphed": datetime.datetime.now(datetime.timezone.utc)
-                    }
-                }
-            })
-
-        # load into neo4j
-        with driver.session() as neo4j:
-            neo4j.write_transaction(cypher.merge_rel_committee_contributed_to_with_date, batch=committee_rows_with_date)
-            neo4j.write_transaction(cypher.merge_rel_committee_contributed_to_without_date, batch=committee_rows_without_date)
-            neo4j.write_transaction(cypher.merge_rel_candidate_contributed_to_with_date, batch=candidate_rows_with_date)
-            neo4j.write_transaction(cypher.merge_rel_candidate_contributed_to_without_date, batch=candidate_rows_without_date)
-            neo4j.write_transaction(cypher.merge_rel_donor_ind_contributed_to_with_date, batch=donor_ind_rows_with_date)
-            neo4j.write_transaction(cypher.merge_rel_donor_ind_contributed_to_without_date, batch=donor_ind_rows_without_date)
-            neo4j.write_transaction(cypher.merge_rel_donor_ind_state, batch=donor_ind_states)
-            neo4j.write_transaction(cypher.merge_rel_donor_ind_zip, batch=donor_ind_zips)
-            neo4j.write_transaction(cypher.merge_rel_donor_org_contributed_to_with_date, batch=donor_org_rows_with_date)
-            neo4j.write_transaction(cypher.merge_rel_donor_org_contributed_to_without_date, batch=donor_org_rows_without_date)
-
-        # mark as graphed in elasticsearch
-        helpers.bulk(es, actions)
-        logger.info(' - '.join(['CONTRIBUTIONS LOADED', str(len(actions))]))
+    # load pages on several sessions at once, keeping only a few pages in flight
+    with concurrent.futures.ThreadPoolExecutor(max_workers=graph_workers) as executor:
+        pending = set()
+        page = []
+        for doc in q.scan():
+            page.append(doc)
+            if len(page) == page_size:
+                pending.add(executor.submit(load_page, page))
+                page = []
+            if len(pending) >= graph_workers * 2:
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    loaded += future.result()
+            # stop reading new pages after 480s so the pages in flight can finish
+            if time.time()-start > 480:
+                break
+        if len(page) > 0 and time.time()-start <= 480:
+            pending.add(executor.submit(load_page, page))
+        for future in concurrent.futures.as_completed(pending):
+            loaded += future.result()
+
+    if loaded == 0:
+        logger.info(' - '.join(['NO CONTRIBUTIONS FOUND FOR LOADING']))
 
     return True
@@ -0,0 +1,157 @@
+import os
+import re
+import tempfile
+import unittest
+import collections
+
+from elasticsearch_dsl.utils import AttrDict
+
+import cypher
+import utilities
+import bulk_import
+
+# helper function to get a contribution doc the way it is kept in elasticsearch
+def gen_doc(sub_id, classification, source, transaction_dt="2022-03-04T05:06:00+0000"):
+    row = {
+        "source": dict({"classification": classification}, **source),
+        "target": {"committee": {"cmte_id": "C00000001"}},
+        "transaction_amt": 25.5,
+        "amndt_ind": "N",
+        "rpt_tp": "Q1",
+        "transaction_pgi": None,
+        "transaction_tp": "15",
+        "image_num": "202203049000000001",
+        "file_num": 1234,
+        "tran_id": None if sub_id == 3 else "T" + str(sub_id),
+        "sub_id": sub_id,
+        "transaction_dt": transaction_dt
+    }
+    donor = source.get("donor", {"name": None})
+    return AttrDict({"row": row, "processed": {"source": {"donor": {"name": donor["name"]}}}})
+
+docs = [
+    gen_doc(1, "individual", {"donor": {"name": "SMITH, JANE", "entity_tp": "IND", "state": "NY", "zip_code": "10001", "employer": "ACME, \"INC\"", "occupation": None}}),
+    gen_doc(2, "individual", {"donor": {"name": "DOE, JOHN", "entity_tp": "IND", "state": None, "zip_code": None, "employer": None, "occupation": "TEACHER"}}, transaction_dt=None),
+    gen_doc(3, "organization", {"donor": {"name": "ACME PAC", "entity_tp": "ORG", "state": "CA", "zip_code": "0", "employer": None, "occupation": None}}),
+    gen_doc(4, "committee", {"committee": {"cmte_id": "C00000002"}}),
+    gen_doc(5, "candidate", {"candidate": {"cand_id": "P00000001"}}),
+    gen_doc(6, "individual", {"donor": {"name": "SMITH, JANE", "entity_tp": "IND", "state": "NY", "zip_code": "10001", "employer": "ACME, \"INC\"", "occupation": None}})
+]
+
+# helper function to split a csv line into its fields, keeping a quoted empty string apart from an empty field, which is read as None
+def parse_line(line):
+    fields = []
+    i = 0
+    while True:
+        if line.startswith('"', i):
+            end = i + 1
+            while not (line[end] == '"' and line[end + 1:end + 2] != '"'):
+                end += 2 if line[end] == '"' else 1
+            fields.append(line[i + 1:end].replace('""', '"'))
+            i = end + 1
+        else:
+            end = line.find(",", i)
+            end = len(line) if end == -1 else end
+            fields.append(line[i:end] if end > i else None)
+            i = end
+        if i >= len(line):
+            return fields
+        i += 1
+
+# helper function to read an import csv as its header and rows
+def read_csv(path):
+    with open(path, newline="") as f:
+        lines = f.read().splitlines()
+    return lines[0].split(","), [parse_line(line) for line in lines[1:]]
+
+# helper function to get the label and the properties a cypher statement merges or sets on a node, as property to field of the batch
+def get_node_statement(statement):
+    variable, label, merged = re.search(r"MERGE \((\w+):(\w+) \{([^}]*)\}\)", statement).groups()
+    properties = {p: f for p, f in re.findall(r"(\w+): (?:toString\()?i\.(\w+)", merged)}
+    properties.update({p: f for p, f in re.findall(variable + r"\.(\w+) ?= ?i\.(\w+)", statement)})
+    if re.search(variable + r"\.datetime ?= ?datetime\(", statement) is not None:
+        properties["datetime"] = None
+    return label, properties
+
+# helper function to get the relationships a cypher statement merges, as (start label, type, end label) with the properties each end is matched on
+def get_relationship_statement(statement):
+    matched = {v: (label, re.findall(r"(\w+): (?:toString\()?i\.(\w+)", props)) for v, label, props in re.findall(r"MATCH \((\w+):(\w+) \{([^}]*)\}\)", statement)}
+    return [(matched[start], rel_type, matched[end]) for start, rel_type, end in re.findall(r"MERGE \((\w+)\)-\[\w+:(\w+)\]->\((\w+)\)", statement)]
+
+class TestBulkImport(unittest.TestCase):
+
+    def setUp(self):
+        self.output = tempfile.TemporaryDirectory()
+        bulk_import.bulk_import(iter(docs), self.output.name)
+        self.grouped = utilities.group_contributions(docs)
+
+    def tearDown(self):
+        self.output.cleanup()
+
+    # helper function to read the nodes of a label, keyed by import id, with the properties that were not left off
+    def read_nodes(self, label):
+        header, rows = read_csv(os.path.join(self.output.name, label + ".csv"))
+        names = [column.split(":")[0] for column in header]
+        nodes = dict()
+        for row in rows:
+            nodes[row[0]] = {name: value for name, value in zip(names, row) if name not in ["", "LABEL"] and value is not None}
+        return [name for name in names if name not in ["", "LABEL"]], nodes
+
+    def test_node_properties(self):
+        statements = collections.defaultdict(dict)
+        expected = collections.defaultdict(list)
+        for key, statement in cypher.nodes:
+            label, properties = get_node_statement(statement)
+            statements[label].update(properties)
+            for node in self.grouped[key].values():
+                values = {p: str(node[f]) for p, f in properties.items() if f is not None and node.get(f) is not None}
+                if "datetime" in properties and "year" in node:
+                    values["datetime"] = bulk_import.get_datetime(node)
+                expected[label].append(values)
+        for label, properties in statements.items():
+            header, nodes = self.read_nodes(label)
+            self.assertEqual(sorted(header), sorted(properties), label)
+            for values in expected[label]:
+                self.assertIn(values, list(nodes.values()), label)
+            for values in nodes.values():
+                self.assertIn(values, expected[label], label)
+
+    def test_none_is_left_off(self):
+        header, nodes = self.read_nodes("Donor")
+        donors = {values["name"]: values for values in nodes.values()}
+        self.assertEqual(donors["SMITH, JANE"]["occupation"], "")
+        self.assertEqual(donors["DOE, JOHN"]["state"], "")
+        self.assertNotIn("employer", donors["ACME PAC"])
+        header, nodes = self.read_nodes("Contribution")
+        self.assertNotIn("transaction_pgi", nodes["1"])
+        self.assertNotIn("tran_id", nodes["3"])
+        self.assertNotIn("datetime", nodes["2"])
+        self.assertEqual(nodes["1"]["datetime"], "2022-03-04T05:06Z")
+
+    def test_relationships(self):
+
+        # helper function to find the import id of the one node cypher.py would match for a record
+        def find(label, matched, record):
+            header, nodes = self.read_nodes(label)
+            found = [id for id, values in nodes.items() if all(values.get(p) == str(record[f]) for p, f in matched)]
+            self.assertEqual(len(found), 1, (label, matched, record))
+            return found[0]
+
+        expected = collections.Counter()
+        for key, statement in cypher.relationships:
+            merged = get_relationship_statement(statement)
+            self.assertEqual([(start[0], rel_type, end[0]) for start, rel_type, end in merged], [(start, rel_type, end) for rel_type, start, s, end, e in bulk_import.relationship_files[key]], key)
+            for record in self.grouped[key].values():
+                for (start, start_matched), rel_type, (end, end_matched) in merged:
+                    expected[("_".join([start, rel_type, end]), find(start, start_matched, record), find(end, end_matched, record))] += 1
+
+        actual = collections.Counter()
+        for name in set(name for name, start, end in expected):
+            header, rows = read_csv(os.path.join(self.output.name, name + ".csv"))
+            self.assertEqual(header[2:], ["uuid", ":TYPE"])
+            for row in rows:
+                actual[(name, row[0], row[1])] += 1
+        self.assertEqual(actual, expected)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import datetime
+
+import cypher
+
+# helper function to update a record with the transaction date
+def add_date(record, date):
+    date = datetime.datetime.strptime(date, "%Y-%m-%dT%H:%M:%S%z")
+    record["year"] = date.year
+    record["month"] = date.month
+    record["day"] = date.day
+    record["hour"] = date.hour
+    record["minute"] = date.minute
+    return record
+
+# helper function to clean the zip code
+def clean_zip(zip_code):
+    if zip_code is None or zip_code == "":
+        return ""
+    try:
+        zip_code = int(zip_code)
+    except:
+        pass
+    if zip_code == 0:
+        return ""
+    return str(zip_code).zfill(5)
+
+# helper function to get the contribution properties of a doc
+def get_contribution(doc):
+    contribution = {
+        "transaction_amt": doc.row["transaction_amt"],
+        "amndt_ind": doc.row["amndt_ind"],
+        "rpt_tp": doc.row["rpt_tp"],
+        "transaction_pgi": doc.row["transaction_pgi"],
+        "transaction_tp": doc.row["transaction_tp"],
+        "image_num": doc.row["image_num"],
+        "file_num": doc.row["file_num"],
+        "tran_id": doc.row["tran_id"],
+        "sub_id": doc.row["sub_id"]
+    }
+    if doc.row["transaction_dt"] is not None:
+        contribution = add_date(contribution, doc.row["transaction_dt"])
+    return contribution
+
+# helper function to group docs into the distinct nodes and relationships to load, keyed by their identity
+def group_contributions(docs):
+
+    # key every node and relationship so each is only sent once
+    nodes = {key: dict() for key, statement in cypher.nodes}
+    relationships = {key: dict() for key, statement in cypher.relationships}
+
+    for doc in docs:
+
+        classification = doc.row.source.classification
+        if classification not in ["committee", "candidate", "individual", "organization"]:
+            continue
+        if classification in ["individual", "organization"] and doc.row["source"]["donor"]["name"] is None:
+            continue
+
+        # contribution and the committee it went to
+        contribution = get_contribution(doc)
+        sub_id = contribution["sub_id"]
+        target = doc.row["target"]["committee"]["cmte_id"]
+        nodes["contributions"][sub_id] = contribution
+        nodes["committees"][target] = {"cmte_id": target}
+        if "year" in contribution:
+            day = (contribution["year"], contribution["month"], contribution["day"])
+            nodes["days"][day] = {"year": day[0], "month": day[1], "day": day[2]}
+            relationships["contribution_days"][sub_id] = {"sub_id": sub_id, "year": day[0], "month": day[1], "day": day[2]}
+
+        # source of the contribution
+        if classification == "committee":
+            source = doc.row["source"]["committee"]["cmte_id"]
+            nodes["committees"][source] = {"cmte_id": source}
+            relationships["committee_contributions"][sub_id] = {"source": source, "sub_id": sub_id, "target": target}
+            relationships["committee_contributed_to"][(source, target)] = {"source": source, "target": target}
+        elif classification == "candidate":
+            source = doc.row["source"]["candidate"]["cand_id"]
+            nodes["candidates"][source] = {"cand_id": source}
+            relationships["candidate_contributions"][sub_id] = {"source": source, "sub_id": sub_id, "target": target}
+            relationships["candidate_contributed_to"][(source, target)] = {"source": source, "target": target}
+        else:
+            donor = {
+                "entity_tp": doc.row["source"]["donor"]["entity_tp"],
+                "name": doc.processed["source"]["donor"]["name"].strip() if doc.processed["source"]["donor"]["name"] is not None else "",
+                "state": doc.row["source"]["donor"]["state"] or "",
+                "zip_code": clean_zip(doc.row["source"]["donor"]["zip_code"])
+            }
+            key = (donor["name"], donor["zip_code"])
+            relationships["donor_contributions"][sub_id] = {"name": donor["name"], "zip_code": donor["zip_code"], "sub_id": sub_id, "target": target}
+            relationships["donor_contributed_to"][key + (target,)] = {"name": donor["name"], "zip_code": donor["zip_code"], "target": target}
+            if classification == "individual":
+                donor["employer"] = doc.row["source"]["donor"]["employer"].strip() if doc.row["source"]["donor"]["employer"] is not None else ""
+                donor["occupation"] = doc.row["source"]["donor"]["occupation"].strip() if doc.row["source"]["donor"]["occupation"] is not None else ""
+                nodes["donors_ind"][key] = donor
+                nodes["employers"][donor["employer"]] = {"name": donor["employer"]}
+                nodes["jobs"][donor["occupation"]] = {"name": donor["occupation"]}
+                relationships["contribution_employers"][sub_id] = {"sub_id": sub_id, "employer": donor["employer"]}
+                relationships["contribution_jobs"][sub_id] = {"sub_id": sub_id, "occupation": donor["occupation"]}
+                relationships["donor_employers"][key + (donor["employer"],)] = {"name": donor["name"], "zip_code": donor["zip_code"], "employer": donor["employer"]}
+                relationships["donor_jobs"][key + (donor["occupation"],)] = {"name": donor["name"], "zip_code": donor["zip_code"], "occupation": donor["occupation"]}
+                if doc.row["source"]["donor"]["state"] is not None:
+                    state = doc.row["source"]["donor"]["state"]
+                    nodes["states"][state] = {"abbreviation": state}
+                    relationships["donor_states"][key + (state,)] = {"name": donor["name"], "zip_code": donor["zip_code"], "state": state}
+                if doc.row["source"]["donor"]["zip_code"] is not None:
+                    nodes["zips"][donor["zip_code"]] = {"zip_code": donor["zip_code"]}
+                    relationships["donor_zips"][key] = {"name": donor["name"], "zip_code": donor["zip_code"]}
+            else:
+                nodes["donors_org"][key] = donor
+                nodes["employers"][donor["name"]] = {"name": donor["name"]}
+                relationships["donor_employers"][key + (donor["name"],)] = {"name": donor["name"], "zip_code": donor["zip_code"], "employer": donor["name"]}
+
+    return {**nodes, **relationships}
@@ -1,5 +1,6 @@
 import logging
 from google.cloud import bigquery
+from google.cloud.exceptions import NotFound
 
 # format logs
 formatter = '%(asctime)s - %(levelname)s - %(message)s'
@@ -10,65 +11,169 @@ logger = logging.getLogger(__name__)
 # connect to resources
 client = bigquery.Client()
 
+# helper function to generate a new job config
+def gen_job_config():
+    job_config = bigquery.QueryJobConfig()
+    job_config.use_legacy_sql = False
+    return job_config
+
+# helper function to get the column names of a table, or None if the table does not exist
+def get_columns(table_ref):
+    try:
+        return [field.name for field in client.get_table(table_ref).schema]
+    except NotFound:
+        return None
+
+# helper function to save when each row of a master table was first loaded into a side table, before the master table is rebuilt
+# the elastic loaders page on loaded_at, so rows that keep it are not loaded again, and rows from before the column existed get the epoch so they count as loaded
+def save_loaded_at(table, key, key_type):
+    table_ref = client.dataset('federal_fec').table(table)
+    columns = get_columns(table_ref)
+    if columns is None:
+        query = f"SELECT CAST(NULL AS {key_type}) AS {key}, CAST(NULL AS TIMESTAMP) AS loaded_at LIMIT 0"
+    elif "loaded_at" not in columns:
+        query = f"SELECT {key}, TIMESTAMP '1970-01-01 00:00:00 UTC' AS loaded_at FROM `federal_fec.{table}` GROUP BY {key}"
+    else:
+        query = f"SELECT {key}, MIN(loaded_at) AS loaded_at FROM `federal_fec.{table}` GROUP BY {key}"
+    job_config = gen_job_config()
+    job_config.destination = client.dataset('federal_fec').table(table + "_loaded_at")
+    job_config.write_disposition = 'WRITE_TRUNCATE'
+    query_job = client.query(query, job_config=job_config)
+    query_job.result()
+    assert query_job.state == "DONE"
+
 # creates the candidates, committees, and contributions tables
 def federal_fec_ingest_create_master_tables(message, context):
 
+    # get the optional mode from the Pub/Sub message, where delta applies the changes in the delta tables instead of rebuilding contributions
+    mode = "full"
+    if 'attributes' in message:
+        if message['attributes'] is not None:
+            if "mode" in message["attributes"]:
+                mode = message["attributes"]["mode"]
+
     # set up bigquery
     dataset_ref = client.dataset('federal_fec')
     job_config = bigquery.QueryJobConfig()
     job_config.use_legacy_sql = False
 
-    # create master contributions table
-    table_ref = dataset_ref.table("contributions22")
-    logger.info(' - '.join(['INFO', 'deleting contributions table']))
-    client.delete_table(table_ref, not_found_ok=True)
-    logger.info(' - '.join(['INFO', 'creating contributions table']))
-    client.create_table(bigquery.Table(table_ref, schema=[
-        bigquery.SchemaField("cmte_id", "STRING"),
-        bigquery.SchemaField("other_id", "STRING"),
-        bigquery.SchemaField("amndt_ind", "STRING"),
-        bigquery.SchemaField("rpt_tp", "STRING"),
-        bigquery.SchemaField("transaction_pgi", "STRING"),
-        bigquery.SchemaField("transaction_tp", "STRING"),
-        bigquery.SchemaField("entity_tp", "STRING"),
-        bigquery.SchemaField("name", "STRING"),
-        bigquery.SchemaField("state", "STRING"),
-        bigquery.SchemaField("zip_code", "STRING"),
-        bigquery.SchemaField("employer", "STRING"),
-        bigquery.SchemaField("occupation", "STRING"),
-        bigquery.SchemaField("transaction_dt", "STRING"),
-        bigquery.SchemaField("transaction_amt", "FLOAT"),
-        bigquery.SchemaField("memo_text", "STRING"),
-        bigquery.SchemaField("image_num", "STRING"),
-        bigquery.SchemaField("file_num", "INTEGER"),
-        bigquery.SchemaField("tran_id", "STRING"),
-        bigquery.SchemaField("sub_id", "INTEGER")
-    ]))
-    logger.info(' - '.join(['START', 'loading contributions table']))
-    job_config.destination = None
-    contributions_job = client.query("""
-    INSERT INTO `federal_fec.contributions22` (cmte_id, other_id, amndt_ind, rpt_tp, transaction_pgi, transaction_tp, entity_tp, name, state, zip_code, employer, occupation, transaction_dt, transaction_amt, memo_text, image_num, file_num, tran_id, sub_id)
-    SELECT DISTINCT cmte_id, other_id, amndt_ind, rpt_tp, transaction_pgi, transaction_tp, entity_tp, name, state, SUBSTR(zip_code, 0, 5) AS zip_code, employer, occupation, CONCAT(SUBSTR(transaction_dt, 5, 4),'-',SUBSTR(transaction_dt, 1, 2),'-',SUBSTR(transaction_dt, 3, 2)) AS transaction_dt, transaction_amt, memo_text, image_num, file_num, tran_id, sub_id
-    FROM (
-        SELECT cmte_id, other_id, amndt_ind, rpt_tp, transaction_pgi, transaction_tp, entity_tp, name, state, zip_code, employer, occupation, transaction_dt, transaction_amt, memo_text, image_num, file_num, tran_id, sub_id
-        FROM `federal_fec.oth22`
-        WHERE memo_cd IS NULL
-        UNION ALL
-        SELECT cmte_id, other_id, amndt_ind, rpt_tp, transaction_pgi, transaction_tp, entity_tp, name, state, zip_code, employer, occupation, transaction_dt, transaction_amt, memo_text, image_num, file_num, tran_id, sub_id
-        FROM `federal_fec.indiv22`
-        WHERE memo_cd IS NULL
-    ) x
-    """, job_config=job_config)
-    contributions_job.result()
-    assert contributions_job.state == "DONE"
-    logger.info(' - '.join(['INFO', 'contributions table loaded']))
+    # apply the delta to the master contributions table if asked and the table exists with loaded_at, otherwise rebuild it
+    columns = get_columns(dataset_ref.table("contributions22"))
+    if mode == "delta" and columns is not None and "loaded_at" in columns:
+
+        # record which contributions changed, counting rows that became memos as deleted
+        logger.info(' - '.join(['START', 'creating contributions delta table']))
+        delta_job_config = gen_job_config()
+        delta_job_config.destination = dataset_ref.table("contributions_delta22")
+        delta_job_config.write_disposition = 'WRITE_TRUNCATE'
+        delta_job = client.query("""
+        SELECT sub_id, CASE WHEN change_type = 'delete' OR memo_cd IS NOT NULL THEN 'delete' ELSE 'upsert' END AS change_type
+        FROM (
+            SELECT sub_id, memo_cd, change_type
+            FROM `federal_fec.oth22_delta`
+            UNION ALL
+            SELECT sub_id, memo_cd, change_type
+            FROM `federal_fec.indiv22_delta`
+        ) x
+        WHERE NOT (change_type = 'insert' AND memo_cd IS NOT NULL)
+        """, job_config=delta_job_config)
+        delta_job.result()
+        assert delta_job.state == "DONE"
+        logger.info(' - '.join(['INFO', 'contributions delta table created', str(client.get_table(delta_job_config.destination).num_rows)]))
 
-    # create master expenditures table
+        # replace the changed contributions with their new versions, stamped with the time they were loaded so the elastic loader picks them up
+        # the delete and insert run in one transaction, so a failed insert rolls the delete back instead of leaving the changed contributions missing
+        logger.info(' - '.join(['START', 'replacing changed contributions']))
+        apply_job = client.query("""
+        BEGIN TRANSACTION;
+
+        DELETE FROM `federal_fec.contributions22`
+        WHERE sub_id IN (SELECT sub_id FROM `federal_fec.contributions_delta22`);
+
+        INSERT INTO `federal_fec.contributions22` (cmte_id, other_id, amndt_ind, rpt_tp, transaction_pgi, transaction_tp, entity_tp, name, state, zip_code, employer, occupation, transaction_dt, transaction_amt, memo_text, image_num, file_num, tran_id, sub_id, loaded_at)
+        SELECT DISTINCT cmte_id, other_id, amndt_ind, rpt_tp, transaction_pgi, transaction_tp, entity_tp, name, state, SUBSTR(zip_code, 0, 5) AS zip_code, employer, occupation, CONCAT(SUBSTR(transaction_dt, 5, 4),'-',SUBSTR(transaction_dt, 1, 2),'-',SUBSTR(transaction_dt, 3, 2)) AS transaction_dt, transaction_amt, memo_text, image_num, file_num, tran_id, sub_id, CURRENT_TIMESTAMP() AS loaded_at
+        FROM (
+            SELECT cmte_id, other_id, amndt_ind, rpt_tp, transaction_pgi, transaction_tp, entity_tp, name, state, zip_code, employer, occupation, transaction_dt, transaction_amt, memo_text, image_num, file_num, tran_id, sub_id
+            FROM `federal_fec.oth22_delta`
+            WHERE memo_cd IS NULL AND change_type != 'delete'
+            UNION ALL
+            SELECT cmte_id, other_id, amndt_ind, rpt_tp, transaction_pgi, transaction_tp, entity_tp, name, state, zip_code, employer, occupation, transaction_dt, transaction_amt, memo_text, image_num, file_num, tran_id, sub_id
+            FROM `federal_fec.indiv22_delta`
+            WHERE memo_cd IS NULL AND change_type != 'delete'
+        ) x;
+
+        COMMIT TRANSACTION;
+        """, job_config=gen_job_config())
+        apply_job.result()
+        assert apply_job.state == "DONE"
+        logger.info(' - '.join(['INFO', 'contributions delta applied']))
+
+    else:
+
+        # create master contributions table, keeping when each contribution was first loaded
+        table_ref = dataset_ref.table("contributions22")
+        logger.info(' - '.join(['INFO', 'saving when contributions were loaded']))
+        save_loaded_at("contributions22", "sub_id", "INT64")
+        logger.info(' - '.join(['INFO', 'deleting contributions table']))
+        client.delete_table(table_ref, not_found_ok=True)
+        logger.info(' - '.join(['INFO', 'creating contributions table']))
+        table = bigquery.Table(table_ref, schema=[
+            bigquery.SchemaField("cmte_id", "STRING"),
+            bigquery.SchemaField("other_id", "STRING"),
+            bigquery.SchemaField("amndt_ind", "STRING"),
+            bigquery.SchemaField("rpt_tp", "STRING"),
+            bigquery.SchemaField("transaction_pgi", "STRING"),
+            bigquery.SchemaField("transaction_tp", "STRING"),
+            bigquery.SchemaField("entity_tp", "STRING"),
+            bigquery.SchemaField("name", "STRING"),
+            bigquery.SchemaField("state", "STRING"),
+            bigquery.SchemaField("zip_code", "STRING"),
+            bigquery.SchemaField("employer", "STRING"),
+            bigquery.SchemaField("occupation", "STRING"),
+            bigquery.SchemaField("transaction_dt", "STRING"),
+            bigquery.SchemaField("transaction_amt", "FLOAT"),
+            bigquery.SchemaField("memo_text", "STRING"),
+            bigquery.SchemaField("image_num", "STRING"),
+            bigquery.SchemaField("file_num", "INTEGER"),
+            bigquery.SchemaField("tran_id", "STRING"),
+            bigquery.SchemaField("sub_id", "INTEGER"),
+            bigquery.SchemaField("loaded_at", "TIMESTAMP")
+        ])
+        # cluster on the keys the elastic loader pages through
+        table.clustering_fields = ["loaded_at", "sub_id"]
+        client.create_table(table)
+        logger.info(' - '.join(['START', 'loading contributions table']))
+        job_config.destination = None
+        contributions_job = client.query("""
+        INSERT INTO `federal_fec.contributions22` (cmte_id, other_id, amndt_ind, rpt_tp, transaction_pgi, transaction_tp, entity_tp, name, state, zip_code, employer, occupation, transaction_dt, transaction_amt, memo_text, image_num, file_num, tran_id, sub_id, loaded_at)
+        SELECT c.*, IFNULL(l.loaded_at, CURRENT_TIMESTAMP()) AS loaded_at
+        FROM (
+            SELECT DISTINCT cmte_id, other_id, amndt_ind, rpt_tp, transaction_pgi, transaction_tp, entity_tp, name, state, SUBSTR(zip_code, 0, 5) AS zip_code, employer, occupation, CONCAT(SUBSTR(transaction_dt, 5, 4),'-',SUBSTR(transaction_dt, 1, 2),'-',SUBSTR(transaction_dt, 3, 2)) AS transaction_dt, transaction_amt, memo_text, image_num, file_num, tran_id, sub_id
+            FROM (
+                SELECT cmte_id, other_id, amndt_ind, rpt_tp, transaction_pgi, transaction_tp, entity_tp, name, state, zip_code, employer, occupation, transaction_dt, transaction_amt, memo_text, image_num, file_num, tran_id, sub_id
+                FROM `federal_fec.oth22`
+                WHERE memo_cd IS NULL
+                UNION ALL
+                SELECT cmte_id, other_id, amndt_ind, rpt_tp, transaction_pgi, transaction_tp, entity_tp, name, state, zip_code, employer, occupation, transaction_dt, transaction_amt, memo_text, image_num, file_num, tran_id, sub_id
+                FROM `federal_fec.indiv22`
+                WHERE memo_cd IS NULL
+            ) x
+        ) c
+        LEFT JOIN `federal_fec.contributions22_loaded_at` l
+        ON c.sub_id = l.sub_id
+        """, job_config=job_config)
+        contributions_job.result()
+        assert contributions_job.state == "DONE"
+        logger.info(' - '.join(['INFO', 'contributions table loaded']))
+
+    # create master expenditures table, which is always rebuilt because independent expenditures have no sub_id to diff on, keeping when each expenditure was first loaded
     table_ref = dataset_ref.table("expenditures22")
+    logger.info(' - '.join(['INFO', 'saving when expenditures were loaded']))
+    save_loaded_at("expenditures22", "id", "STRING")
     logger.info(' - '.join(['INFO', 'deleting expenditures table']))
     client.delete_table(table_ref, not_found_ok=True)
     logger.info(' - '.join(['INFO', 'creating expenditures table']))
-    client.create_table(bigquery.Table(table_ref, schema=[
+    table = bigquery.Table(table_ref, schema=[
         bigquery.SchemaField("id", "STRING"),
         bigquery.SchemaField("type", "STRING"),
         bigquery.SchemaField("cmte_id", "STRING"),
@@ -113,24 +218,33 @@ def federal_fec_ingest_create_master_tables(message, context):
         bigquery.SchemaField("rec_dt", "STRING"),
         bigquery.SchemaField("prev_file_num", "INTEGER"),
         bigquery.SchemaField("back_ref_tran_id", "STRING"),
-        bigquery.SchemaField("sub_id", "INTEGER")
-    ]))
+        bigquery.SchemaField("sub_id", "INTEGER"),
+        bigquery.SchemaField("loaded_at", "TIMESTAMP")
+    ])
+    # cluster on the keys the elastic loader pages through
+    table.clustering_fields = ["loaded_at", "id"]
+    client.create_table(table)
     logger.info(' - '.join(['START', 'loading expenditures table']))
     job_config.destination = None
     expenditures_job = client.query("""
-    INSERT INTO `federal_fec.expenditures22` (id, type, cmte_id, cmte_nm, cmte_zip, cmte_dsgn, cmte_tp, cmte_pty_affiliation, cmte_filing_freq, org_tp, connected_org_nm, transaction_dt, transaction_amt, purpose, sup_opp, cand_id, cand_name, cand_pty_affiliation, cand_election_yr, cand_office_st, cand_office, cand_office_district, cand_ici, cand_pcc, cand_zip, category, category_desc, payee, entity_tp, state, zip_code, transaction_pgi, amndt_ind, image_num, file_num, tran_id, line_num, rpt_yr, rpt_tp, form_tp_cd, sched_tp_cd, rec_dt, prev_file_num, back_ref_tran_id, sub_id)
-    SELECT CAST(a.sub_id AS STRING) AS id, 'operating' AS type, a.cmte_id, b.cmte_nm, b.cmte_zip, b.cmte_dsgn, b.cmte_tp, b.cmte_pty_affiliation, b.cmte_filing_freq, b.org_tp, b.connected_org_nm, CAST(PARSE_DATE('%m/%d/%Y', a.transaction_dt) AS STRING) AS transaction_dt, a.transaction_amt, a.purpose, null AS sup_opp, null AS cand_id, null AS cand_name, null AS cand_pty_affiliation, null AS cand_election_yr, null AS cand_office_st, null AS cand_office, null AS cand_office_district, null as cand_ici, null as cand_pcc, null as cand_zip, a.category, a.category_desc, a.name as payee, a.entity_tp, a.state, SUBSTR(a.zip_code, 0, 5) AS zip_code, a.transaction_pgi, a.amndt_ind, a.image_num, a.file_num, a.tran_id, a.line_num, a.rpt_yr, a.rpt_tp, a.form_tp_cd, a.sched_tp_cd, null AS rec_dt, null AS prev_file_num, a.back_ref_tran_id, a.sub_id
-    FROM `federal_fec.oppexp22` a
-    LEFT JOIN `federal_fec.cm22` b
-    ON a.cmte_id = b.cmte_id
-    WHERE a.memo_cd IS NULL
-    UNION ALL
-    SELECT CONCAT(CAST(a.file_num AS STRING), '-' , a.tra_id), 'independent', a.spe_id, IFNULL(b.cmte_nm, a.spe_nam), b.cmte_zip, b.cmte_dsgn, b.cmte_tp, b.cmte_pty_affiliation, b.cmte_filing_freq, b.org_tp, b.connected_org_nm, CAST(PARSE_DATE('%d-%b-%y', CASE WHEN a.exp_dat = "" THEN null ELSE a.exp_dat END) AS STRING), a.exp_amo, a.pur, a.sup_opp, a.can_id, IFNULL(c.cand_name, a.can_nam), SUBSTR(IFNULL(c.cand_pty_affiliation, a.can_par_aff), 0, 3), IFNULL(c.cand_election_yr, a.fec_election_yr), IFNULL(c.cand_office_st, a.can_off_sta), IFNULL(c.cand_office, a.can_off), IFNULL(c.cand_office_district, a.can_off_dis), c.cand_ici, c.cand_pcc, c.cand_zip, null, null, a.pay, null, null, null, CONCAT(a.ele_typ, a.fec_election_yr), a.amn_ind, a.ima_num, a.file_num, a.tra_id, null, null, null, null, null, CAST(PARSE_DATE('%d-%b-%y', CASE WHEN a.rec_dt = "" THEN null ELSE a.rec_dt END) AS STRING), a.prev_file_num, null, null
-    FROM `federal_fec.independent_expenditure_2022` a
-    LEFT JOIN `federal_fec.cm22` b
-    ON a.spe_id = b.cmte_id
-    LEFT JOIN `federal_fec.cn22` c
-    ON a.can_id = c.cand_id
+    INSERT INTO `federal_fec.expenditures22` (id, type, cmte_id, cmte_nm, cmte_zip, cmte_dsgn, cmte_tp, cmte_pty_affiliation, cmte_filing_freq, org_tp, connected_org_nm, transaction_dt, transaction_amt, purpose, sup_opp, cand_id, cand_name, cand_pty_affiliation, cand_election_yr, cand_office_st, cand_office, cand_office_district, cand_ici, cand_pcc, cand_zip, category, category_desc, payee, entity_tp, state, zip_code, transaction_pgi, amndt_ind, image_num, file_num, tran_id, line_num, rpt_yr, rpt_tp, form_tp_cd, sched_tp_cd, rec_dt, prev_file_num, back_ref_tran_id, sub_id, loaded_at)
+    SELECT e.*, IFNULL(l.loaded_at, CURRENT_TIMESTAMP()) AS loaded_at
+    FROM (
+        SELECT CAST(a.sub_id AS STRING) AS id, 'operating' AS type, a.cmte_id, b.cmte_nm, b.cmte_zip, b.cmte_dsgn, b.cmte_tp, b.cmte_pty_affiliation, b.cmte_filing_freq, b.org_tp, b.connected_org_nm, CAST(PARSE_DATE('%m/%d/%Y', a.transaction_dt) AS STRING) AS transaction_dt, a.transaction_amt, a.purpose, null AS sup_opp, null AS cand_id, null AS cand_name, null AS cand_pty_affiliation, null AS cand_election_yr, null AS cand_office_st, null AS cand_office, null AS cand_office_district, null as cand_ici, null as cand_pcc, null as cand_zip, a.category, a.category_desc, a.name as payee, a.entity_tp, a.state, SUBSTR(a.zip_code, 0, 5) AS zip_code, a.transaction_pgi, a.amndt_ind, a.image_num, a.file_num, a.tran_id, a.line_num, a.rpt_yr, a.rpt_tp, a.form_tp_cd, a.sched_tp_cd, null AS rec_dt, null AS prev_file_num, a.back_ref_tran_id, a.sub_id
+        FROM `federal_fec.oppexp22` a
+        LEFT JOIN `federal_fec.cm22` b
+        ON a.cmte_id = b.cmte_id
+        WHERE a.memo_cd IS NULL
+        UNION ALL
+        SELECT CONCAT(CAST(a.file_num AS STRING), '-' , a.tra_id), 'independent', a.spe_id, IFNULL(b.cmte_nm, a.spe_nam), b.cmte_zip, b.cmte_dsgn, b.cmte_tp, b.cmte_pty_affiliation, b.cmte_filing_freq, b.org_tp, b.connected_org_nm, CAST(PARSE_DATE('%d-%b-%y', CASE WHEN a.exp_dat = "" THEN null ELSE a.exp_dat END) AS STRING), a.exp_amo, a.pur, a.sup_opp, a.can_id, IFNULL(c.cand_name, a.can_nam), SUBSTR(IFNULL(c.cand_pty_affiliation, a.can_par_aff), 0, 3), IFNULL(c.cand_election_yr, a.fec_election_yr), IFNULL(c.cand_office_st, a.can_off_sta), IFNULL(c.cand_office, a.can_off), IFNULL(c.cand_office_district, a.can_off_dis), c.cand_ici, c.cand_pcc, c.cand_zip, null, null, a.pay, null, null, null, CONCAT(a.ele_typ, a.fec_election_yr), a.amn_ind, a.ima_num, a.file_num, a.tra_id, null, null, null, null, null, CAST(PARSE_DATE('%d-%b-%y', CASE WHEN a.rec_dt = "" THEN null ELSE a.rec_dt END) AS STRING), a.prev_file_num, null, null
+        FROM `federal_fec.independent_expenditure_2022` a
+        LEFT JOIN `federal_fec.cm22` b
+        ON a.spe_id = b.cmte_id
+        LEFT JOIN `federal_fec.cn22` c
+        ON a.can_id = c.cand_id
+    ) e
+    LEFT JOIN `federal_fec.expenditures22_loaded_at` l
+    ON e.id = l.id
     """, job_config=job_config)
     expenditures_job.result()
     assert expenditures_job.state == "DONE"
@@ -0,0 +1,143 @@
+import time
+import random
+import logging
+import threading
+import email.utils
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# base url of the fec api
+base_url = "https://api.open.fec.gov/v1/"
+
+# status codes worth retrying
+retry_status_codes = (429, 500, 502, 503, 504)
+
+# helper function to read a Retry-After header as seconds to wait, whether it is given in seconds or as an http date, or None if it is missing or unreadable
+def parse_retry_after(retry_after, now=None):
+    if retry_after is None:
+        return None
+    try:
+        return max(0., float(retry_after))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    now = time.time() if now is None else now
+    return max(0., date.timestamp() - now)
+
+# helper function to get how long to wait before a retry, going by the Retry-After header if there is one and a jittered exponential backoff otherwise
+def get_delay(attempt, retry_after, initial_backoff=2, max_backoff=60):
+    delay = parse_retry_after(retry_after)
+    if delay is not None:
+        return min(max_backoff, delay)
+    return min(max_backoff, initial_backoff * 2 ** attempt) * random.uniform(0.5, 1)
+
+# token bucket that lets requests through at a steady rate, with short bursts up to its capacity
+class TokenBucket:
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    # block until a token is available and take it
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+# client for the fec api that can be shared by threads, with one pool of keep-alive connections and one rate limit
+# requests are spread out to stay under the hourly quota of the api key, which is updated from the X-RateLimit-Limit header the api sends back
+# with a shared quota, like a quotas.FirestoreQuota, every request also takes a call from the budget all instances using the key draw from
+# throttled and failed requests are retried after their Retry-After header or a bounded exponential backoff
+class Client:
+
+    def __init__(self, api_key, requests_per_hour=1000, burst=10, pool_size=16, timeout=30, max_retries=6, initial_backoff=2, max_backoff=60, base_url=base_url, quota=None, quota_block=4):
+        self.api_key = api_key
+        self.requests_per_hour = requests_per_hour
+        self.bucket = TokenBucket(requests_per_hour / 3600., burst)
+        self.quota = quota
+        self.quota_block = quota_block
+        self.quota_calls = 0
+        self.quota_reset = 0
+        self.quota_lock = threading.Lock()
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.base_url = base_url
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    # helper function to size the rate limit to the quota the api reports for the key
+    def adapt(self, headers):
+        try:
+            requests_per_hour = int(headers["X-RateLimit-Limit"])
+        except (KeyError, ValueError):
+            return
+        self.requests_per_hour = requests_per_hour
+        with self.bucket.lock:
+            self.bucket.rate = requests_per_hour / 3600.
+
+    # helper function to take a call from the shared quota, waiting for the next window if the current one is used up
+    # calls are taken a few at a time so that every request does not need a write, and calls left over when their window ends are dropped
+    def take_quota(self):
+        if self.quota is None:
+            return
+        while True:
+            with self.quota_lock:
+                now = time.time()
+                if self.quota_calls > 0 and now < self.quota_reset:
+                    self.quota_calls -= 1
+                    return
+                self.quota_calls, self.quota_reset = self.quota.take(self.quota_block, self.requests_per_hour, now)
+                if self.quota_calls > 0:
+                    continue
+                wait = self.quota_reset - now
+            time.sleep(wait)
+
+    # helper function to get how long to wait before a retry
+    def get_delay(self, attempt, retry_after):
+        return get_delay(attempt, retry_after, self.initial_backoff, self.max_backoff)
+
+    # get an endpoint of the api, like schedules/schedule_a/, and return the json it sends back
+    def get(self, path, params):
+        params = dict(params, api_key=self.api_key)
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            self.take_quota()
+            retry_after = None
+            try:
+                r = self.session.get(self.base_url + path, params=params, timeout=self.timeout)
+            except requests.exceptions.RequestException as e:
+                error = type(e).__name__
+            else:
+                self.adapt(r.headers)
+                if r.status_code == 200:
+                    return r.json()
+                if r.status_code not in retry_status_codes:
+                    r.raise_for_status()
+                error = str(r.status_code)
+                retry_after = r.headers.get("Retry-After")
+            if attempt == self.max_retries:
+                break
+            delay = self.get_delay(attempt, retry_after)
+            logger.warning(' - '.join(['WARNING', 'fec api request failed', path, error, 'retrying in ' + str(round(delay, 1)) + 's']))
+            time.sleep(delay)
+        raise RuntimeError(' - '.join(['fec api request failed', path, error]))
@@ -1,11 +1,14 @@
 import logging
 from google.cloud import secretmanager
+from google.cloud import firestore
 from elasticsearch import Elasticsearch, helpers
 import requests
 import datetime
 import pytz
-import json
-import time
+import concurrent.futures
+
+import fecapi
+import quotas
 
 # format logs
 formatter = '%(asctime)s - %(levelname)s - %(message)s'
@@ -22,15 +25,60 @@ federal_fec_api_key = secrets.access_secret_version(request={"name": "projects/9
 
 # connect to resources
 es = Elasticsearch(elastic_host, http_auth=(elastic_username_data, elastic_password_data), scheme="https", port=443)
+db = firestore.Client()
+
+# hourly quota of the fec api key, the client adjusts to the quota the api reports
+# every instance of every function using the key draws from the same quota in Firestore
+requests_per_hour = 1000
+quota = quotas.FirestoreQuota(db, db.collection('federal').document('fec').collection('quotas').document('api_key'))
+
+# number of report types and dates fetched at once
+workers = 8
 
 # connect to fec api
+client = fecapi.Client(federal_fec_api_key, requests_per_hour=requests_per_hour, quota=quota)
+
+# helper function to get a page of reports
 def get(type, datestring, page):
-    response = requests.get('https://api.open.fec.gov/v1/reports/' + type + '/?per_page=100&api_key=' + federal_fec_api_key + '&min_receipt_date=' + datestring + '&max_receipt_date=' + datestring + '&page=' + str(page))
-    if response.status_code == 200:
-        return json.loads(response.text)
-    return False
+    return client.get('reports/' + type + '/', {
+        'per_page': 100,
+        'min_receipt_date': datestring,
+        'max_receipt_date': datestring,
+        'page': page
+    })
+
+# helper function to page through the reports of one type received on one date and load them into Elasticsearch
+def load_reports(type, datestring):
+    actions = []
+    page = 1
+    while True:
+        # get data from fec api
+        response = get(type, datestring, page)
+        num_results = len(response["results"])
+        logger.info(' - '.join(['INFO', 'api response received', type, datestring, str(page), str(num_results)]))
+        # add results to actions
+        for result in response["results"]:
+            actions.append({
+                "_op_type": "index",
+                "_index": "federal_fec_financials",
+                "_id": result["beginning_image_number"],
+                "_source": {
+                    "obj": result,
+                    "context": {
+                        "last_indexed": datetime.datetime.now(datetime.timezone.utc)
+                    }
+                }
+            })
+        # iterate through pages, stopping at the last one
+        if num_results == 0 or page >= response["pagination"]["pages"]:
+            break
+        page += 1
+    # send results to Elasticsearch
+    helpers.bulk(es, actions)
+    return len(actions)
 
 # gets financials from FEC API and loads them into Elasticsearch
+# each report type and date is paged through on its own, side by side under the rate limit of the api key
 def federal_fec_ingest_get_financials(message, context):
 
     # set default datestring
@@ -51,40 +99,30 @@ def federal_fec_ingest_get_financials(message, context):
             if "enddate" in message["attributes"]:
                 endstring = message["attributes"]["enddate"]
 
+    # list the dates to get, walking back from the starting datestring
+    datestrings = []
     while datestring != endstring:
-
-        # get new data for date
-        actions = []
-        for type in ["presidential", "pac-party", "house-senate", "ie-only"]:
-            page = 1
-            num_results = -1
-            while num_results != 0:
-                response = False
-                # get data from fec api
-                while response is False:
-                    response = get(type, datestring, page)
-                    time.sleep(3)
-                num_results = len(response["results"])
-                logger.info(' - '.join(['INFO', 'api response received', type, datestring, str(page), str(num_results)]))
-                # add results to actions
-                for result in response["results"]:
-                    actions.append({
-                        "_op_type": "index",
-                        "_index": "federal_fec_financials",
-                        "_id": result["beginning_image_number"],
-                        "_source": {
-                            "obj": result,
-                            "context": {
-                                "last_indexed": datetime.datetime.now(datetime.timezone.utc)
-                            }
-                        }
-                    })
-                # iterate through pages
-                page += 1
-        # send results to Elasticsearch
-        helpers.bulk(es, actions)
-        actions = []
-        # get next date
+        datestrings.append(datestring)
         datestring = (datetime.datetime.strptime(datestring, '%Y-%m-%d')-datetime.timedelta(days=1)).strftime("%Y-%m-%d")
 
+    # get new data for every date and report type
+    failed = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = dict()
+        for datestring in datestrings:
+            for type in ["presidential", "pac-party", "house-senate", "ie-only"]:
+                futures[executor.submit(load_reports, type, datestring)] = (type, datestring)
+        for future in concurrent.futures.as_completed(futures):
+            type, datestring = futures[future]
+            try:
+                num_results = future.result()
+            except (RuntimeError, requests.exceptions.RequestException) as e:
+                logger.error(' - '.join(['ERROR', 'failed to load reports', type, datestring, str(e)]))
+                failed += 1
+                continue
+            logger.info(' - '.join(['INFO', 'reports loaded', type, datestring, str(num_results)]))
+
+    if failed > 0:
+        raise RuntimeError(str(failed) + ' report types and dates failed to load')
+
     return True
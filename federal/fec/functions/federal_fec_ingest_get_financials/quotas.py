@@ -0,0 +1,58 @@
+import time
+import threading
+
+from google.cloud import firestore
+
+# length of a window of the shared quota in seconds
+# each window only gets its share of the hourly quota, so however calls are spread no hour can hold more than a window over the quota
+window_seconds = 60
+
+# helper function to get the number of calls a window gets out of an hourly quota
+def get_allowance(requests_per_hour):
+    return max(1, int(requests_per_hour * window_seconds / 3600))
+
+# helper function to take up to count calls from the window a time falls in, returning the updated window and the number of calls taken
+def take_calls(window, count, requests_per_hour, now):
+    start = int(now // window_seconds * window_seconds)
+    if window is None or window["start"] != start:
+        window = {"start": start, "used": 0}
+    taken = max(0, min(count, get_allowance(requests_per_hour) - window["used"]))
+    return dict(window, used=window["used"] + taken), taken
+
+# helper function to get when the window a time falls in ends
+def get_reset(now):
+    return (int(now // window_seconds) + 1) * window_seconds
+
+# hourly quota of an api key kept as a window document in Firestore, so every instance using the key draws from the same budget
+class FirestoreQuota:
+
+    def __init__(self, db, ref):
+        self.db = db
+        self.ref = ref
+
+    # take up to count calls from the current window, returning the number taken and when the window ends
+    def take(self, count, requests_per_hour, now=None):
+        now = time.time() if now is None else now
+        return take_quota(self.db.transaction(), self.ref, count, requests_per_hour, now), get_reset(now)
+
+# helper function to read, take from and write a window in a transaction
+@firestore.transactional
+def take_quota(transaction, ref, count, requests_per_hour, now):
+    window, taken = take_calls(ref.get(transaction=transaction).to_dict(), count, requests_per_hour, now)
+    if taken > 0:
+        transaction.set(ref, window)
+    return taken
+
+# stand-in for FirestoreQuota that keeps the window in memory, for running locally and in tests
+class MemoryQuota:
+
+    def __init__(self):
+        self.window = None
+        self.lock = threading.Lock()
+
+    # take up to count calls from the current window, returning the number taken and when the window ends
+    def take(self, count, requests_per_hour, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            self.window, taken = take_calls(self.window, count, requests_per_hour, now)
+            return taken, get_reset(now)
@@ -0,0 +1,155 @@
+import json
+import time
+import socket
+import email.utils
+import threading
+import unittest
+import http.server
+import urllib.parse
+import concurrent.futures
+from unittest import mock
+
+import requests
+
+import fecapi
+import quotas
+
+# stub of the fec api that plays back a list of (status, headers, body) responses and records when each request came in
+# the last response is repeated, so a single response answers every request
+class StubHandler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests.append((time.monotonic(), urllib.parse.urlparse(self.path)))
+            status, headers, body = self.server.responses.pop(0) if len(self.server.responses) > 1 else self.server.responses[0]
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(json.dumps(body).encode())
+
+    def log_message(self, *args):
+        pass
+
+class TestClient(unittest.TestCase):
+
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.responses = [(200, {}, {"results": []})]
+        threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True).start()
+        self.base_url = "http://127.0.0.1:%d/v1/" % self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    # helper function to get a client for the stub, fast enough that only the behavior under test slows it down
+    def get_client(self, **kwargs):
+        settings = dict(requests_per_hour=3600000, burst=100, initial_backoff=0.01, max_backoff=0.05, base_url=self.base_url)
+        settings.update(kwargs)
+        return fecapi.Client("key", **settings)
+
+    def test_get(self):
+        self.assertEqual(self.get_client().get("schedules/schedule_a/", {"per_page": 100}), {"results": []})
+        url = self.server.requests[0][1]
+        self.assertEqual(url.path, "/v1/schedules/schedule_a/")
+        self.assertEqual(urllib.parse.parse_qs(url.query), {"per_page": ["100"], "api_key": ["key"]})
+
+    def test_retry_after(self):
+        self.server.responses = [(429, {"Retry-After": "0.3"}, {}), (200, {}, {"results": [1]})]
+        start = time.monotonic()
+        self.assertEqual(self.get_client(initial_backoff=5, max_backoff=5).get("filings/", {}), {"results": [1]})
+        self.assertGreaterEqual(time.monotonic() - start, 0.3)
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_retry_after_http_date(self):
+        self.server.responses = [(429, {"Retry-After": email.utils.formatdate(time.time(), usegmt=True)}, {}), (200, {}, {"results": [1]})]
+        start = time.monotonic()
+        self.assertEqual(self.get_client(initial_backoff=5, max_backoff=5).get("filings/", {}), {"results": [1]})
+        self.assertLess(time.monotonic() - start, 2)
+
+    def test_parse_retry_after(self):
+        now = time.time()
+        self.assertEqual(fecapi.parse_retry_after("7"), 7)
+        self.assertAlmostEqual(fecapi.parse_retry_after(email.utils.formatdate(now + 30, usegmt=True), now=now), 30, delta=1)
+        self.assertEqual(fecapi.parse_retry_after(email.utils.formatdate(now - 30, usegmt=True), now=now), 0)
+        self.assertIsNone(fecapi.parse_retry_after("soon"))
+
+    def test_backoff(self):
+        for attempt in range(8):
+            delay = fecapi.get_delay(attempt, None, initial_backoff=2, max_backoff=60)
+            self.assertGreaterEqual(delay, min(60, 2 * 2 ** attempt) / 2)
+            self.assertLessEqual(delay, min(60, 2 * 2 ** attempt))
+        self.assertEqual(fecapi.get_delay(0, "600", max_backoff=60), 60)
+
+    def test_retry_server_errors(self):
+        self.server.responses = [(503, {}, {}), (500, {}, {}), (502, {}, {}), (200, {}, {"results": [1]})]
+        self.assertEqual(self.get_client().get("filings/", {}), {"results": [1]})
+        self.assertEqual(len(self.server.requests), 4)
+
+    def test_give_up(self):
+        self.server.responses = [(503, {}, {})]
+        with self.assertRaises(RuntimeError):
+            self.get_client(max_retries=2).get("filings/", {})
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_client_error(self):
+        self.server.responses = [(403, {}, {})]
+        with self.assertRaises(requests.exceptions.HTTPError):
+            self.get_client().get("filings/", {})
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_connection_error(self):
+        closed = socket.socket()
+        closed.bind(("127.0.0.1", 0))
+        base_url = "http://127.0.0.1:%d/v1/" % closed.getsockname()[1]
+        closed.close()
+        with self.assertRaises(RuntimeError):
+            self.get_client(base_url=base_url, max_retries=1).get("filings/", {})
+
+    def test_quota_adaptation(self):
+        self.server.responses = [(200, {"X-RateLimit-Limit": "7200"}, {"results": []})]
+        client = self.get_client()
+        client.get("filings/", {})
+        self.assertAlmostEqual(client.bucket.rate, 2)
+
+    def test_concurrent_requests_share_the_rate(self):
+        client = self.get_client(requests_per_hour=20 * 3600, burst=1)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda i: client.get("filings/", {"page": i}), range(21)))
+        self.assertEqual(len(results), 21)
+        times = sorted(t for t, url in self.server.requests)
+        self.assertGreaterEqual(times[-1] - times[0], 0.9)
+        self.assertLess(times[-1] - times[0], 2)
+
+    def test_take_calls(self):
+        window, taken = quotas.take_calls(None, 4, 1000, 125)
+        self.assertEqual((window, taken), ({"start": 120, "used": 4}, 4))
+        window, taken = quotas.take_calls(dict(window, used=14), 4, 1000, 170)
+        self.assertEqual((window["used"], taken), (16, 2))
+        window, taken = quotas.take_calls(window, 4, 1000, 179)
+        self.assertEqual((window["used"], taken), (16, 0))
+        window, taken = quotas.take_calls(window, 4, 1000, 180)
+        self.assertEqual((window, taken), ({"start": 180, "used": 4}, 4))
+        self.assertEqual(quotas.get_reset(125), 180)
+
+    def test_instances_share_the_quota(self):
+        # two clients stand in for two instances, each allowed the full rate on its own but drawing from one quota of 10 calls every 0.5s
+        quota = quotas.MemoryQuota()
+        clients = [self.get_client(requests_per_hour=20 * 3600, quota=quota) for i in range(2)]
+        with mock.patch.object(quotas, "window_seconds", 0.5):
+            start = time.time()
+            with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+                results = list(executor.map(lambda i: clients[i % 2].get("filings/", {"page": i}), range(60)))
+        self.assertEqual(len(results), 60)
+        # 60 calls need at least 6 windows, and at most 15 if each window loses a block to a client whose calls run out before it ends
+        self.assertGreaterEqual(time.time() - start, 2.4)
+        self.assertLess(time.time() - start, 8)
+        self.assertLessEqual(quota.window["used"], 10)
+
+if __name__ == "__main__":
+    unittest.main()
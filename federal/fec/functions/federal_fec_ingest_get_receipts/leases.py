@@ -0,0 +1,164 @@
+import copy
+import datetime
+import threading
+
+from google.api_core import exceptions
+from google.cloud import firestore
+
+# lease expiry of partitions that have never been claimed
+never = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+# helper function to get the current time the way leases are stamped
+def get_now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+# helper function to get a new partition with the fields the scheduler keeps next to its data
+def get_new_partition(rank, data, complete):
+    return dict(data, rank=rank, complete=complete, owner=None, lease_expires=never, last_updated=get_now())
+
+# partitions of work stored as documents in a Firestore collection, which any number of workers can lease
+# an incomplete partition can be claimed by one worker at a time until its lease expires, and the highest ranked partitions are claimed first
+# checkpoints and completions only go through for the worker holding the lease, so a worker whose lease was taken over cannot overwrite the new holder
+# claiming needs a composite index on complete and rank descending
+class FirestoreLeases:
+
+    def __init__(self, db, collection, candidates=50):
+        self.db = db
+        self.collection = collection
+        self.candidates = candidates
+
+    # add a partition unless it already exists, returning whether it was added
+    def create(self, key, rank, data, complete=False):
+        try:
+            self.collection.document(key).create(get_new_partition(rank, data, complete))
+        except exceptions.AlreadyExists:
+            return False
+        return True
+
+    # helper function to get a page of incomplete partition snapshots, highest ranked first, after the snapshot start_after if there is one
+    def page(self, limit, start_after=None):
+        query = self.collection.where('complete', '==', False).order_by('rank', direction=firestore.Query.DESCENDING)
+        if start_after is not None:
+            query = query.start_after(start_after)
+        return list(query.limit(limit).get())
+
+    # get the incomplete partitions, highest ranked first
+    def incomplete(self, limit):
+        return [(doc.id, doc.to_dict()) for doc in self.page(limit)]
+
+    # get the lowest ranked partition, or None if there are none
+    def lowest(self):
+        for doc in self.collection.order_by('rank').limit(1).get():
+            return doc.id, doc.to_dict()
+        return None
+
+    # claim the highest ranked incomplete partition whose lease has expired, returning (key, partition) or None if there is none
+    # incomplete partitions are read candidates at a time, paging past the ones that are leased until a free one turns up or they run out
+    def claim(self, owner, duration):
+        now = get_now()
+        docs = self.page(self.candidates)
+        while len(docs) > 0:
+            for doc in docs:
+                if doc.to_dict()['lease_expires'] > now:
+                    continue
+                partition = claim_partition(self.db.transaction(), self.collection.document(doc.id), owner, now, duration)
+                if partition is not None:
+                    return doc.id, partition
+            if len(docs) < self.candidates:
+                break
+            docs = self.page(self.candidates, start_after=docs[-1])
+        return None
+
+    # save the progress of a leased partition and renew the lease, returning whether the lease was still held
+    def checkpoint(self, key, owner, duration, data):
+        now = get_now()
+        return update_partition(self.db.transaction(), self.collection.document(key), owner, dict(data, lease_expires=now+duration, last_updated=now))
+
+    # mark a leased partition as complete, returning whether the lease was still held
+    def complete(self, key, owner, data=None):
+        return update_partition(self.db.transaction(), self.collection.document(key), owner, dict(data or {}, complete=True, owner=None, lease_expires=never, last_updated=get_now()))
+
+    # give up the lease on a partition so another worker can claim it straight away, returning whether the lease was still held
+    def release(self, key, owner):
+        return update_partition(self.db.transaction(), self.collection.document(key), owner, {'owner': None, 'lease_expires': never, 'last_updated': get_now()})
+
+# helper function to take the lease on a partition if it is still free
+@firestore.transactional
+def claim_partition(transaction, ref, owner, now, duration):
+    partition = ref.get(transaction=transaction).to_dict()
+    if partition is None or partition['complete'] is True or partition['lease_expires'] > now:
+        return None
+    update = {'owner': owner, 'lease_expires': now+duration, 'last_updated': now}
+    transaction.update(ref, update)
+    partition.update(update)
+    return partition
+
+# helper function to update a partition if the lease is still held by the owner
+@firestore.transactional
+def update_partition(transaction, ref, owner, update):
+    partition = ref.get(transaction=transaction).to_dict()
+    if partition is None or partition['complete'] is True or partition['owner'] != owner or partition['lease_expires'] <= get_now():
+        return False
+    transaction.update(ref, update)
+    return True
+
+# stand-in for FirestoreLeases that keeps partitions in memory, for running the scheduler locally and in tests
+class MemoryLeases:
+
+    def __init__(self):
+        self.partitions = dict()
+        self.lock = threading.Lock()
+
+    # add a partition unless it already exists, returning whether it was added
+    def create(self, key, rank, data, complete=False):
+        with self.lock:
+            if key in self.partitions:
+                return False
+            self.partitions[key] = get_new_partition(rank, copy.deepcopy(data), complete)
+            return True
+
+    # get the incomplete partitions, highest ranked first
+    def incomplete(self, limit):
+        with self.lock:
+            partitions = sorted([(key, partition) for key, partition in self.partitions.items() if partition['complete'] is False], key=lambda item: item[1]['rank'], reverse=True)
+            return copy.deepcopy(partitions[:limit])
+
+    # get the lowest ranked partition, or None if there are none
+    def lowest(self):
+        with self.lock:
+            if len(self.partitions) == 0:
+                return None
+            return copy.deepcopy(min(self.partitions.items(), key=lambda item: item[1]['rank']))
+
+    # claim the highest ranked incomplete partition whose lease has expired, returning (key, partition) or None if there is none
+    def claim(self, owner, duration):
+        now = get_now()
+        with self.lock:
+            for key, partition in sorted(self.partitions.items(), key=lambda item: item[1]['rank'], reverse=True):
+                if partition['complete'] is True or partition['lease_expires'] > now:
+                    continue
+                partition.update({'owner': owner, 'lease_expires': now+duration, 'last_updated': now})
+                return key, copy.deepcopy(partition)
+        return None
+
+    # helper function to update a partition if the lease is still held by the owner
+    def update(self, key, owner, update):
+        with self.lock:
+            partition = self.partitions.get(key)
+            if partition is None or partition['complete'] is True or partition['owner'] != owner or partition['lease_expires'] <= get_now():
+                return False
+            partition.update(copy.deepcopy(update))
+            return True
+
+    # save the progress of a leased partition and renew the lease, returning whether the lease was still held
+    def checkpoint(self, key, owner, duration, data):
+        now = get_now()
+        return self.update(key, owner, dict(data, lease_expires=now+duration, last_updated=now))
+
+    # mark a leased partition as complete, returning whether the lease was still held
+    def complete(self, key, owner, data=None):
+        return self.update(key, owner, dict(data or {}, complete=True, owner=None, lease_expires=never, last_updated=get_now()))
+
+    # give up the lease on a partition so another worker can claim it straight away, returning whether the lease was still held
+    def release(self, key, owner):
+        return self.update(key, owner, {'owner': None, 'lease_expires': never, 'last_updated': get_now()})
@@ -5,9 +5,14 @@ from elasticsearch import Elasticsearch, helpers
 import requests
 import datetime
 import pytz
-import json
 import math
 import time
+import uuid
+import concurrent.futures
+
+import fecapi
+import leases
+import quotas
 
 # format logs
 formatter = '%(asctime)s - %(levelname)s - %(message)s'
@@ -30,28 +35,44 @@ db = firestore.Client()
 ref = db.collection('federal').document('fec').collection('schedule_a')
 min_cycle = 2016
 
+# hourly quota of the fec api key, the client adjusts to the quota the api reports
+# every instance of every function using the key draws from the same quota in Firestore
+requests_per_hour = 1000
+quota = quotas.FirestoreQuota(db, db.collection('federal').document('fec').collection('quotas').document('api_key'))
+
+# partitions of the backfill, leased out to workers
+partitions = leases.FirestoreLeases(db, db.collection('federal').document('fec').collection('schedule_a_partitions'))
+lease_duration = datetime.timedelta(minutes=5)
+
+# number of partitions each instance loads side by side
+workers = 6
+
+# number of incomplete partitions kept waiting ahead of the backfill
+backfill_window = 24
+
 # connect to fec api
+client = fecapi.Client(federal_fec_api_key, requests_per_hour=requests_per_hour, quota=quota)
+
+# helper function to get a page of schedule a
 def get(two_year_transaction_period, load_date, last_contribution_receipt_amount, last_index):
-    url = 'https://api.open.fec.gov/v1/schedules/schedule_a/?per_page=100&api_key=' + federal_fec_api_key + '&sort=-contribution_receipt_amount&two_year_transaction_period=' + str(two_year_transaction_period)
+    params = {
+        'per_page': 100,
+        'sort': '-contribution_receipt_amount',
+        'two_year_transaction_period': two_year_transaction_period
+    }
     if load_date is not None:
-        url += '&min_load_date=' + load_date.strftime('%Y-%m-%dT00:00:00.000Z')
-        url += '&max_load_date=' + (load_date+datetime.timedelta(days=1)).strftime('%Y-%m-%dT00:00:00.000Z')
+        params['min_load_date'] = load_date.strftime('%Y-%m-%dT00:00:00.000Z')
+        params['max_load_date'] = (load_date+datetime.timedelta(days=1)).strftime('%Y-%m-%dT00:00:00.000Z')
     if last_contribution_receipt_amount is not None:
-        url += '&last_contribution_receipt_amount=' + str(last_contribution_receipt_amount)
+        params['last_contribution_receipt_amount'] = last_contribution_receipt_amount
     if last_index is not None:
-        url += '&last_index=' + last_index
-    response = requests.get(url)
-    if response.status_code == 200:
-        return json.loads(response.text)
-    return False
+        params['last_index'] = last_index
+    return client.get('schedules/schedule_a/', params)
 
 # helper loop
 def loop(two_year_transaction_period, load_date, last_contribution_receipt_amount, last_index):
     actions = []
     response = get(two_year_transaction_period, load_date, last_contribution_receipt_amount, last_index)
-    while response is False:
-        time.sleep(3)
-        response = get(two_year_transaction_period, load_date, last_contribution_receipt_amount, last_index)
     for obj in response["results"]:
         processed_name = None
         if obj["is_individual"] is True:
@@ -90,11 +111,14 @@ def loop(two_year_transaction_period, load_date, last_contribution_receipt_amoun
     helpers.bulk(es, actions)
     return response["pagination"]
 
-# helper function to get iterables
-def get_iterables(iterables=None, reset=False, advance=False):
-
+# helper function to get the cycles to load for each load date, newest first
+def get_cycles():
     current_cycle = math.ceil(datetime.datetime.now().year/2.)*2
-    default_pagination = {
+    return [str(cycle) for cycle in range(current_cycle, min_cycle-1, -2)]
+
+# helper function to get the pagination of a cycle that has not been started
+def get_default_pagination():
+    return {
         "count": None,
         "pages": 0,
         "last_indexes": {
@@ -103,99 +127,132 @@ def get_iterables(iterables=None, reset=False, advance=False):
         }
     }
 
-    # set default values
-    if iterables is None:
-        iterables = {
-            "two_year_transaction_period": current_cycle,
-            "load_date": datetime.datetime.now(pytz.timezone('EST')),
-            "pagination": default_pagination,
-            "complete": False,
-            "last_updated": datetime.datetime.now()
-        }
-        # see if there is already a value in Firestore
-        doc = ref.document(iterables["load_date"].strftime('%Y-%m-%d')).get().to_dict()
-        if doc is not None:
-            iterables = doc
-            if iterables["complete"] is True:
-                advance = True
+# helper function to add the partition of a load date and cycle unless it already exists
+# partitions are ranked by load date and then cycle, so the newest are claimed first
+def create_partition(load_date, cycle, pagination=None, complete=False):
+    return partitions.create(load_date + '_' + cycle, load_date + '_' + cycle, {
+        "load_date": load_date,
+        "cycle": cycle,
+        "pagination": pagination if pagination is not None else get_default_pagination()
+    }, complete=complete)
 
-    # reset pagination if reset is True
-    if reset is True:
-        iterables["pagination"] = default_pagination
+# helper function to get the pagination of each cycle of a load date saved by the old one-at-a-time chain
+# cycles newer than the saved cycle were already done, and the saved cycle picks up where it left off
+def get_chain_cycles(iterables):
+    if "cycles" in iterables:
+        return iterables["cycles"]
+    cycles = dict()
+    for cycle in get_cycles():
+        if iterables["complete"] is True or int(cycle) > iterables["two_year_transaction_period"]:
+            cycles[cycle] = {"pagination": get_default_pagination(), "complete": True}
+        elif int(cycle) == iterables["two_year_transaction_period"]:
+            cycles[cycle] = {"pagination": iterables["pagination"], "complete": False}
+        else:
+            cycles[cycle] = {"pagination": get_default_pagination(), "complete": False}
+    return cycles
 
-    # continue looping backwards if advance is true
-    if advance is True:
+# helper function to carry over the load dates of the old one-at-a-time chain, so the backfill resumes where the chain stopped
+def import_chain():
+    docs = list(ref.where('complete', '==', False).get()) + list(ref.order_by('load_date').limit(1).get())
+    for doc in docs:
+        iterables = doc.to_dict()
+        load_date = iterables["load_date"].astimezone(pytz.timezone('EST')).strftime('%Y-%m-%d')
+        for cycle, partition in get_chain_cycles(iterables).items():
+            create_partition(load_date, cycle, pagination=partition["pagination"], complete=partition["complete"])
+        logger.info(' - '.join(['INFO', 'imported load date from chain', load_date]))
 
-        iterables["pagination"] = default_pagination
+# make sure there are partitions for today and enough older load dates waiting to be claimed
+# any number of instances can do this at once, since partitions that already exist are left alone
+def seed_partitions():
 
-        # if there are more cycles to grab, get those
-        if iterables["two_year_transaction_period"] - 2 >= min_cycle:
-            iterables["two_year_transaction_period"] = iterables["two_year_transaction_period"] - 2
-            logger.info(' - '.join(['INFO', 'looping to new cycle', iterables["load_date"].strftime('%Y-%m-%d'), str(iterables["two_year_transaction_period"])]))
+    # the first time, pick up from the old chain
+    if partitions.lowest() is None:
+        import_chain()
 
-        # otherwise, mark the load date as complete
-        else:
+    # partitions for today
+    today = datetime.datetime.now(pytz.timezone('EST')).strftime('%Y-%m-%d')
+    for cycle in get_cycles():
+        create_partition(today, cycle)
 
-            # update firestore
-            iterables["complete"] = True
-            ref.document(iterables["load_date"].strftime('%Y-%m-%d')).set(iterables, merge=True)
-            logger.info(' - '.join(['INFO', 'load_date completed', iterables["load_date"].strftime('%Y-%m-%d'), str(iterables["two_year_transaction_period"])]))
+    # extend the backfill one load date at a time, going backwards from the oldest load date
+    while len(partitions.incomplete(backfill_window)) < backfill_window:
+        key, lowest = partitions.lowest()
+        load_date = (datetime.datetime.strptime(lowest["load_date"], '%Y-%m-%d') - datetime.timedelta(days=1)).strftime('%Y-%m-%d')
+        for cycle in get_cycles():
+            create_partition(load_date, cycle)
+        logger.info(' - '.join(['INFO', 'backfill extended', load_date]))
 
-            # see if there are incomplete load dates in firestore
-            incomplete_iterables = False
-            docs = ref.where('complete', '==', False).order_by('load_date', direction=firestore.Query.DESCENDING).limit(1).get()
-            for doc in docs:
-                incomplete_iterables = doc.to_dict()
+# helper function to page through a leased partition until it is done, the lease is lost or the deadline passes, returning whether it is done
+def load_partition(key, partition, owner, deadline):
+    load_date = datetime.datetime.strptime(partition["load_date"], '%Y-%m-%d')
+    pagination = partition["pagination"]
+    while time.time() < deadline:
 
-            # pull new iterables from firestore if they exist, otherwise, check previous date
-            if incomplete_iterables is not False:
-                iterables = incomplete_iterables
-            else:
+        # get new results
+        try:
+            new_pagination = loop(int(partition["cycle"]), load_date, pagination["last_indexes"]["last_contribution_receipt_amount"], pagination["last_indexes"]["last_index"])
+        except (RuntimeError, requests.exceptions.RequestException) as e:
+            # keep the lease, so the partition is only retried once it expires
+            logger.error(' - '.join(['ERROR', 'stopping partition', key, str(e)]))
+            return False
 
-                # grab oldest completed iterable
-                docs = ref.where('complete', '==', True).order_by('load_date').limit(1).get()
-                for doc in docs:
-                    iterables = doc.to_dict()
+        # if the count changes because we are in the middle of an update, restart the pagination for this load_date and cycle combination
+        if partition["load_date"] == datetime.datetime.now(pytz.timezone('EST')).strftime('%Y-%m-%d') and pagination["count"] is not None and new_pagination["count"] != pagination["count"]:
+            logger.info(' - '.join(['INFO', 'restarting due to count change', key]))
+            pagination = get_default_pagination()
+        # if we are done paging, the partition is complete
+        elif new_pagination["last_indexes"] is None:
+            if partitions.complete(key, owner, {"pagination": pagination}) is False:
+                logger.info(' - '.join(['INFO', 'lease lost', key]))
+                return False
+            logger.info(' - '.join(['INFO', 'done paging', key]))
+            return True
+        # otherwise, update the pagination
+        else:
+            pagination = new_pagination
 
-                # iterate back one day
-                iterables["load_date"] = iterables["load_date"] - datetime.timedelta(days=1)
-                iterables["two_year_transaction_period"] = current_cycle
-                iterables["complete"] = False
+        # save the pagination and renew the lease
+        if partitions.checkpoint(key, owner, lease_duration, {"pagination": pagination}) is False:
+            logger.info(' - '.join(['INFO', 'lease lost', key]))
+            return False
 
-            logger.info(' - '.join(['INFO', 'loading new date', iterables["load_date"].strftime('%Y-%m-%d'), str(iterables["two_year_transaction_period"])]))
+    # hand the partition back for the next invocation
+    partitions.release(key, owner)
+    return False
 
-    return iterables
+# helper function to claim partitions and load them until there are none left or the deadline passes
+def work(owner, deadline):
+    completed = 0
+    while time.time() < deadline:
+        claimed = partitions.claim(owner, lease_duration)
+        if claimed is None:
+            break
+        key, partition = claimed
+        logger.info(' - '.join(['INFO', 'partition claimed', key, owner]))
+        if load_partition(key, partition, owner, deadline) is True:
+            completed += 1
+    return completed
 
 # gets schedule a data from FEC API and load into Elasticsearch
+# the backfill is split into load date and cycle partitions, which any number of instances and workers lease from Firestore
 def federal_fec_ingest_get_receipts(message, context):
 
-    # get iterables
-    iterables = get_iterables()
-    logger.info(' - '.join(['INFO', 'starting load', iterables["load_date"].strftime('%Y-%m-%d'), str(iterables["two_year_transaction_period"])]))
-
-    # loop through documents
-    start_time = time.time()
-    while time.time() - start_time < 520:
+    # get the optional number of workers from the Pub/Sub message
+    num_workers = workers
+    if 'attributes' in message:
+        if message['attributes'] is not None:
+            if "workers" in message["attributes"]:
+                num_workers = int(message["attributes"]["workers"])
 
-        # get new results
-        pagination = loop(iterables["two_year_transaction_period"], iterables["load_date"], iterables["pagination"]["last_indexes"]["last_contribution_receipt_amount"], iterables["pagination"]["last_indexes"]["last_index"])
-        iterables["last_updated"] = datetime.datetime.now()
+    # make sure there is work to claim
+    seed_partitions()
 
-        # if the count changes because we are in the middle of an update, restart the pagination for this load_date and cycle combination
-        if iterables["load_date"].strftime('%Y-%m-%d') == datetime.datetime.now(pytz.timezone('EST')).strftime('%Y-%m-%d') and iterables["pagination"]["count"] is not None and pagination["count"] != iterables["pagination"]["count"]:
-            logger.info(' - '.join(['INFO', 'restarting due to count change', iterables["load_date"].strftime('%Y-%m-%d'), str(iterables["two_year_transaction_period"])]))
-            iterables = get_iterables(iterables=iterables, reset=True)
-        else:
-            # if we are done paging, get new iterables
-            if pagination["last_indexes"] is None:
-                logger.info(' - '.join(['INFO', 'done paging', iterables["load_date"].strftime('%Y-%m-%d'), str(iterables["two_year_transaction_period"])]))
-                iterables = get_iterables(iterables=iterables, advance=True)
-            # otherwise, update the pagination
-            else:
-                iterables["pagination"] = pagination
-
-    # update iterables in firestore
-    ref.document(iterables["load_date"].strftime('%Y-%m-%d')).set(iterables, merge=True)
-    logger.info(' - '.join(['INFO', 'firestore updated', iterables["load_date"].strftime('%Y-%m-%d'), str(iterables["two_year_transaction_period"])]))
+    # claim and load partitions side by side, each worker with its own lease owner
+    instance = uuid.uuid4().hex
+    deadline = time.time() + 520
+    with concurrent.futures.ThreadPoolExecutor(max_workers=num_workers) as executor:
+        futures = [executor.submit(work, instance + '_' + str(i), deadline) for i in range(num_workers)]
+        completed = sum(future.result() for future in futures)
 
+    logger.info(' - '.join(['INFO', 'partitions completed', str(completed)]))
     return True
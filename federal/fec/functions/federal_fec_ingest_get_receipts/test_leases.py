@@ -0,0 +1,104 @@
+import datetime
+import unittest
+from unittest import mock
+
+import leases
+
+# stand-ins for the parts of a Firestore collection FirestoreLeases uses, keeping documents in a dict and recording every page read
+class FakeSnapshot:
+
+    def __init__(self, id, data):
+        self.id = id
+        self.data = data
+
+    def to_dict(self):
+        return None if self.data is None else dict(self.data)
+
+class FakeRef:
+
+    def __init__(self, collection, id):
+        self.collection = collection
+        self.id = id
+
+    def get(self, transaction=None):
+        return FakeSnapshot(self.id, self.collection.documents.get(self.id))
+
+class FakeQuery:
+
+    def __init__(self, collection, filters=(), order=None, start_after=None):
+        self.collection = collection
+        self.filters = filters
+        self.order = order
+        self.after = start_after
+
+    def where(self, field, op, value):
+        return FakeQuery(self.collection, self.filters + ((field, value),), self.order, self.after)
+
+    def order_by(self, field, direction=None):
+        return FakeQuery(self.collection, self.filters, field, self.after)
+
+    def start_after(self, snapshot):
+        return FakeQuery(self.collection, self.filters, self.order, snapshot)
+
+    def limit(self, n):
+        self.n = n
+        return self
+
+    def get(self):
+        docs = sorted([(id, data) for id, data in self.collection.documents.items() if all(data[field] == value for field, value in self.filters)], key=lambda item: item[1][self.order], reverse=True)
+        if self.after is not None:
+            docs = docs[[id for id, data in docs].index(self.after.id) + 1:]
+        self.collection.pages.append(self.after)
+        return [FakeSnapshot(id, data) for id, data in docs[:self.n]]
+
+class FakeCollection(FakeQuery):
+
+    def __init__(self):
+        super().__init__(self)
+        self.documents = dict()
+        self.pages = []
+
+    def document(self, id):
+        return FakeRef(self, id)
+
+class FakeTransaction:
+
+    def update(self, ref, update):
+        ref.collection.documents[ref.id].update(update)
+
+class TestFirestoreLeases(unittest.TestCase):
+
+    def setUp(self):
+        self.collection = FakeCollection()
+        self.partitions = leases.FirestoreLeases(mock.Mock(), self.collection, candidates=5)
+        # run the body of the transaction against the fake collection
+        claim_partition = leases.claim_partition.to_wrap
+        patch = mock.patch.object(leases, "claim_partition", lambda transaction, *args: claim_partition(FakeTransaction(), *args))
+        patch.start()
+        self.addCleanup(patch.stop)
+        for i in range(12):
+            self.collection.documents["p%02d" % i] = leases.get_new_partition(i, {}, False)
+
+    def test_claim_highest_ranked(self):
+        self.assertEqual(self.partitions.claim("a", datetime.timedelta(minutes=5))[0], "p11")
+        self.assertEqual(self.partitions.claim("b", datetime.timedelta(minutes=5))[0], "p10")
+        self.assertEqual(self.collection.documents["p11"]["owner"], "a")
+        self.assertEqual(len(self.collection.pages), 2)
+
+    def test_claim_pages_past_leased_partitions(self):
+        for i in range(11):
+            self.assertIsNotNone(self.partitions.claim("worker_" + str(i), datetime.timedelta(minutes=5)))
+        self.collection.pages.clear()
+        self.assertEqual(self.partitions.claim("late", datetime.timedelta(minutes=5))[0], "p00")
+        self.assertEqual(len(self.collection.pages), 3)
+        self.assertIsNone(self.partitions.claim("later", datetime.timedelta(minutes=5)))
+        self.assertEqual(len(set(partition["owner"] for partition in self.collection.documents.values())), 12)
+
+    def test_claim_skips_complete_partitions(self):
+        for i in range(12):
+            self.collection.documents["p%02d" % i]["complete"] = i != 3
+        self.assertEqual(self.partitions.claim("a", datetime.timedelta(minutes=5))[0], "p03")
+        self.assertIsNone(self.partitions.claim("b", datetime.timedelta(minutes=5)))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import time
+import datetime
+import threading
+import unittest
+from unittest import mock
+
+from google.cloud import secretmanager
+from google.cloud import firestore
+import elasticsearch
+
+import leases
+
+# import the function without reaching Secret Manager, Firestore or Elasticsearch
+with mock.patch.object(secretmanager, "SecretManagerServiceClient"), mock.patch.object(firestore, "Client"), mock.patch.object(elasticsearch, "Elasticsearch"):
+    import main
+
+# stub of schedule a that serves a fixed number of pages for each load date and cycle and records every page asked for
+# pages listed in failures raise the first time they are asked for, like a request that ran out of retries
+class StubAPI:
+
+    def __init__(self, pages=3, failures=(), delay=0.002):
+        self.pages = pages
+        self.failures = set(failures)
+        self.delay = delay
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def get(self, two_year_transaction_period, load_date, last_contribution_receipt_amount, last_index):
+        page = 0 if last_index is None else int(last_index)
+        request = (load_date.strftime('%Y-%m-%d'), str(two_year_transaction_period), page)
+        with self.lock:
+            self.requests.append(request)
+            fail = request in self.failures
+            self.failures.discard(request)
+        time.sleep(self.delay)
+        if fail:
+            raise RuntimeError("fec api request failed")
+        last_indexes = None
+        if page + 1 < self.pages:
+            last_indexes = {"last_contribution_receipt_amount": 100 - page, "last_index": str(page + 1)}
+        return {"results": [], "pagination": {"count": self.pages * 100, "pages": self.pages, "last_indexes": last_indexes}}
+
+class TestScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.api = StubAPI()
+        self.partitions = leases.MemoryLeases()
+        patches = [
+            mock.patch.object(main, "partitions", self.partitions),
+            mock.patch.object(main, "get", self.api.get),
+            mock.patch.object(main.helpers, "bulk"),
+            mock.patch.object(main, "import_chain"),
+            mock.patch.object(main, "lease_duration", datetime.timedelta(seconds=0.2))
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        main.seed_partitions()
+
+    # helper function to run workers side by side like an instance does, returning the number of partitions they completed
+    def run_workers(self, num_workers, deadline):
+        results = []
+        threads = [threading.Thread(target=lambda i=i: results.append(main.work("instance_" + str(i), deadline))) for i in range(num_workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return sum(results)
+
+    def test_seed(self):
+        self.assertGreaterEqual(len(self.partitions.incomplete(1000)), main.backfill_window)
+        today = datetime.datetime.now(main.pytz.timezone('EST')).strftime('%Y-%m-%d')
+        for cycle in main.get_cycles():
+            self.assertIn(today + '_' + cycle, self.partitions.partitions)
+
+    def test_workers_load_every_page_once(self):
+        num_partitions = len(self.partitions.partitions)
+        completed = self.run_workers(12, time.time() + 30)
+        self.assertEqual(completed, num_partitions)
+        self.assertTrue(all(partition["complete"] for partition in self.partitions.partitions.values()))
+        self.assertEqual(len(self.api.requests), num_partitions * self.api.pages)
+        self.assertEqual(len(set(self.api.requests)), len(self.api.requests))
+
+    def test_failed_partitions_are_picked_up_after_the_lease_expires(self):
+        keys = sorted(self.partitions.partitions)[:3]
+        self.api.failures = {tuple(key.split('_')) + (1,) for key in keys}
+        num_partitions = len(self.partitions.partitions)
+        completed = 0
+        deadline = time.time() + 30
+        while len(self.partitions.incomplete(1)) > 0 and time.time() < deadline:
+            completed += self.run_workers(12, deadline)
+            time.sleep(0.05)
+        self.assertEqual(completed, num_partitions)
+        self.assertEqual(len(self.api.failures), 0)
+        self.assertEqual(len(self.api.requests), num_partitions * self.api.pages + len(keys))
+
+    def test_lost_lease_is_not_completed(self):
+        self.api.pages = 1
+        key, partition = self.partitions.claim("instance_a", datetime.timedelta(seconds=0.05))
+        time.sleep(0.1)
+        self.assertEqual(self.partitions.claim("instance_b", datetime.timedelta(seconds=60))[0], key)
+        self.assertFalse(main.load_partition(key, partition, "instance_a", time.time() + 30))
+        self.assertFalse(self.partitions.partitions[key]["complete"])
+        self.assertEqual(self.partitions.partitions[key]["owner"], "instance_b")
+
+    def test_release_at_deadline(self):
+        key, partition = self.partitions.claim("instance_a", main.lease_duration)
+        self.assertFalse(main.load_partition(key, partition, "instance_a", time.time()))
+        self.assertIsNone(self.partitions.partitions[key]["owner"])
+        self.assertEqual(self.partitions.claim("instance_b", main.lease_duration)[0], key)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import zipfile
+import pyarrow
+import pyarrow.csv
+import pyarrow.compute as pc
+
+import schemas
+
+# arrow types of the bigquery field types
+arrow_types = {
+    "STRING": pyarrow.string(),
+    "FLOAT": pyarrow.float64(),
+    "INTEGER": pyarrow.int64()
+}
+
+# helper function to open a bulk file, reading the first file inside of zips
+def open_file(source):
+    if not isinstance(source, str):
+        return source
+    if source.endswith(".zip"):
+        archive = zipfile.ZipFile(source)
+        return archive.open(archive.namelist()[0])
+    return open(source, "rb")
+
+# helper function to convert MMDDYYYY dates into YYYY-MM-DD
+def normalize_mmddyyyy(column):
+    return pc.binary_join_element_wise(pc.utf8_slice_codeunits(column, 4, 8), pc.utf8_slice_codeunits(column, 0, 2), pc.utf8_slice_codeunits(column, 2, 4), "-")
+
+# helper function to convert MM/DD/YYYY dates into YYYY-MM-DD, leaving malformed dates null so one bad row does not fail the whole file
+def normalize_mm_dd_yyyy(column):
+    return pc.cast(pc.cast(pc.strptime(column, format="%m/%d/%Y", unit="s", error_is_null=True), pyarrow.date32()), pyarrow.string())
+
+# helper function to truncate zip codes to five digits
+def normalize_zip5(column):
+    return pc.utf8_slice_codeunits(column, 0, 5)
+
+normalize_functions = {
+    "mmddyyyy": normalize_mmddyyyy,
+    "mm/dd/yyyy": normalize_mm_dd_yyyy,
+    "zip5": normalize_zip5
+}
+
+# helper function to normalize the columns of a batch
+def normalize_batch(batch, normalizers):
+    columns = []
+    for name, column in zip(batch.schema.names, batch.columns):
+        if name in normalizers:
+            column = normalize_functions[normalizers[name]](column)
+        columns.append(column)
+    return pyarrow.RecordBatch.from_arrays(columns, names=batch.schema.names)
+
+# stream typed arrow record batches from an FEC bulk file, reading a block at a time so memory stays bounded
+# source can be a path to a .txt, .csv or .zip file or an open binary file, and pipe-delimited .txt files are read without quoting like the bigquery load
+def read_batches(source, table, pipe_delimited=True, block_size=64*1024*1024, normalize=True):
+
+    # get the schema
+    fields = schemas.get_fields(table)
+    if fields is None:
+        raise ValueError("unexpected table " + table)
+    names = [name for name, field_type in fields]
+    column_types = {name: arrow_types[field_type] for name, field_type in fields}
+    normalizers = schemas.get_normalizers(table) if normalize else dict()
+
+    # set up the reader the same way the bigquery load is configured, with empty fields as nulls
+    if pipe_delimited:
+        read_options = pyarrow.csv.ReadOptions(column_names=names, block_size=block_size)
+        parse_options = pyarrow.csv.ParseOptions(delimiter="|", quote_char=False)
+    else:
+        read_options = pyarrow.csv.ReadOptions(column_names=names, block_size=block_size, skip_rows=1)
+        parse_options = pyarrow.csv.ParseOptions(delimiter=",", quote_char="\"")
+    convert_options = pyarrow.csv.ConvertOptions(column_types=column_types, null_values=[""], strings_can_be_null=True)
+
+    # stream the batches
+    f = open_file(source)
+    try:
+        reader = pyarrow.csv.open_csv(f, read_options=read_options, parse_options=parse_options, convert_options=convert_options)
+        for batch in reader:
+            if len(normalizers) > 0:
+                batch = normalize_batch(batch, normalizers)
+            yield batch
+    finally:
+        if isinstance(source, str):
+            f.close()
@@ -0,0 +1,178 @@
+import os
+import logging
+import argparse
+import tempfile
+import numpy as np
+import pandas
+import pyarrow
+import pyarrow.ipc
+import pyarrow.parquet as pq
+
+import schemas
+import bulk_reader
+
+# format logs
+formatter = '%(asctime)s - %(levelname)s - %(message)s'
+logging.basicConfig(format=formatter, level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# name of the column that holds the hash of each row while partitioning
+hash_column = "row_hash"
+
+# name of the column that records what happened to each row in the delta
+change_column = "change_type"
+
+# helper function to hash each row of a batch, so rows can be compared without keeping them in memory
+# every column is cast to strings in arrow first, since pandas turns an integer column with a null into floats and that would change the hash of every row in the block
+def hash_batch(batch):
+    columns = {name: column.cast(pyarrow.string()).to_pandas() for name, column in zip(batch.schema.names, batch.columns)}
+    return pandas.util.hash_pandas_object(pandas.DataFrame(columns), index=False).values
+
+# directory of partition files on local disk
+class LocalDirectory:
+
+    def __init__(self, path):
+        self.path = path
+
+    def open(self, name, mode):
+        return open(os.path.join(self.path, name), mode)
+
+    def exists(self, name):
+        return os.path.exists(os.path.join(self.path, name))
+
+# helper function to split a bulk file into partition files by key, with the hash of each row alongside it
+# rows without a key cannot be matched between snapshots, so they are dropped
+def partition(source, table, key, partitions, directory, name, pipe_delimited=True):
+
+    writers = dict()
+    files = []
+    count = 0
+    try:
+        for batch in bulk_reader.read_batches(source, table, pipe_delimited=pipe_delimited, normalize=False):
+            batch = batch.filter(batch.column(key).is_valid())
+            if batch.num_rows == 0:
+                continue
+            batch = pyarrow.RecordBatch.from_arrays(batch.columns + [pyarrow.array(hash_batch(batch))], names=batch.schema.names + [hash_column])
+            buckets = batch.column(key).to_numpy() % partitions
+            for p in np.unique(buckets):
+                if p not in writers:
+                    files.append(directory.open("%s-%05d.arrow" % (name, p), "wb"))
+                    writers[p] = pyarrow.ipc.new_file(files[-1], batch.schema)
+                writers[p].write_batch(batch.filter(pyarrow.array(buckets == p)))
+            count += batch.num_rows
+    finally:
+        for writer in writers.values():
+            writer.close()
+        for f in files:
+            f.close()
+
+    return count
+
+# helper function to read a partition file, or None if no rows landed in it
+def read_partition(directory, name, p):
+    name = "%s-%05d.arrow" % (name, p)
+    if not directory.exists(name):
+        return None
+    with directory.open(name, "rb") as f:
+        return pyarrow.ipc.open_file(f).read_all()
+
+# helper function to get a table of rows tagged with a change type, without the hash column
+def tag_rows(rows, change_type):
+    rows = rows.drop([hash_column])
+    return rows.append_column(change_column, pyarrow.array([change_type] * rows.num_rows, pyarrow.string()))
+
+# helper function to diff the old and new rows of one partition, keeping the last row of any repeated key
+def diff_partition(old, new, key):
+
+    changes = []
+
+    # index the old keys and hashes of the partition
+    if old is not None:
+        old_df = old.select([key, hash_column]).to_pandas()
+        old_df = old_df.drop_duplicates(key, keep="last")
+        old = old.take(pyarrow.array(old_df.index.values))
+        old_keys = pandas.Index(old_df[key].values)
+        old_hashes = old_df[hash_column].values
+    else:
+        old_keys = pandas.Index([])
+        old_hashes = np.array([], dtype=np.uint64)
+
+    # new keys are inserts, and keys with a different hash are updates
+    if new is not None:
+        new_df = new.select([key, hash_column]).to_pandas()
+        new_df = new_df.drop_duplicates(key, keep="last")
+        new = new.take(pyarrow.array(new_df.index.values))
+        indexes = old_keys.get_indexer(new_df[key].values)
+        inserted = indexes == -1
+        updated = np.zeros(len(indexes), dtype=bool)
+        updated[~inserted] = old_hashes[indexes[~inserted]] != new_df[hash_column].values[~inserted]
+        if inserted.any():
+            changes.append(tag_rows(new.filter(pyarrow.array(inserted)), "insert"))
+        if updated.any():
+            changes.append(tag_rows(new.filter(pyarrow.array(updated)), "update"))
+        new_keys = new_df[key].values
+    else:
+        new_keys = np.array([])
+
+    # old keys that are gone are deletes
+    if old is not None:
+        deleted = ~old_keys.isin(new_keys)
+        if deleted.any():
+            changes.append(tag_rows(old.filter(pyarrow.array(deleted)), "delete"))
+
+    return changes
+
+# stream the rows that were inserted, updated or deleted between two snapshots of a bulk file as arrow record batches
+# both files are hash-partitioned by key first, so only one partition is ever held in memory
+# partitions go to directory, which only needs open and exists like LocalDirectory, or to a temporary directory under workdir on local disk if no directory is given
+# old can be None, in which case every row of the new file is an insert
+def diff(old, new, table, partitions=64, workdir=None, pipe_delimited=True, directory=None):
+
+    # get the key
+    key = schemas.get_key(table)
+    if key is None:
+        raise ValueError("table cannot be diffed " + table)
+
+    # use a temporary directory if no directory is given
+    if directory is None:
+        with tempfile.TemporaryDirectory(dir=workdir) as path:
+            yield from diff(old, new, table, partitions=partitions, pipe_delimited=pipe_delimited, directory=LocalDirectory(path))
+        return
+
+    # partition both snapshots
+    old_count = 0
+    if old is not None:
+        old_count = partition(old, table, key, partitions, directory, "old", pipe_delimited=pipe_delimited)
+    new_count = partition(new, table, key, partitions, directory, "new", pipe_delimited=pipe_delimited)
+    logger.info(' - '.join(['INFO', 'snapshots partitioned', table, str(old_count), str(new_count)]))
+
+    # diff one partition at a time
+    for p in range(partitions):
+        for changes in diff_partition(read_partition(directory, "old", p), read_partition(directory, "new", p), key):
+            for batch in changes.to_batches():
+                yield batch
+
+# helper function to count the changes in a stream of delta batches while passing them along
+def count_changes(batches, counts):
+    for batch in batches:
+        for change_type, count in zip(*np.unique(batch.column(change_column).to_numpy(zero_copy_only=False), return_counts=True)):
+            counts[change_type] = counts.get(change_type, 0) + int(count)
+        yield batch
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Diff two snapshots of an FEC bulk file into a parquet file of inserted, updated and deleted rows")
+    parser.add_argument("old", help="previous snapshot of the bulk file")
+    parser.add_argument("new", help="new snapshot of the bulk file")
+    parser.add_argument("table", help="BigQuery table the file is imported into, like indiv22")
+    parser.add_argument("output", help="parquet file to write the delta to")
+    parser.add_argument("--partitions", type=int, default=64, help="number of partitions to split the snapshots into")
+    args = parser.parse_args()
+    counts = dict()
+    writer = None
+    for batch in count_changes(diff(args.old, args.new, args.table, partitions=args.partitions, pipe_delimited=not args.new.endswith(".csv")), counts):
+        if writer is None:
+            writer = pq.ParquetWriter(args.output, batch.schema, compression="snappy")
+        writer.write_table(pyarrow.Table.from_batches([batch]))
+    if writer is not None:
+        writer.close()
+    logger.info(' - '.join(['FINISHED DIFFING', args.table, str(counts.get("insert", 0)) + ' inserted', str(counts.get("update", 0)) + ' updated', str(counts.get("delete", 0)) + ' deleted']))
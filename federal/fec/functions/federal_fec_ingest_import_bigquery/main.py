@@ -1,6 +1,13 @@
 import logging
 from google.cloud import secretmanager
 from google.cloud import bigquery
+from google.cloud import storage
+import pyarrow
+import pyarrow.parquet as pq
+
+import schemas
+import bulk_reader
+import delta
 
 # format logs
 formatter = '%(asctime)s - %(levelname)s - %(message)s'
@@ -14,6 +21,115 @@ gcp_project_id = secrets.access_secret_version(request={"name": "projects/952416
 
 # connect to resources
 client = bigquery.Client()
+storage_client = storage.Client()
+
+# number of rows written to each parquet file
+parquet_file_rows = 5000000
+
+# size of the chunks partition files are written to and read from Google Cloud Storage in, which bounds the memory each open partition takes
+partition_chunk_size = 1024 * 1024
+
+# directory of delta partition files in Google Cloud Storage, since /tmp on Cloud Functions is held in memory and would have to fit both snapshots
+class BucketDirectory:
+
+    def __init__(self, bucket, prefix):
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def open(self, name, mode):
+        return self.bucket.blob(self.prefix + name).open(mode, chunk_size=partition_chunk_size)
+
+    def exists(self, name):
+        return self.bucket.blob(self.prefix + name).exists()
+
+    # delete every partition file in the directory
+    def clear(self):
+        for blob in storage_client.list_blobs(self.bucket, prefix=self.prefix):
+            blob.delete()
+
+# helper function to write a stream of record batches to dictionary-encoded parquet files in Google Cloud Storage, replacing any files already under the prefix
+def write_parquet(batches, prefix):
+
+    # clear out parquet files from the last run
+    bucket = storage_client.bucket(gcp_project_id)
+    for blob in storage_client.list_blobs(bucket, prefix=prefix):
+        blob.delete()
+
+    # split the batches into parts
+    part = 0
+    rows = 0
+    writer = None
+    f = None
+    for batch in batches:
+        if writer is None:
+            f = bucket.blob(prefix + "part-%05d.parquet" % part).open("wb")
+            writer = pq.ParquetWriter(f, batch.schema, compression="snappy", use_dictionary=True)
+        writer.write_table(pyarrow.Table.from_batches([batch]))
+        rows += batch.num_rows
+        if rows >= parquet_file_rows * (part + 1):
+            writer.close()
+            f.close()
+            writer = None
+            part += 1
+    if writer is not None:
+        writer.close()
+        f.close()
+        part += 1
+
+    return rows, part
+
+# helper function to convert a downloaded file into dictionary-encoded parquet files next to it in Google Cloud Storage
+def convert_to_parquet(filepath, table):
+
+    # stream the file through the parser
+    bucket = storage_client.bucket(gcp_project_id)
+    prefix = "parquet/federal/fec/" + table + "/"
+    with bucket.blob("downloads/federal/fec/" + filepath).open("rb") as source:
+        rows, parts = write_parquet(bulk_reader.read_batches(source, table, pipe_delimited=".txt" in filepath, normalize=False), prefix)
+    logger.info(' - '.join(['INFO', 'converted to parquet', table, str(rows), str(parts) + ' files']))
+
+    return "gs://" + gcp_project_id + "/" + prefix + "part-*.parquet"
+
+# helper function to diff a downloaded file against the snapshot from the last delta import and load the changed rows into a delta table
+def load_delta(filepath, table, fields):
+
+    # diff the new file against the last snapshot, treating every row as new if there is no snapshot yet
+    bucket = storage_client.bucket(gcp_project_id)
+    download = bucket.blob("downloads/federal/fec/" + filepath)
+    snapshot = bucket.blob("snapshots/federal/fec/" + filepath)
+    prefix = "delta/federal/fec/" + table + "/"
+    directory = BucketDirectory(bucket, "partitions/federal/fec/" + table + "/")
+    directory.clear()
+    counts = dict()
+    with download.open("rb") as new:
+        if snapshot.exists():
+            with snapshot.open("rb") as old:
+                rows, parts = write_parquet(delta.count_changes(delta.diff(old, new, table, pipe_delimited=".txt" in filepath, directory=directory), counts), prefix)
+        else:
+            rows, parts = write_parquet(delta.count_changes(delta.diff(None, new, table, pipe_delimited=".txt" in filepath, directory=directory), counts), prefix)
+    directory.clear()
+    logger.info(' - '.join(['INFO', 'file diffed', table, str(counts.get("insert", 0)) + ' inserted', str(counts.get("update", 0)) + ' updated', str(counts.get("delete", 0)) + ' deleted']))
+
+    # load the changed rows into the delta table, emptying it if nothing changed
+    delta_table_ref = client.dataset('federal_fec').table(table + "_delta")
+    job_config = bigquery.LoadJobConfig()
+    job_config.source_format = bigquery.SourceFormat.PARQUET
+    job_config.write_disposition = 'WRITE_TRUNCATE'
+    job_config.schema = [bigquery.SchemaField(name, field_type) for name, field_type in fields] + [bigquery.SchemaField(delta.change_column, "STRING")]
+    if parts > 0:
+        load_job = client.load_table_from_uri("gs://" + gcp_project_id + "/" + prefix + "part-*.parquet", delta_table_ref, job_config=job_config)
+        logger.info(' - '.join(['START', 'load delta', table, load_job.job_id]))
+        load_job.result()
+        assert load_job.state == "DONE"
+    else:
+        client.delete_table(delta_table_ref, not_found_ok=True)
+        client.create_table(bigquery.Table(delta_table_ref, schema=job_config.schema))
+    logger.info(' - '.join(['INFO', 'delta loaded', table, str(rows)]))
+
+    # the new file is the snapshot the next delta is taken against
+    bucket.copy_blob(download, bucket, snapshot.name)
+
+    return rows
 
 # imports FEC file from Google Cloud Storage into bigquery
 def federal_fec_ingest_import_bigquery(message, context):
@@ -21,16 +137,33 @@ def federal_fec_ingest_import_bigquery(message, context):
     # get the filepath from the Pub/Sub message
     filepath = message['attributes']['filepath']
 
+    # get the optional load format from the Pub/Sub message
+    load_format = "csv"
+    if 'attributes' in message:
+        if message['attributes'] is not None:
+            if "format" in message["attributes"]:
+                load_format = message["attributes"]["format"]
+
+    # get the optional import mode from the Pub/Sub message, where delta also loads the rows that changed since the last delta import
+    mode = "full"
+    if 'attributes' in message:
+        if message['attributes'] is not None:
+            if "mode" in message["attributes"]:
+                mode = message["attributes"]["mode"]
+
     # set up bigquery
     dataset_ref = client.dataset('federal_fec')
     job_config = bigquery.LoadJobConfig()
-    job_config.source_format = bigquery.SourceFormat.CSV
-    if ".txt" in filepath:
-        job_config.field_delimiter = "|"
-        job_config.quote_character = ""
+    if load_format == "parquet":
+        job_config.source_format = bigquery.SourceFormat.PARQUET
     else:
-        job_config.skip_leading_rows = 1
-        job_config.quote_character = "\""
+        job_config.source_format = bigquery.SourceFormat.CSV
+        if ".txt" in filepath:
+            job_config.field_delimiter = "|"
+            job_config.quote_character = ""
+        else:
+            job_config.skip_leading_rows = 1
+            job_config.quote_character = "\""
 
     # set up load job configuration
     uri = "gs://" + gcp_project_id + "/downloads/federal/fec/" + filepath
@@ -38,331 +171,17 @@ def federal_fec_ingest_import_bigquery(message, context):
     destination_table_ref = dataset_ref.table(table)
     archive_table_ref = dataset_ref.table(table + "_old")
     job_config.write_disposition = 'WRITE_TRUNCATE'
-    job_config.schema = []
 
     # set schema
-    if table[:6] == "weball":
-        job_config.schema = [
-            bigquery.SchemaField("cand_id", "STRING"),
-            bigquery.SchemaField("cand_name", "STRING"),
-            bigquery.SchemaField("cand_ici", "STRING"),
-            bigquery.SchemaField("pty_cd", "STRING"),
-            bigquery.SchemaField("cand_pty_affiliation", "STRING"),
-            bigquery.SchemaField("ttl_receipts", "FLOAT"),
-            bigquery.SchemaField("trans_from_auth", "FLOAT"),
-            bigquery.SchemaField("ttl_disb", "FLOAT"),
-            bigquery.SchemaField("trans_to_auth", "FLOAT"),
-            bigquery.SchemaField("coh_bop", "FLOAT"),
-            bigquery.SchemaField("coh_cop", "FLOAT"),
-            bigquery.SchemaField("cand_contrib", "FLOAT"),
-            bigquery.SchemaField("cand_loans", "FLOAT"),
-            bigquery.SchemaField("other_loans", "FLOAT"),
-            bigquery.SchemaField("cand_loan_repay", "FLOAT"),
-            bigquery.SchemaField("other_loan_repay", "FLOAT"),
-            bigquery.SchemaField("debts_owed_by", "FLOAT"),
-            bigquery.SchemaField("ttl_indiv_contrib", "FLOAT"),
-            bigquery.SchemaField("cand_office_st", "STRING"),
-            bigquery.SchemaField("cand_office_district", "STRING"),
-            bigquery.SchemaField("spec_election", "STRING"),
-            bigquery.SchemaField("prim_election", "STRING"),
-            bigquery.SchemaField("run_election", "STRING"),
-            bigquery.SchemaField("gen_election", "STRING"),
-            bigquery.SchemaField("gen_election_precent", "FLOAT"),
-            bigquery.SchemaField("other_pol_cmte_contrib", "FLOAT"),
-            bigquery.SchemaField("pol_pty_contrib", "FLOAT"),
-            bigquery.SchemaField("cvg_end_dt", "STRING"),
-            bigquery.SchemaField("indiv_refunds", "FLOAT"),
-            bigquery.SchemaField("cmte_refunds", "FLOAT")
-        ]
-    elif table[:2] == "cn":
-        job_config.schema = [
-            bigquery.SchemaField("cand_id", "STRING"),
-            bigquery.SchemaField("cand_name", "STRING"),
-            bigquery.SchemaField("cand_pty_affiliation", "STRING"),
-            bigquery.SchemaField("cand_election_yr", "INTEGER"),
-            bigquery.SchemaField("cand_office_st", "STRING"),
-            bigquery.SchemaField("cand_office", "STRING"),
-            bigquery.SchemaField("cand_office_district", "STRING"),
-            bigquery.SchemaField("cand_ici", "STRING"),
-            bigquery.SchemaField("cand_status", "STRING"),
-            bigquery.SchemaField("cand_pcc", "STRING"),
-            bigquery.SchemaField("cand_st1", "STRING"),
-            bigquery.SchemaField("cand_st2", "STRING"),
-            bigquery.SchemaField("cand_city", "STRING"),
-            bigquery.SchemaField("cand_st", "STRING"),
-            bigquery.SchemaField("cand_zip", "STRING")
-        ]
-    elif table[:3] == "ccl":
-        job_config.schema = [
-            bigquery.SchemaField("cand_id", "STRING"),
-            bigquery.SchemaField("cand_election_yr", "INTEGER"),
-            bigquery.SchemaField("fec_election_yr", "INTEGER"),
-            bigquery.SchemaField("cmte_id", "STRING"),
-            bigquery.SchemaField("cmte_tp", "STRING"),
-            bigquery.SchemaField("cmte_dsgn", "STRING"),
-            bigquery.SchemaField("linkage_id", "INTEGER")
-        ]
-    elif table[:4] == "webl":
-        job_config.schema = [
-            bigquery.SchemaField("cand_id", "STRING"),
-            bigquery.SchemaField("cand_name", "STRING"),
-            bigquery.SchemaField("cand_ici", "STRING"),
-            bigquery.SchemaField("pty_cd", "STRING"),
-            bigquery.SchemaField("cand_pty_affiliation", "STRING"),
-            bigquery.SchemaField("ttl_receipts", "FLOAT"),
-            bigquery.SchemaField("trans_from_auth", "FLOAT"),
-            bigquery.SchemaField("ttl_disb", "FLOAT"),
-            bigquery.SchemaField("trans_to_auth", "FLOAT"),
-            bigquery.SchemaField("coh_bop", "FLOAT"),
-            bigquery.SchemaField("coh_cop", "FLOAT"),
-            bigquery.SchemaField("cand_contrib", "FLOAT"),
-            bigquery.SchemaField("cand_loans", "FLOAT"),
-            bigquery.SchemaField("other_loans", "FLOAT"),
-            bigquery.SchemaField("cand_loan_repay", "FLOAT"),
-            bigquery.SchemaField("other_loan_repay", "FLOAT"),
-            bigquery.SchemaField("debts_owed_by", "FLOAT"),
-            bigquery.SchemaField("ttl_indiv_contrib", "FLOAT"),
-            bigquery.SchemaField("cand_office_st", "STRING"),
-            bigquery.SchemaField("cand_office_district", "STRING"),
-            bigquery.SchemaField("spec_election", "STRING"),
-            bigquery.SchemaField("prim_election", "STRING"),
-            bigquery.SchemaField("run_election", "STRING"),
-            bigquery.SchemaField("gen_election", "STRING"),
-            bigquery.SchemaField("gen_election_precent", "FLOAT"),
-            bigquery.SchemaField("other_pol_cmte_contrib", "FLOAT"),
-            bigquery.SchemaField("pol_pty_contrib", "FLOAT"),
-            bigquery.SchemaField("cvg_end_dt", "STRING"),
-            bigquery.SchemaField("indiv_refunds", "FLOAT"),
-            bigquery.SchemaField("cmte_refunds", "FLOAT")
-        ]
-    elif table[:2] == "cm":
-        job_config.schema = [
-            bigquery.SchemaField("cmte_id", "STRING"),
-            bigquery.SchemaField("cmte_nm", "STRING"),
-            bigquery.SchemaField("tres_nm", "STRING"),
-            bigquery.SchemaField("cmte_st1", "STRING"),
-            bigquery.SchemaField("cmte_st2", "STRING"),
-            bigquery.SchemaField("cmte_city", "STRING"),
-            bigquery.SchemaField("cmte_st", "STRING"),
-            bigquery.SchemaField("cmte_zip", "STRING"),
-            bigquery.SchemaField("cmte_dsgn", "STRING"),
-            bigquery.SchemaField("cmte_tp", "STRING"),
-            bigquery.SchemaField("cmte_pty_affiliation", "STRING"),
-            bigquery.SchemaField("cmte_filing_freq", "STRING"),
-            bigquery.SchemaField("org_tp", "STRING"),
-            bigquery.SchemaField("connected_org_nm", "STRING"),
-            bigquery.SchemaField("cand_id", "STRING")
-        ]
-    elif table[:4] == "webk":
-        job_config.schema = [
-            bigquery.SchemaField("cmte_id", "STRING"),
-            bigquery.SchemaField("cmte_nm", "STRING"),
-            bigquery.SchemaField("cmte_tp", "STRING"),
-            bigquery.SchemaField("cmte_dsgn", "STRING"),
-            bigquery.SchemaField("cmte_filing_freq", "STRING"),
-            bigquery.SchemaField("ttl_receipts", "FLOAT"),
-            bigquery.SchemaField("trans_from_aff", "FLOAT"),
-            bigquery.SchemaField("indv_contrib", "FLOAT"),
-            bigquery.SchemaField("other_pol_cmte_contrib", "FLOAT"),
-            bigquery.SchemaField("cand_contrib", "FLOAT"),
-            bigquery.SchemaField("cand_loans", "FLOAT"),
-            bigquery.SchemaField("ttl_loans_received", "FLOAT"),
-            bigquery.SchemaField("ttl_disb", "FLOAT"),
-            bigquery.SchemaField("tranf_to_aff", "FLOAT"),
-            bigquery.SchemaField("indv_refunds", "FLOAT"),
-            bigquery.SchemaField("other_pol_cmte_refunds", "FLOAT"),
-            bigquery.SchemaField("cand_loan_repay", "FLOAT"),
-            bigquery.SchemaField("loan_repay", "FLOAT"),
-            bigquery.SchemaField("coh_bop", "FLOAT"),
-            bigquery.SchemaField("coh_cop", "FLOAT"),
-            bigquery.SchemaField("debts_owed_by", "FLOAT"),
-            bigquery.SchemaField("nonfed_trans_received", "FLOAT"),
-            bigquery.SchemaField("contrib_to_other_cmte", "FLOAT"),
-            bigquery.SchemaField("ind_exp", "FLOAT"),
-            bigquery.SchemaField("pty_coord_exp", "FLOAT"),
-            bigquery.SchemaField("nonfed_share_exp", "FLOAT"),
-            bigquery.SchemaField("cvg_end_dt", "STRING")
-        ]
-    elif table[:5] == "indiv":
-        job_config.schema = [
-            bigquery.SchemaField("cmte_id", "STRING"),
-            bigquery.SchemaField("amndt_ind", "STRING"),
-            bigquery.SchemaField("rpt_tp", "STRING"),
-            bigquery.SchemaField("transaction_pgi", "STRING"),
-            bigquery.SchemaField("image_num", "STRING"),
-            bigquery.SchemaField("transaction_tp", "STRING"),
-            bigquery.SchemaField("entity_tp", "STRING"),
-            bigquery.SchemaField("name", "STRING"),
-            bigquery.SchemaField("city", "STRING"),
-            bigquery.SchemaField("state", "STRING"),
-            bigquery.SchemaField("zip_code", "STRING"),
-            bigquery.SchemaField("employer", "STRING"),
-            bigquery.SchemaField("occupation", "STRING"),
-            bigquery.SchemaField("transaction_dt", "STRING"),
-            bigquery.SchemaField("transaction_amt", "FLOAT"),
-            bigquery.SchemaField("other_id", "STRING"),
-            bigquery.SchemaField("tran_id", "STRING"),
-            bigquery.SchemaField("file_num", "INTEGER"),
-            bigquery.SchemaField("memo_cd", "STRING"),
-            bigquery.SchemaField("memo_text", "STRING"),
-            bigquery.SchemaField("sub_id", "INTEGER")
-        ]
-    elif table[:3] == "pas":
-        job_config.schema = [
-            bigquery.SchemaField("cmte_id", "STRING"),
-            bigquery.SchemaField("amndt_ind", "STRING"),
-            bigquery.SchemaField("rpt_tp", "STRING"),
-            bigquery.SchemaField("transaction_pgi", "STRING"),
-            bigquery.SchemaField("image_num", "STRING"),
-            bigquery.SchemaField("transaction_tp", "STRING"),
-            bigquery.SchemaField("entity_tp", "STRING"),
-            bigquery.SchemaField("name", "STRING"),
-            bigquery.SchemaField("city", "STRING"),
-            bigquery.SchemaField("state", "STRING"),
-            bigquery.SchemaField("zip_code", "STRING"),
-            bigquery.SchemaField("employer", "STRING"),
-            bigquery.SchemaField("occupation", "STRING"),
-            bigquery.SchemaField("transaction_dt", "STRING"),
-            bigquery.SchemaField("transaction_amt", "FLOAT"),
-            bigquery.SchemaField("other_id", "STRING"),
-            bigquery.SchemaField("cand_id", "STRING"),
-            bigquery.SchemaField("tran_id", "STRING"),
-            bigquery.SchemaField("file_num", "INTEGER"),
-            bigquery.SchemaField("memo_cd", "STRING"),
-            bigquery.SchemaField("memo_text", "STRING"),
-            bigquery.SchemaField("sub_id", "INTEGER")
-        ]
-    elif table[:3] == "oth":
-        job_config.schema = [
-            bigquery.SchemaField("cmte_id", "STRING"),
-            bigquery.SchemaField("amndt_ind", "STRING"),
-            bigquery.SchemaField("rpt_tp", "STRING"),
-            bigquery.SchemaField("transaction_pgi", "STRING"),
-            bigquery.SchemaField("image_num", "STRING"),
-            bigquery.SchemaField("transaction_tp", "STRING"),
-            bigquery.SchemaField("entity_tp", "STRING"),
-            bigquery.SchemaField("name", "STRING"),
-            bigquery.SchemaField("city", "STRING"),
-            bigquery.SchemaField("state", "STRING"),
-            bigquery.SchemaField("zip_code", "STRING"),
-            bigquery.SchemaField("employer", "STRING"),
-            bigquery.SchemaField("occupation", "STRING"),
-            bigquery.SchemaField("transaction_dt", "STRING"),
-            bigquery.SchemaField("transaction_amt", "FLOAT"),
-            bigquery.SchemaField("other_id", "STRING"),
-            bigquery.SchemaField("tran_id", "STRING"),
-            bigquery.SchemaField("file_num", "INTEGER"),
-            bigquery.SchemaField("memo_cd", "STRING"),
-            bigquery.SchemaField("memo_text", "STRING"),
-            bigquery.SchemaField("sub_id", "INTEGER")
-        ]
-    elif table[:6] == "oppexp":
-        job_config.schema = [
-            bigquery.SchemaField("cmte_id", "STRING"),
-            bigquery.SchemaField("amndt_ind", "STRING"),
-            bigquery.SchemaField("rpt_yr", "INTEGER"),
-            bigquery.SchemaField("rpt_tp", "STRING"),
-            bigquery.SchemaField("image_num", "STRING"),
-            bigquery.SchemaField("line_num", "STRING"),
-            bigquery.SchemaField("form_tp_cd", "STRING"),
-            bigquery.SchemaField("sched_tp_cd", "STRING"),
-            bigquery.SchemaField("name", "STRING"),
-            bigquery.SchemaField("city", "STRING"),
-            bigquery.SchemaField("state", "STRING"),
-            bigquery.SchemaField("zip_code", "STRING"),
-            bigquery.SchemaField("transaction_dt", "STRING"),
-            bigquery.SchemaField("transaction_amt", "FLOAT"),
-            bigquery.SchemaField("transaction_pgi", "STRING"),
-            bigquery.SchemaField("purpose", "STRING"),
-            bigquery.SchemaField("category", "STRING"),
-            bigquery.SchemaField("category_desc", "STRING"),
-            bigquery.SchemaField("memo_cd", "STRING"),
-            bigquery.SchemaField("memo_text", "STRING"),
-            bigquery.SchemaField("entity_tp", "STRING"),
-            bigquery.SchemaField("sub_id", "INTEGER"),
-            bigquery.SchemaField("file_num", "INTEGER"),
-            bigquery.SchemaField("tran_id", "STRING"),
-            bigquery.SchemaField("back_ref_tran_id", "STRING"),
-            bigquery.SchemaField("empty", "STRING")
-        ]
-    elif table[:23] == "independent_expenditure":
-        job_config.schema = [
-            bigquery.SchemaField("can_id", "STRING"),
-            bigquery.SchemaField("can_nam", "STRING"),
-            bigquery.SchemaField("spe_id", "STRING"),
-            bigquery.SchemaField("spe_nam", "STRING"),
-            bigquery.SchemaField("ele_typ", "STRING"),
-            bigquery.SchemaField("can_off_sta", "STRING"),
-            bigquery.SchemaField("can_off_dis", "STRING"),
-            bigquery.SchemaField("can_off", "STRING"),
-            bigquery.SchemaField("can_par_aff", "STRING"),
-            bigquery.SchemaField("exp_amo", "FLOAT"),
-            bigquery.SchemaField("exp_dat", "STRING"),
-            bigquery.SchemaField("agg_amo", "FLOAT"),
-            bigquery.SchemaField("sup_opp", "STRING"),
-            bigquery.SchemaField("pur", "STRING"),
-            bigquery.SchemaField("pay", "STRING"),
-            bigquery.SchemaField("file_num", "INTEGER"),
-            bigquery.SchemaField("amn_ind", "STRING"),
-            bigquery.SchemaField("tra_id", "STRING"),
-            bigquery.SchemaField("ima_num", "STRING"),
-            bigquery.SchemaField("rec_dt", "STRING"),
-            bigquery.SchemaField("fec_election_yr", "INTEGER"),
-            bigquery.SchemaField("prev_file_num", "INTEGER"),
-            bigquery.SchemaField("dissem_dt", "STRING")
-        ]
-    elif table[:18] == "ElectioneeringComm":
-        job_config.schema = [
-            bigquery.SchemaField("candidate_id", "STRING"),
-            bigquery.SchemaField("candidate_name", "STRING"),
-            bigquery.SchemaField("candidate_office", "STRING"),
-            bigquery.SchemaField("candidate_state", "STRING"),
-            bigquery.SchemaField("candidate_office_district", "STRING"),
-            bigquery.SchemaField("committee_id", "STRING"),
-            bigquery.SchemaField("committee_name", "STRING"),
-            bigquery.SchemaField("sb_image_num", "STRING"),
-            bigquery.SchemaField("payee_name", "STRING"),
-            bigquery.SchemaField("payee_street", "STRING"),
-            bigquery.SchemaField("payee_city", "STRING"),
-            bigquery.SchemaField("payee_state", "STRING"),
-            bigquery.SchemaField("disbursement_description", "STRING"),
-            bigquery.SchemaField("disbursement_date", "STRING"),
-            bigquery.SchemaField("communication_date", "STRING"),
-            bigquery.SchemaField("public_distribution_date", "STRING"),
-            bigquery.SchemaField("reported_disbursement_amount", "FLOAT"),
-            bigquery.SchemaField("number_of_candidates", "INTEGER"),
-            bigquery.SchemaField("calculated_candidate_share", "FLOAT")
-        ]
-    elif table[:18] == "CommunicationCosts":
-        job_config.schema = [
-            bigquery.SchemaField("cmte_id", "STRING"),
-            bigquery.SchemaField("cmte_name", "STRING"),
-            bigquery.SchemaField("candidate_id", "STRING"),
-            bigquery.SchemaField("candidate_name", "STRING"),
-            bigquery.SchemaField("candidate_office", "STRING"),
-            bigquery.SchemaField("candidate_office_state", "STRING"),
-            bigquery.SchemaField("candidate_office_district", "STRING"),
-            bigquery.SchemaField("cand_pty_affiliation", "STRING"),
-            bigquery.SchemaField("transaction_dt", "STRING"),
-            bigquery.SchemaField("transaction_amt", "FLOAT"),
-            bigquery.SchemaField("transaction_tp", "STRING"),
-            bigquery.SchemaField("communication_tp", "STRING"),
-            bigquery.SchemaField("communication_class", "STRING"),
-            bigquery.SchemaField("support_oppose_ind", "STRING"),
-            bigquery.SchemaField("image_num", "STRING"),
-            bigquery.SchemaField("line_num", "INTEGER"),
-            bigquery.SchemaField("form_tp_cd", "STRING"),
-            bigquery.SchemaField("sched_tp_cd", "STRING"),
-            bigquery.SchemaField("tran_id", "STRING"),
-            bigquery.SchemaField("sub_id", "INTEGER"),
-            bigquery.SchemaField("file_num", "INTEGER"),
-            bigquery.SchemaField("rpt_yr", "INTEGER"),
-            bigquery.SchemaField("cand_state_description", "STRING"),
-            bigquery.SchemaField("cand_pty_affiliation_description", "STRING"),
-            bigquery.SchemaField("purpose", "STRING")
-        ]
-
-    if job_config.schema is not []:
+    fields = schemas.get_fields(table)
+
+    if fields is not None:
+
+        job_config.schema = [bigquery.SchemaField(name, field_type) for name, field_type in fields]
+
+        # convert the file to parquet first if asked, and load those files instead
+        if load_format == "parquet":
+            uri = convert_to_parquet(filepath, table)
 
         # archive old table
         destination_table = client.get_table(destination_table_ref)
@@ -387,12 +206,14 @@ def federal_fec_ingest_import_bigquery(message, context):
         logger.info(' - '.join(['INFO', 'new file loaded', table, str(destination_table.num_rows)]))
 
         # validate data
+        imported = True
         if archive_table is not None:
             if destination_table.num_rows >= archive_table.num_rows:
                 logger.info(' - '.join(['COMPLETED', 'file imported', filepath]))
                 # delete archive table
                 client.delete_table(archive_table_ref)
             else:
+                imported = False
                 logger.error(' - '.join(['INFO', 'rolling back', filepath]))
                 # delete new table
                 client.delete_table(destination_table_ref)
@@ -402,6 +223,13 @@ def federal_fec_ingest_import_bigquery(message, context):
                 assert copy_job.state == "DONE"
                 logger.error(' - '.join(['ERROR', 'validation failed', filepath]))
 
+        # load the delta once the new file is in
+        if mode == "delta" and imported:
+            if schemas.get_key(table) is not None:
+                load_delta(filepath, table, fields)
+            else:
+                logger.error(' - '.join(['ERROR', 'no key to diff on', filepath]))
+
     else:
 
         logger.error(' - '.join(['ERROR', 'unexpected file', filepath]))
@@ -0,0 +1,326 @@
+# fields of the candidate summary files, shared by all candidates and house/senate current campaigns
+candidate_summary_fields = [
+    ("cand_id", "STRING"),
+    ("cand_name", "STRING"),
+    ("cand_ici", "STRING"),
+    ("pty_cd", "STRING"),
+    ("cand_pty_affiliation", "STRING"),
+    ("ttl_receipts", "FLOAT"),
+    ("trans_from_auth", "FLOAT"),
+    ("ttl_disb", "FLOAT"),
+    ("trans_to_auth", "FLOAT"),
+    ("coh_bop", "FLOAT"),
+    ("coh_cop", "FLOAT"),
+    ("cand_contrib", "FLOAT"),
+    ("cand_loans", "FLOAT"),
+    ("other_loans", "FLOAT"),
+    ("cand_loan_repay", "FLOAT"),
+    ("other_loan_repay", "FLOAT"),
+    ("debts_owed_by", "FLOAT"),
+    ("ttl_indiv_contrib", "FLOAT"),
+    ("cand_office_st", "STRING"),
+    ("cand_office_district", "STRING"),
+    ("spec_election", "STRING"),
+    ("prim_election", "STRING"),
+    ("run_election", "STRING"),
+    ("gen_election", "STRING"),
+    ("gen_election_precent", "FLOAT"),
+    ("other_pol_cmte_contrib", "FLOAT"),
+    ("pol_pty_contrib", "FLOAT"),
+    ("cvg_end_dt", "STRING"),
+    ("indiv_refunds", "FLOAT"),
+    ("cmte_refunds", "FLOAT")
+]
+
+# fields of each FEC table in BigQuery, keyed by the prefix of the table name
+tables = {
+    "weball": candidate_summary_fields,
+    "cn": [
+        ("cand_id", "STRING"),
+        ("cand_name", "STRING"),
+        ("cand_pty_affiliation", "STRING"),
+        ("cand_election_yr", "INTEGER"),
+        ("cand_office_st", "STRING"),
+        ("cand_office", "STRING"),
+        ("cand_office_district", "STRING"),
+        ("cand_ici", "STRING"),
+        ("cand_status", "STRING"),
+        ("cand_pcc", "STRING"),
+        ("cand_st1", "STRING"),
+        ("cand_st2", "STRING"),
+        ("cand_city", "STRING"),
+        ("cand_st", "STRING"),
+        ("cand_zip", "STRING")
+    ],
+    "ccl": [
+        ("cand_id", "STRING"),
+        ("cand_election_yr", "INTEGER"),
+        ("fec_election_yr", "INTEGER"),
+        ("cmte_id", "STRING"),
+        ("cmte_tp", "STRING"),
+        ("cmte_dsgn", "STRING"),
+        ("linkage_id", "INTEGER")
+    ],
+    "webl": candidate_summary_fields,
+    "cm": [
+        ("cmte_id", "STRING"),
+        ("cmte_nm", "STRING"),
+        ("tres_nm", "STRING"),
+        ("cmte_st1", "STRING"),
+        ("cmte_st2", "STRING"),
+        ("cmte_city", "STRING"),
+        ("cmte_st", "STRING"),
+        ("cmte_zip", "STRING"),
+        ("cmte_dsgn", "STRING"),
+        ("cmte_tp", "STRING"),
+        ("cmte_pty_affiliation", "STRING"),
+        ("cmte_filing_freq", "STRING"),
+        ("org_tp", "STRING"),
+        ("connected_org_nm", "STRING"),
+        ("cand_id", "STRING")
+    ],
+    "webk": [
+        ("cmte_id", "STRING"),
+        ("cmte_nm", "STRING"),
+        ("cmte_tp", "STRING"),
+        ("cmte_dsgn", "STRING"),
+        ("cmte_filing_freq", "STRING"),
+        ("ttl_receipts", "FLOAT"),
+        ("trans_from_aff", "FLOAT"),
+        ("indv_contrib", "FLOAT"),
+        ("other_pol_cmte_contrib", "FLOAT"),
+        ("cand_contrib", "FLOAT"),
+        ("cand_loans", "FLOAT"),
+        ("ttl_loans_received", "FLOAT"),
+        ("ttl_disb", "FLOAT"),
+        ("tranf_to_aff", "FLOAT"),
+        ("indv_refunds", "FLOAT"),
+        ("other_pol_cmte_refunds", "FLOAT"),
+        ("cand_loan_repay", "FLOAT"),
+        ("loan_repay", "FLOAT"),
+        ("coh_bop", "FLOAT"),
+        ("coh_cop", "FLOAT"),
+        ("debts_owed_by", "FLOAT"),
+        ("nonfed_trans_received", "FLOAT"),
+        ("contrib_to_other_cmte", "FLOAT"),
+        ("ind_exp", "FLOAT"),
+        ("pty_coord_exp", "FLOAT"),
+        ("nonfed_share_exp", "FLOAT"),
+        ("cvg_end_dt", "STRING")
+    ],
+    "indiv": [
+        ("cmte_id", "STRING"),
+        ("amndt_ind", "STRING"),
+        ("rpt_tp", "STRING"),
+        ("transaction_pgi", "STRING"),
+        ("image_num", "STRING"),
+        ("transaction_tp", "STRING"),
+        ("entity_tp", "STRING"),
+        ("name", "STRING"),
+        ("city", "STRING"),
+        ("state", "STRING"),
+        ("zip_code", "STRING"),
+        ("employer", "STRING"),
+        ("occupation", "STRING"),
+        ("transaction_dt", "STRING"),
+        ("transaction_amt", "FLOAT"),
+        ("other_id", "STRING"),
+        ("tran_id", "STRING"),
+        ("file_num", "INTEGER"),
+        ("memo_cd", "STRING"),
+        ("memo_text", "STRING"),
+        ("sub_id", "INTEGER")
+    ],
+    "pas": [
+        ("cmte_id", "STRING"),
+        ("amndt_ind", "STRING"),
+        ("rpt_tp", "STRING"),
+        ("transaction_pgi", "STRING"),
+        ("image_num", "STRING"),
+        ("transaction_tp", "STRING"),
+        ("entity_tp", "STRING"),
+        ("name", "STRING"),
+        ("city", "STRING"),
+        ("state", "STRING"),
+        ("zip_code", "STRING"),
+        ("employer", "STRING"),
+        ("occupation", "STRING"),
+        ("transaction_dt", "STRING"),
+        ("transaction_amt", "FLOAT"),
+        ("other_id", "STRING"),
+        ("cand_id", "STRING"),
+        ("tran_id", "STRING"),
+        ("file_num", "INTEGER"),
+        ("memo_cd", "STRING"),
+        ("memo_text", "STRING"),
+        ("sub_id", "INTEGER")
+    ],
+    "oth": [
+        ("cmte_id", "STRING"),
+        ("amndt_ind", "STRING"),
+        ("rpt_tp", "STRING"),
+        ("transaction_pgi", "STRING"),
+        ("image_num", "STRING"),
+        ("transaction_tp", "STRING"),
+        ("entity_tp", "STRING"),
+        ("name", "STRING"),
+        ("city", "STRING"),
+        ("state", "STRING"),
+        ("zip_code", "STRING"),
+        ("employer", "STRING"),
+        ("occupation", "STRING"),
+        ("transaction_dt", "STRING"),
+        ("transaction_amt", "FLOAT"),
+        ("other_id", "STRING"),
+        ("tran_id", "STRING"),
+        ("file_num", "INTEGER"),
+        ("memo_cd", "STRING"),
+        ("memo_text", "STRING"),
+        ("sub_id", "INTEGER")
+    ],
+    "oppexp": [
+        ("cmte_id", "STRING"),
+        ("amndt_ind", "STRING"),
+        ("rpt_yr", "INTEGER"),
+        ("rpt_tp", "STRING"),
+        ("image_num", "STRING"),
+        ("line_num", "STRING"),
+        ("form_tp_cd", "STRING"),
+        ("sched_tp_cd", "STRING"),
+        ("name", "STRING"),
+        ("city", "STRING"),
+        ("state", "STRING"),
+        ("zip_code", "STRING"),
+        ("transaction_dt", "STRING"),
+        ("transaction_amt", "FLOAT"),
+        ("transaction_pgi", "STRING"),
+        ("purpose", "STRING"),
+        ("category", "STRING"),
+        ("category_desc", "STRING"),
+        ("memo_cd", "STRING"),
+        ("memo_text", "STRING"),
+        ("entity_tp", "STRING"),
+        ("sub_id", "INTEGER"),
+        ("file_num", "INTEGER"),
+        ("tran_id", "STRING"),
+        ("back_ref_tran_id", "STRING"),
+        ("empty", "STRING")
+    ],
+    "independent_expenditure": [
+        ("can_id", "STRING"),
+        ("can_nam", "STRING"),
+        ("spe_id", "STRING"),
+        ("spe_nam", "STRING"),
+        ("ele_typ", "STRING"),
+        ("can_off_sta", "STRING"),
+        ("can_off_dis", "STRING"),
+        ("can_off", "STRING"),
+        ("can_par_aff", "STRING"),
+        ("exp_amo", "FLOAT"),
+        ("exp_dat", "STRING"),
+        ("agg_amo", "FLOAT"),
+        ("sup_opp", "STRING"),
+        ("pur", "STRING"),
+        ("pay", "STRING"),
+        ("file_num", "INTEGER"),
+        ("amn_ind", "STRING"),
+        ("tra_id", "STRING"),
+        ("ima_num", "STRING"),
+        ("rec_dt", "STRING"),
+        ("fec_election_yr", "INTEGER"),
+        ("prev_file_num", "INTEGER"),
+        ("dissem_dt", "STRING")
+    ],
+    "ElectioneeringComm": [
+        ("candidate_id", "STRING"),
+        ("candidate_name", "STRING"),
+        ("candidate_office", "STRING"),
+        ("candidate_state", "STRING"),
+        ("candidate_office_district", "STRING"),
+        ("committee_id", "STRING"),
+        ("committee_name", "STRING"),
+        ("sb_image_num", "STRING"),
+        ("payee_name", "STRING"),
+        ("payee_street", "STRING"),
+        ("payee_city", "STRING"),
+        ("payee_state", "STRING"),
+        ("disbursement_description", "STRING"),
+        ("disbursement_date", "STRING"),
+        ("communication_date", "STRING"),
+        ("public_distribution_date", "STRING"),
+        ("reported_disbursement_amount", "FLOAT"),
+        ("number_of_candidates", "INTEGER"),
+        ("calculated_candidate_share", "FLOAT")
+    ],
+    "CommunicationCosts": [
+        ("cmte_id", "STRING"),
+        ("cmte_name", "STRING"),
+        ("candidate_id", "STRING"),
+        ("candidate_name", "STRING"),
+        ("candidate_office", "STRING"),
+        ("candidate_office_state", "STRING"),
+        ("candidate_office_district", "STRING"),
+        ("cand_pty_affiliation", "STRING"),
+        ("transaction_dt", "STRING"),
+        ("transaction_amt", "FLOAT"),
+        ("transaction_tp", "STRING"),
+        ("communication_tp", "STRING"),
+        ("communication_class", "STRING"),
+        ("support_oppose_ind", "STRING"),
+        ("image_num", "STRING"),
+        ("line_num", "INTEGER"),
+        ("form_tp_cd", "STRING"),
+        ("sched_tp_cd", "STRING"),
+        ("tran_id", "STRING"),
+        ("sub_id", "INTEGER"),
+        ("file_num", "INTEGER"),
+        ("rpt_yr", "INTEGER"),
+        ("cand_state_description", "STRING"),
+        ("cand_pty_affiliation_description", "STRING"),
+        ("purpose", "STRING")
+    ]
+}
+
+# columns that are cleaned up while parsing, the same way the master tables clean them up in BigQuery
+normalizers = {
+    "indiv": {"transaction_dt": "mmddyyyy", "zip_code": "zip5"},
+    "pas": {"transaction_dt": "mmddyyyy", "zip_code": "zip5"},
+    "oth": {"transaction_dt": "mmddyyyy", "zip_code": "zip5"},
+    "oppexp": {"transaction_dt": "mm/dd/yyyy", "zip_code": "zip5"}
+}
+
+# get the registered prefix of a table, preferring the longest match
+def get_prefix(table):
+    matches = [prefix for prefix in tables if table.startswith(prefix)]
+    if len(matches) == 0:
+        return None
+    return max(matches, key=len)
+
+# get the fields of a table as (name, type) pairs, or None if the table is unexpected
+def get_fields(table):
+    prefix = get_prefix(table)
+    if prefix is None:
+        return None
+    return tables[prefix]
+
+# get the columns of a table that get normalized while parsing
+def get_normalizers(table):
+    prefix = get_prefix(table)
+    if prefix is None:
+        return dict()
+    return normalizers.get(prefix, dict())
+
+# key columns that uniquely identify a row across snapshots of a file, for the tables that can be diffed
+keys = {
+    "indiv": "sub_id",
+    "pas": "sub_id",
+    "oth": "sub_id",
+    "oppexp": "sub_id"
+}
+
+# get the key column of a table, or None if the table cannot be diffed
+def get_key(table):
+    prefix = get_prefix(table)
+    if prefix is None:
+        return None
+    return keys.get(prefix)
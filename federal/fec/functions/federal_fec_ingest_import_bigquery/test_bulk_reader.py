@@ -0,0 +1,47 @@
+import io
+import unittest
+
+import pyarrow
+
+import schemas
+import bulk_reader
+
+# helper function to build a pipe-delimited oppexp file from rows given as dicts
+def make_oppexp(rows):
+    names = [name for name, field_type in schemas.get_fields("oppexp22")]
+    lines = ["|".join(str(row.get(name, "")) for name in names) for row in rows]
+    return io.BytesIO(("\n".join(lines) + "\n").encode())
+
+class TestNormalize(unittest.TestCase):
+
+    def test_mmddyyyy(self):
+        column = pyarrow.array(["01152022", None, "12312021"])
+        self.assertEqual(bulk_reader.normalize_mmddyyyy(column).to_pylist(), ["2022-01-15", None, "2021-12-31"])
+
+    def test_mm_dd_yyyy(self):
+        column = pyarrow.array(["01/15/2022", None, "1/5/2022", "12/31/2021"])
+        self.assertEqual(bulk_reader.normalize_mm_dd_yyyy(column).to_pylist(), ["2022-01-15", None, "2022-01-05", "2021-12-31"])
+
+    def test_mm_dd_yyyy_malformed(self):
+        column = pyarrow.array(["01/15/2022", "2022-01-15", "UNKNOWN", "13/01/2022", ""])
+        self.assertEqual(bulk_reader.normalize_mm_dd_yyyy(column).to_pylist(), ["2022-01-15", None, None, None, None])
+
+    def test_zip5(self):
+        column = pyarrow.array(["100011234", None, "021"])
+        self.assertEqual(bulk_reader.normalize_zip5(column).to_pylist(), ["10001", None, "021"])
+
+class TestReadBatches(unittest.TestCase):
+
+    def test_malformed_date_does_not_fail_file(self):
+        source = make_oppexp([
+            {"cmte_id": "C00000001", "transaction_dt": "01/15/2022", "zip_code": "100011234", "sub_id": 1},
+            {"cmte_id": "C00000001", "transaction_dt": "00/00/0000", "zip_code": "02110", "sub_id": 2},
+            {"cmte_id": "C00000002", "sub_id": 3}
+        ])
+        rows = pyarrow.Table.from_batches(list(bulk_reader.read_batches(source, "oppexp22"))).to_pylist()
+        self.assertEqual([row["sub_id"] for row in rows], [1, 2, 3])
+        self.assertEqual([row["transaction_dt"] for row in rows], ["2022-01-15", None, None])
+        self.assertEqual([row["zip_code"] for row in rows], ["10001", "02110", None])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import io
+import unittest
+import pyarrow
+
+import schemas
+import delta
+
+# helper function to build a pipe-delimited indiv file from rows given as dicts, leaving out fields as empty
+def make_indiv(rows):
+    names = [name for name, field_type in schemas.get_fields("indiv22")]
+    lines = ["|".join(str(row.get(name, "")) for name in names) for row in rows]
+    return io.BytesIO(("\n".join(lines) + "\n").encode())
+
+# helper function to build a row of the indiv file
+def make_row(sub_id, file_num=1000, name="DOE, JANE"):
+    return {"cmte_id": "C00000001", "name": name, "transaction_amt": 25.0, "file_num": "" if file_num is None else file_num, "sub_id": sub_id}
+
+class TestHashBatch(unittest.TestCase):
+
+    def test_null_elsewhere_in_block(self):
+        names = ["sub_id", "file_num", "transaction_amt"]
+        full = pyarrow.RecordBatch.from_arrays([pyarrow.array([1, 2, 3]), pyarrow.array([10, 20, 30]), pyarrow.array([1.5, 2.5, 3.5])], names=names)
+        nulls = pyarrow.RecordBatch.from_arrays([pyarrow.array([1, 2, 3]), pyarrow.array([10, None, 30]), pyarrow.array([1.5, None, 3.5])], names=names)
+        full_hashes = delta.hash_batch(full)
+        null_hashes = delta.hash_batch(nulls)
+        self.assertEqual(full_hashes[0], null_hashes[0])
+        self.assertEqual(full_hashes[2], null_hashes[2])
+        self.assertNotEqual(full_hashes[1], null_hashes[1])
+
+    def test_null_is_not_empty_string(self):
+        names = ["sub_id", "name"]
+        empty = pyarrow.RecordBatch.from_arrays([pyarrow.array([1]), pyarrow.array([""])], names=names)
+        null = pyarrow.RecordBatch.from_arrays([pyarrow.array([1]), pyarrow.array([None], pyarrow.string())], names=names)
+        self.assertNotEqual(delta.hash_batch(empty)[0], delta.hash_batch(null)[0])
+
+class TestDiff(unittest.TestCase):
+
+    # helper function to diff two snapshots into a dict of change type to sorted sub_ids
+    def get_changes(self, old, new, partitions=4):
+        changes = dict()
+        for batch in delta.diff(old, new, "indiv22", partitions=partitions):
+            for sub_id, change_type in zip(batch.column("sub_id").to_pylist(), batch.column(delta.change_column).to_pylist()):
+                changes.setdefault(change_type, []).append(sub_id)
+        return {change_type: sorted(sub_ids) for change_type, sub_ids in changes.items()}
+
+    def test_changes(self):
+        old = make_indiv([make_row(1), make_row(2), make_row(3)])
+        new = make_indiv([make_row(1), make_row(2, name="DOE, JOHN"), make_row(4)])
+        self.assertEqual(self.get_changes(old, new), {"insert": [4], "update": [2], "delete": [3]})
+
+    def test_null_integer_only_changes_its_row(self):
+        old = make_indiv([make_row(i) for i in range(1, 1000)])
+        new = make_indiv([make_row(i, file_num=None if i == 500 else 1000) for i in range(1, 1000)])
+        self.assertEqual(self.get_changes(old, new), {"update": [500]})
+
+    def test_no_old_snapshot(self):
+        new = make_indiv([make_row(1), make_row(2)])
+        self.assertEqual(self.get_changes(None, new), {"insert": [1, 2]})
+
+if __name__ == "__main__":
+    unittest.main()
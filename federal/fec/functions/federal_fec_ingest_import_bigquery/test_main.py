@@ -0,0 +1,131 @@
+import io
+import functools
+import unittest
+from unittest import mock
+
+import pyarrow
+import pyarrow.parquet as pq
+from google.cloud import secretmanager
+from google.cloud import bigquery
+from google.cloud import storage
+
+import schemas
+import bulk_reader
+
+# import the function without reaching Secret Manager, BigQuery or Google Cloud Storage
+with mock.patch.object(secretmanager, "SecretManagerServiceClient"), mock.patch.object(bigquery, "Client"), mock.patch.object(storage, "Client"):
+    import main
+
+# stand-ins for the parts of Google Cloud Storage the function uses, keeping blobs in a dict
+class FakeFile(io.BytesIO):
+
+    def __init__(self, blobs, name):
+        super().__init__()
+        self.blobs = blobs
+        self.name = name
+
+    def close(self):
+        if not self.closed:
+            self.blobs[self.name] = self.getvalue()
+        super().close()
+
+class FakeBlob:
+
+    def __init__(self, blobs, name):
+        self.blobs = blobs
+        self.name = name
+
+    def open(self, mode, chunk_size=None):
+        if mode == "rb":
+            return io.BytesIO(self.blobs[self.name])
+        return FakeFile(self.blobs, self.name)
+
+    def delete(self):
+        del self.blobs[self.name]
+
+class FakeBucket:
+
+    def __init__(self):
+        self.blobs = dict()
+
+    def blob(self, name):
+        return FakeBlob(self.blobs, name)
+
+class FakeStorageClient:
+
+    def __init__(self):
+        self.fake_bucket = FakeBucket()
+
+    def bucket(self, name):
+        return self.fake_bucket
+
+    def list_blobs(self, bucket, prefix):
+        return [FakeBlob(bucket.blobs, name) for name in list(bucket.blobs) if name.startswith(prefix)]
+
+# rows of a small indiv bulk file, with the empty fields, quotes and accents that turn up in the real files
+indiv_rows = [
+    ["C00000001", "N", "Q1", "P2022", "202201019000000001", "15", "IND", "DOE, JANE", "NEW YORK", "NY", "100011234", "ACME", "ENGINEER", "01152022", "25", "", "T1", "1000", "", "", "1"],
+    ["C00000001", "A", "Q1", "P2022", "202201019000000002", "15", "IND", "SMITH, \"JJ\"", "BOSTON", "MA", "02110", "", "", "01162022", "1000.5", "", "T2", "1000", "X", "EARMARKED", "2"],
+    ["C00000002", "N", "YE", "", "", "15E", "ORG", "", "", "", "", "", "", "", "-50", "C00000003", "", "", "", "", "3"],
+    ["C00000002", "N", "YE", "G2022", "202201019000000004", "15", "IND", "O'NEIL, SAM", "DENVER", "CO", "80202", "SELF", "", "12312021", "2900", "", "T4", "1001", "", "", "4"],
+    ["C00000003", "T", "M2", "P2022", "202201019000000005", "15", "IND", "GARCÍA, MARÍA", "MIAMI", "FL", "33101", "NONE", "RETIRED", "02012022", "0.01", "", "T5", "1002", "", "", "5"],
+    ["C00000003", "N", "M2", "P2022", "202201019000000006", "15", "IND", "LEE, PAT", "SEATTLE", "WA", "98101", "N/A", "N/A", "02022022", "100", "", "T6", "1002", "", "", "6"],
+    ["C00000004", "N", "Q2", "P2022", "202201019000000007", "15", "IND", "ROE, RICHARD", "AUSTIN", "TX", "73301", "STATE OF TEXAS", "TEACHER", "04302022", "250", "", "T7", "1003", "", "", "9007199254740993"]
+]
+
+class TestConvertToParquet(unittest.TestCase):
+
+    def setUp(self):
+        self.storage_client = FakeStorageClient()
+        patches = [
+            mock.patch.object(main, "storage_client", self.storage_client),
+            mock.patch.object(main, "gcp_project_id", "project"),
+            mock.patch.object(main, "parquet_file_rows", 3),
+            # read a few rows per batch, so the rows are split across parts the way a large file is
+            mock.patch.object(bulk_reader, "read_batches", functools.partial(bulk_reader.read_batches, block_size=256))
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.blobs = self.storage_client.fake_bucket.blobs
+        self.blobs["downloads/federal/fec/indiv22/itcont.txt"] = ("\n".join("|".join(row) for row in indiv_rows) + "\n").encode()
+        self.blobs["parquet/federal/fec/indiv22/part-00009.parquet"] = b"left over from the last run"
+
+    # helper function to read back the parquet files under a prefix, in order
+    def read_parts(self, prefix):
+        return [pq.read_table(io.BytesIO(self.blobs[name])) for name in sorted(self.blobs) if name.startswith(prefix)]
+
+    def test_round_trip(self):
+        uri = main.convert_to_parquet("indiv22/itcont.txt", "indiv22")
+        self.assertEqual(uri, "gs://project/parquet/federal/fec/indiv22/part-*.parquet")
+
+        # the rows are split into files of at least parquet_file_rows, replacing the files from the last run
+        parts = self.read_parts("parquet/federal/fec/indiv22/")
+        self.assertGreater(len(parts), 1)
+        self.assertTrue(all(part.num_rows >= 3 for part in parts[:-1]))
+        self.assertEqual(sum(part.num_rows for part in parts), len(indiv_rows))
+        self.assertNotIn("parquet/federal/fec/indiv22/part-00009.parquet", self.blobs)
+        table = pyarrow.concat_tables(parts)
+
+        # the columns have the arrow types of the bigquery schema, so the load does not have to coerce them
+        fields = schemas.get_fields("indiv22")
+        self.assertEqual(table.schema.names, [name for name, field_type in fields])
+        for name, field_type in fields:
+            self.assertEqual(table.schema.field(name).type, {"STRING": pyarrow.string(), "FLOAT": pyarrow.float64(), "INTEGER": pyarrow.int64()}[field_type], name)
+
+        # the values come back the way the csv load would read them, with empty fields as nulls and dates left as they are
+        rows = table.to_pylist()
+        self.assertEqual([row["sub_id"] for row in rows], [1, 2, 3, 4, 5, 6, 9007199254740993])
+        self.assertEqual(rows[1]["name"], "SMITH, \"JJ\"")
+        self.assertEqual(rows[1]["transaction_amt"], 1000.5)
+        self.assertEqual(rows[0]["zip_code"], "100011234")
+        self.assertEqual(rows[0]["transaction_dt"], "01152022")
+        self.assertIsNone(rows[2]["name"])
+        self.assertIsNone(rows[2]["file_num"])
+        self.assertEqual(rows[2]["transaction_amt"], -50)
+        self.assertEqual(rows[4]["name"], "GARCÍA, MARÍA")
+        for row, expected in zip(rows, indiv_rows):
+            self.assertEqual([None if value is None else str(value) for value in row.values()][:14], [value or None for value in expected][:14])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -35,11 +35,18 @@ def federal_fec_ingest_queue_import(message, context):
         "CommunicationCosts_2022/CommunicationCosts_2022.csv"
     ]
 
+    # pass the optional import mode along to each import
+    attributes = dict()
+    if 'attributes' in message:
+        if message['attributes'] is not None:
+            if "mode" in message["attributes"]:
+                attributes["mode"] = message["attributes"]["mode"]
+
     for filepath in files:
 
         # sends a message to Pub/Sub to import the files
         topic = 'projects/' + gcp_project_id + '/topics/federal_fec_ingest_import_bigquery'
-        publisher.publish(topic, b'import FEC file', filepath=filepath)
+        publisher.publish(topic, b'import FEC file', filepath=filepath, **attributes)
         logger.info(' - '.join(['COMPLETED', 'file sent to be imported', filepath]))
 
     # return number of files queued
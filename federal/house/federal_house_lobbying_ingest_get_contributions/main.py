@@ -1,15 +1,16 @@
 import datetime
-import pytz
 import json
 import logging
 import time
 
 import requests
 import urllib3
-import xmltodict
 from google.cloud import firestore
 from google.cloud import secretmanager
-from elasticsearch import Elasticsearch, helpers
+from elasticsearch import Elasticsearch
+import bulk
+import dates
+import xml_reader
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -189,21 +190,13 @@ def federal_house_lobbying_ingest_get_contributions(message, context):
                 continue
             processed_xml_file_text = preprocess_xml(xml_file_text)
             try:
-                dict_from_xml = xmltodict.parse(processed_xml_file_text)
+                dict_from_xml = xml_reader.parse(processed_xml_file_text)
             except:
                 failed_urls.append(file_url)
                 continue
-            json_from_dict = json.loads(json.dumps(dict_from_xml["CONTRIBUTIONDISCLOSURE"]))
+            json_from_dict = dict_from_xml["CONTRIBUTIONDISCLOSURE"]
             if json_from_dict.get("signedDate") is not None:
-                try:
-                    json_from_dict["signedDate"] = datetime.datetime.strptime(json_from_dict["signedDate"], '%m/%d/%Y %I:%M:%S %p')
-                except:
-                    try:
-                        json_from_dict["signedDate"] = datetime.datetime.strptime(json_from_dict["signedDate"], '%m/%d/%Y')
-                    except:
-                        raise
-                json_from_dict["signedDate"] = pytz.timezone('US/Eastern').localize(json_from_dict["signedDate"])
-                json_from_dict["signedDate"] = json_from_dict["signedDate"].strftime("%Y-%m-%dT%H:%M:%S%z")
+                json_from_dict["signedDate"] = dates.normalize_date(json_from_dict["signedDate"], dates.submitted_formats)
             if json_from_dict.get("pacs") is not None:
                 if json_from_dict.get("pacs", {}).get("pac") is not None:
                     if not isinstance(json_from_dict["pacs"]["pac"], list):
@@ -254,36 +247,9 @@ def federal_house_lobbying_ingest_get_contributions(message, context):
                         if dt == "02/31/2008":
                             dt = "02/29/2008"
                         if dt is not None:
-                            try:
-                                dt = datetime.datetime.strptime(dt, '%m/%d/%Y')
-                            except:
-                                try:
-                                    dt = datetime.datetime.strptime(dt, '%m/%d/%y')
-                                except:
-                                    try:
-                                        dt = datetime.datetime.strptime(dt, '%m-%d-%Y')
-                                    except:
-                                        try:
-                                            dt = datetime.datetime.strptime(dt, '%m-%d-%y')
-                                        except:
-                                            try:
-                                                dt = datetime.datetime.strptime(dt, '%m.%d.%Y')
-                                            except:
-                                                try:
-                                                    dt = datetime.datetime.strptime(dt, '%m.%d.%y')
-                                                except:
-                                                    try:
-                                                        dt = datetime.datetime.strptime(dt, '%m%d%Y')
-                                                    except:
-                                                        try:
-                                                            dt = datetime.datetime.strptime(dt, '%m%d%y')
-                                                        except:
-                                                            try:
-                                                                dt = datetime.datetime.strptime(dt, '%m/%d %Y')
-                                                            except:
-                                                                continue
-                            dt = pytz.timezone('US/Eastern').localize(dt)
-                            dt = dt.strftime("%Y-%m-%dT%H:%M:%S%z")
+                            dt = dates.parse_date(dt, dates.contribution_formats)
+                            if dt is None:
+                                continue
                         if c.get("type") is not None or c.get("contributorName") is not None or c.get("payeeName") is not None or c.get("recipientName") is not None or c.get("amount") is not None or dt is not None:
                             contributions.append({
                                 "lobbyist": processed.get("lobbyist"),
@@ -333,7 +299,7 @@ def federal_house_lobbying_ingest_get_contributions(message, context):
                         })
 
         if actions:
-            helpers.bulk(es, actions)
+            bulk.write(es, actions)
             logger.info('ELASTICSEARCH UPDATED' + ' - ' + str(len(actions)) + ' docs')
 
         if len(hits) < 100:
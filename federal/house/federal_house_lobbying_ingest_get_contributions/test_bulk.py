@@ -0,0 +1,153 @@
+import json
+import threading
+import unittest
+import http.server
+
+import elasticsearch
+
+import bulk
+
+# stand-in for the elasticsearch bulk api that keeps documents in a dict and answers every action with the status reject(op_type, index, id, source, attempt) gives
+# reject returns None for actions that succeed, and the first throttle_requests requests are turned away whole with a 429
+class StubHandler(http.server.BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        lines = self.rfile.read(int(self.headers["Content-Length"])).decode().splitlines()
+        items = []
+        with self.server.lock:
+            self.server.requests += 1
+            if self.server.throttle_requests > 0:
+                self.server.throttle_requests -= 1
+                return self.respond(429, {"error": {"type": "es_rejected_execution_exception"}, "status": 429})
+            while len(lines) > 0:
+                op_type, action = next(iter(json.loads(lines.pop(0)).items()))
+                source = None if op_type == "delete" else json.loads(lines.pop(0))
+                index = action["_index"]
+                id = action.get("_id")
+                if id is None:
+                    self.server.generated += 1
+                    id = "generated_" + str(self.server.generated)
+                key = (index, id)
+                self.server.attempts[key] = self.server.attempts.get(key, 0) + 1
+                status = self.server.reject(op_type, index, id, source, self.server.attempts[key])
+                if status is None and op_type == "delete":
+                    status = 200 if self.server.documents.pop(key, None) is not None else 404
+                elif status is None:
+                    self.server.documents[key] = source
+                    status = 201
+                item = {"_index": index, "_id": id, "status": status}
+                if status >= 300:
+                    item["error"] = {"type": "stub_exception", "reason": "rejected by the stub"}
+                items.append({op_type: item})
+        self.respond(200, {"took": 1, "errors": any(next(iter(item.values()))["status"] >= 300 for item in items), "items": items})
+
+    def respond(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(json.dumps(body).encode())
+
+    def log_message(self, *args):
+        pass
+
+# helper function to get index actions for a number of documents
+def gen_actions(n, index="docs"):
+    for i in range(n):
+        yield {"_op_type": "index", "_index": index, "_id": str(i), "_source": {"n": i}}
+
+class TestWrite(unittest.TestCase):
+
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        self.server.lock = threading.Lock()
+        self.server.documents = dict()
+        self.server.attempts = dict()
+        self.server.requests = 0
+        self.server.generated = 0
+        self.server.throttle_requests = 0
+        self.server.reject = lambda op_type, index, id, source, attempt: None
+        threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True).start()
+        self.es = elasticsearch.Elasticsearch(["http://127.0.0.1:%d" % self.server.server_address[1]])
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    # helper function to get the documents the stub holds in an index
+    def get_documents(self, index):
+        return {id: source for (i, id), source in self.server.documents.items() if i == index}
+
+    def test_write(self):
+        stats = bulk.write(self.es, gen_actions(1234), workers=4, chunk_size=100)
+        self.assertEqual((stats["indexed"], stats["failed"]), (1234, 0))
+        self.assertEqual(self.get_documents("docs"), {str(i): {"n": i} for i in range(1234)})
+        self.assertEqual(set(self.server.attempts.values()), {1})
+        self.assertEqual(self.server.requests, 13)
+
+    def test_throttled_documents_are_retried(self):
+        self.server.reject = lambda op_type, index, id, source, attempt: 429 if int(id) % 3 == 0 and attempt <= 2 else None
+        stats = bulk.write(self.es, gen_actions(300), workers=2, chunk_size=50, initial_backoff=0.01)
+        self.assertEqual((stats["indexed"], stats["failed"]), (300, 0))
+        self.assertEqual(len(self.get_documents("docs")), 300)
+        self.assertEqual(self.server.attempts[("docs", "0")], 3)
+
+    def test_throttled_requests_are_retried(self):
+        self.server.throttle_requests = 2
+        stats = bulk.write(self.es, gen_actions(10), workers=1, initial_backoff=0.01)
+        self.assertEqual((stats["indexed"], stats["failed"]), (10, 0))
+        self.assertEqual(self.server.requests, 3)
+
+    def test_failures_raise_and_are_kept(self):
+        self.server.reject = lambda op_type, index, id, source, attempt: 400 if index == "docs" and int(id) % 100 == 7 else (429 if index == "docs" and int(id) % 2 == 0 and attempt == 1 else None)
+        with self.assertRaises(bulk.BulkWriteError) as cm:
+            bulk.write(self.es, gen_actions(1000), workers=4, chunk_size=64, initial_backoff=0.01)
+        self.assertEqual((cm.exception.stats["indexed"], cm.exception.stats["failed"]), (990, 10))
+        self.assertEqual(len(self.get_documents("docs")), 990)
+
+        # every failed document is kept with the action it came from
+        dead_letters = list(self.get_documents("bulk_dead_letters").values())
+        self.assertEqual(sorted(dead_letter["id"] for dead_letter in dead_letters), sorted(str(i) for i in range(7, 1000, 100)))
+        for dead_letter in dead_letters:
+            self.assertEqual((dead_letter["op_type"], dead_letter["index"], dead_letter["status"]), ("index", "docs", "400"))
+            self.assertEqual(json.loads(dead_letter["action"])["_source"], {"n": int(dead_letter["id"])})
+            self.assertEqual(json.loads(dead_letter["error"])["type"], "stub_exception")
+
+    def test_documents_that_stay_throttled_fail(self):
+        self.server.reject = lambda op_type, index, id, source, attempt: 429 if index == "docs" and id == "3" else None
+        with self.assertRaises(bulk.BulkWriteError):
+            bulk.write(self.es, gen_actions(10), max_retries=2, initial_backoff=0.01)
+        self.assertEqual(self.server.attempts[("docs", "3")], 3)
+        self.assertEqual([dead_letter["status"] for dead_letter in self.get_documents("bulk_dead_letters").values()], ["429"])
+
+    def test_raise_on_failure(self):
+        self.server.reject = lambda op_type, index, id, source, attempt: 400 if index == "docs" and id == "3" else None
+        failures = []
+        stats = bulk.write(self.es, gen_actions(10), raise_on_failure=False, dead_letter=failures.extend)
+        self.assertEqual((stats["indexed"], stats["failed"]), (9, 1))
+        self.assertEqual([action["_id"] for action, result in failures], ["3"])
+        self.assertEqual(failures[0][1]["index"]["status"], 400)
+
+    def test_actions_without_ids(self):
+        self.server.reject = lambda op_type, index, id, source, attempt: 400 if source["n"] == 5 else None
+        failures = []
+        actions = ({"_op_type": "index", "_index": "nested", "_source": {"n": i}} for i in range(10))
+        stats = bulk.write(self.es, actions, workers=3, chunk_size=3, raise_on_failure=False, dead_letter=failures.extend)
+        self.assertEqual((stats["indexed"], stats["failed"]), (9, 1))
+        self.assertEqual([action["_source"] for action, result in failures], [{"n": 5}])
+
+    def test_ignore_status(self):
+        bulk.write(self.es, gen_actions(5))
+        actions = ({"_op_type": "delete", "_index": "docs", "_id": str(i)} for i in range(10))
+        stats = bulk.write(self.es, actions, ignore_status=(404,))
+        self.assertEqual((stats["indexed"], stats["ignored"], stats["failed"]), (5, 5, 0))
+        self.assertEqual(self.get_documents("docs"), {})
+
+    def test_dead_letter_falls_back_to_the_log(self):
+        self.server.reject = lambda op_type, index, id, source, attempt: 400 if id == "3" or index == "bulk_dead_letters" else None
+        with self.assertLogs(bulk.logger, level="ERROR") as cm:
+            with self.assertRaises(bulk.BulkWriteError):
+                bulk.write(self.es, gen_actions(10))
+        self.assertTrue(any("BULK FAILURE" in line and '\\"_id\\": \\"3\\"' in line for line in cm.output))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import os
+import glob
+import json
+import unittest
+
+import xml_reader
+
+try:
+    import xmltodict
+except ImportError:
+    xmltodict = None
+
+# xml filings and the json.loads(json.dumps(xmltodict.parse(xml))) they gave, recorded with xmltodict 0.12.0 before it was dropped
+testdata = os.path.join(os.path.dirname(os.path.abspath(__file__)), "testdata")
+
+# helper function to read a fixture
+def read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+class TestParse(unittest.TestCase):
+
+    def test_matches_recorded_xmltodict(self):
+        paths = sorted(glob.glob(os.path.join(testdata, "*.xml")))
+        self.assertGreater(len(paths), 0)
+        for path in paths:
+            self.assertEqual(xml_reader.parse(read(path)), json.loads(read(path[:-4] + ".json")), path)
+
+    @unittest.skipIf(xmltodict is None, "xmltodict is not installed")
+    def test_matches_xmltodict(self):
+        for path in sorted(glob.glob(os.path.join(testdata, "*.xml"))):
+            self.assertEqual(xml_reader.parse(read(path)), json.loads(json.dumps(xmltodict.parse(read(path)))), path)
+
+    def test_bytes(self):
+        path = os.path.join(testdata, "ld203.xml")
+        self.assertEqual(xml_reader.parse(read(path).encode("utf-8")), xml_reader.parse(read(path)))
+
+    def test_repeated_tags(self):
+        filing = xml_reader.parse(read(os.path.join(testdata, "ld2.xml")))["LOBBYINGDISCLOSURE2"]
+        self.assertEqual(len(filing["alis"]["ali_info"]), 2)
+        self.assertEqual([lobbyist["lobbyistLastName"] for lobbyist in filing["alis"]["ali_info"][0]["lobbyists"]["lobbyist"]], ["SMITH", "GARCÍA"])
+        self.assertIsNone(filing["submitURL"])
+
+    def test_malformed(self):
+        with self.assertRaises(Exception):
+            xml_reader.parse("<a><b></a>")
+
+if __name__ == "__main__":
+    unittest.main()
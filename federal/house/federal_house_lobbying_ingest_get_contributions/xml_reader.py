@@ -0,0 +1,73 @@
+import io
+from lxml import etree
+
+# helper function to get the name of an element or attribute the way it is written in the xml, like xsi:type instead of {uri}type
+def get_name(name, nsmap):
+    if not name.startswith("{"):
+        return name
+    uri, local = name[1:].split("}", 1)
+    for prefix, value in nsmap.items():
+        if value == uri and prefix is not None:
+            return prefix + ":" + local
+    return local
+
+# helper function to get the attributes of an element as @ keys, including the namespaces it declares
+def get_attributes(elem, parent_nsmap):
+    attributes = dict()
+    for prefix, uri in elem.nsmap.items():
+        if parent_nsmap.get(prefix) != uri:
+            attributes["@xmlns:" + prefix if prefix is not None else "@xmlns"] = uri
+    for name, value in elem.attrib.items():
+        attributes["@" + get_name(name, elem.nsmap)] = value
+    return attributes
+
+# helper function to add a value under a key, turning repeated keys into lists
+def push(item, key, value):
+    if item is None:
+        item = dict()
+    if key in item:
+        if isinstance(item[key], list):
+            item[key].append(value)
+        else:
+            item[key] = [item[key], value]
+    else:
+        item[key] = value
+    return item
+
+# parse xml into plain dicts, lists and strings in a single streaming pass, laid out the same way as xmltodict.parse
+# elements are cleared as soon as they have been read, so only the branch being read is kept as a tree
+def parse(xml):
+
+    if isinstance(xml, str):
+        xml = xml.encode("utf-8")
+
+    stack = []
+    item = None
+    nsmaps = [dict()]
+    for event, elem in etree.iterparse(io.BytesIO(xml), events=("start", "end"), encoding="utf-8", huge_tree=True, resolve_entities=False):
+        if event == "start":
+            stack.append(item)
+            item = get_attributes(elem, nsmaps[-1]) or None
+            nsmaps.append(elem.nsmap)
+            continue
+
+        # join the text of the element with the text after each of its children, and drop it if it is only whitespace
+        data = [elem.text or ""]
+        for child in elem:
+            data.append(child.tail or "")
+        data = "".join(data).strip() or None
+
+        # add the element to its parent
+        if item is not None:
+            if data is not None:
+                push(item, "#text", data)
+            value = item
+        else:
+            value = data
+        item = push(stack.pop(), get_name(elem.tag, elem.nsmap), value)
+        nsmaps.pop()
+
+        # free the element, keeping its tail until its parent has been read
+        elem.clear(keep_tail=True)
+
+    return item
@@ -0,0 +1,59 @@
+import threading
+import concurrent.futures
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# pooled http client that keeps connections alive and limits how many requests go to each host at once
+class Fetcher:
+
+    def __init__(self, workers=16, per_host=8, timeout=5, verify=True):
+        self.session = requests.Session()
+        self.session.verify = verify
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        self.per_host = per_host
+        self.timeout = timeout
+        self.limits = dict()
+        self.lock = threading.Lock()
+
+    # helper function to get the semaphore that limits requests to the host of a url
+    def limit(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            if host not in self.limits:
+                self.limits[host] = threading.Semaphore(self.per_host)
+            return self.limits[host]
+
+    # get the text of a url, or None if the request fails
+    def get_text(self, url):
+        try:
+            with self.limit(url):
+                r = self.session.get(url, timeout=self.timeout)
+        except requests.exceptions.RequestException:
+            return None
+        if r.status_code != 200:
+            return None
+        return r.text
+
+    # post to a url over the pooled connections
+    def post(self, url, **kwargs):
+        with self.limit(url):
+            return self.session.post(url, timeout=self.timeout, **kwargs)
+
+    # fetch urls concurrently and parse each response on the worker that fetched it, yielding (url, parsed) pairs as they finish
+    # parsed is None if the url could not be fetched
+    def map(self, urls, parse):
+
+        def work(url):
+            text = self.get_text(url)
+            if text is None:
+                return url, None
+            return url, parse(url, text)
+
+        futures = [self.executor.submit(work, url) for url in urls]
+        for future in concurrent.futures.as_completed(futures):
+            yield future.result()
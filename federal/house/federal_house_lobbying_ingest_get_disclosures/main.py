@@ -1,15 +1,16 @@
 import datetime
-import pytz
 import json
 import logging
 import time
 
-import requests
 import urllib3
-import xmltodict
 from google.cloud import firestore
 from google.cloud import secretmanager
-from elasticsearch import Elasticsearch, helpers
+from elasticsearch import Elasticsearch
+import bulk
+import dates
+import xml_reader
+from fetcher import Fetcher
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -24,9 +25,14 @@ elastic_host = secrets.access_secret_version(request={"name": "projects/95241678
 elastic_username_data = secrets.access_secret_version(request={"name": "projects/952416783871/secrets/elastic_username_data/versions/1"}).payload.data.decode()
 elastic_password_data = secrets.access_secret_version(request={"name": "projects/952416783871/secrets/elastic_password_data/versions/1"}).payload.data.decode()
 
+# number of filings downloaded at once, in total and from any one host
+fetch_workers = 16
+fetch_workers_per_host = 8
+
 # connect to resources
 es = Elasticsearch(elastic_host, http_auth=(elastic_username_data, elastic_password_data), scheme="https", port=443)
 db = firestore.Client()
+fetcher = Fetcher(workers=fetch_workers, per_host=fetch_workers_per_host)
 
 # other settings
 firestore_idx_name = 'current-year-idx'
@@ -126,11 +132,140 @@ def preprocess_xml(raw_xml):
             break
     return raw_xml[idx:]
 
-def get_xml_file_text(url):
-    r = requests.get(url, timeout=5)
-    if r.status_code != 200:
-        return
-    return r.text
+# parse the xml of a filing into the original document and the processed document, or None if the xml cannot be parsed
+def parse_filing(hit, xml_file_text):
+    processed_xml_file_text = preprocess_xml(xml_file_text)
+    try:
+        dict_from_xml = xml_reader.parse(processed_xml_file_text)
+    except:
+        return None
+    if "LOBBYINGDISCLOSURE2" in dict_from_xml:
+        json_from_dict = dict_from_xml["LOBBYINGDISCLOSURE2"]
+    else:
+        json_from_dict = dict_from_xml["LOBBYINGDISCLOSURE1"]
+    if json_from_dict.get("signedDate") is not None:
+        json_from_dict["signedDate"] = dates.normalize_date(json_from_dict["signedDate"], dates.submitted_formats)
+    if json_from_dict.get("effectiveDate") is not None:
+        json_from_dict["effectiveDate"] = dates.normalize_date(json_from_dict["effectiveDate"], dates.filing_formats)
+    if json_from_dict.get("terminationDate") is not None:
+        json_from_dict["terminationDate"] = dates.normalize_date(json_from_dict["terminationDate"], dates.filing_formats)
+    if json_from_dict.get("alis", {}).get("ali_info") is not None:
+        if not isinstance(json_from_dict["alis"]["ali_info"], list):
+            json_from_dict["alis"]["ali_info"] = [json_from_dict["alis"]["ali_info"]]
+        for i in json_from_dict["alis"]["ali_info"]:
+            if i.get("federal_agencies") is not None:
+                i["federal_agencies"] = json.dumps(i["federal_agencies"])
+    processed = {
+        "date_submitted": json_from_dict.get("signedDate"),
+        "effective_date": json_from_dict.get("effectiveDate"),
+        "termination_date": json_from_dict.get("terminationDate"),
+        "filing_year": int(json_from_dict.get("reportYear")),
+        "filing_type": json_from_dict.get("reportType"),
+        "client": {
+            "name": json_from_dict.get("clientName"),
+            "description": json_from_dict.get("clientGeneralDescription"),
+            "country": json_from_dict.get("clientCountry"),
+            "state": json_from_dict.get("clientState"),
+            "senate_id": json_from_dict.get("senateID").split("-")[1] if "-" in json_from_dict.get("senateID") else json_from_dict.get("senateID"),
+        },
+        "registrant": {
+            "name": json_from_dict.get("organizationName"),
+            "description": json_from_dict.get("registrantGeneralDescription"),
+            "country": json_from_dict.get("country"),
+            "state": json_from_dict.get("state"),
+            "senate_id": json_from_dict.get("senateID").split("-")[0] if "-" in json_from_dict.get("senateID") else json_from_dict.get("senateID"),
+            "house_id": json_from_dict.get("houseID"),
+            "contact": json_from_dict.get("printedName"),
+        },
+        "url": "https://disclosurespreview.house.gov/ld/ldxmlrelease/" + json_from_dict.get("reportYear") + "/" + json_from_dict.get("reportType") + "/" + hit["_id"] + ".xml"
+    }
+    activities = []
+    if json_from_dict.get("alis", {}).get("ali_info") is not None:
+        for i in json_from_dict.get("alis", {}).get("ali_info"):
+            if i.get("lobbyists", {}).get("lobbyist") is not None:
+                for lob in i["lobbyists"]["lobbyist"]:
+                    name = [lob.get("lobbyistFirstName"), lob.get("lobbyistLastName"), lob.get("lobbyistSuffix")]
+                    name = [n for n in name if n is not None]
+                    if len(name) > 0:
+                        row = {
+                            "lobbyist": {
+                                "name": " ".join(name).upper()
+                            }
+                        }
+                        if lob.get("coveredPosition") is not None:
+                            if lob.get("coveredPosition") != "N/A":
+                                row["covered_position"] = lob.get("coveredPosition")
+                        if i.get("issueAreaCode") is not None:
+                            row["issue_area_code"] = i.get("issueAreaCode")
+                        if i.get("specific_issues", {}).get("description") is not None:
+                            row["specific_issues"] = i.get("specific_issues", {}).get("description")
+                        activities.append(row)
+    elif json_from_dict.get("lobbyists", {}).get("lobbyist") is not None:
+        for lob in json_from_dict["lobbyists"]["lobbyist"]:
+            name = [lob.get("lobbyistFirstName"), lob.get("lobbyistLastName"), lob.get("lobbyistSuffix")]
+            name = [n for n in name if n is not None]
+            if len(name) > 0:
+                row = {
+                    "lobbyist": {
+                        "name": " ".join(name).upper()
+                    }
+                }
+                if lob.get("coveredPosition") is not None:
+                    if lob.get("coveredPosition") != "N/A":
+                        row["covered_position"] = lob.get("coveredPosition")
+                if json_from_dict.get("alis", {}).get("ali_Code") is not None:
+                    row["issue_area_code"] = [c for c in json_from_dict["alis"]["ali_Code"] if c is not None]
+                if json_from_dict.get("specific_issues") is not None:
+                    row["specific_issues"] = json_from_dict["specific_issues"]
+                activities.append(row)
+    if len(activities) > 0:
+        processed["activities"] = activities
+
+    return json_from_dict, processed
+
+# generate the bulk actions for a parsed filing and its nested activities
+def gen_actions(hit, json_from_dict, processed):
+    actions = []
+    actions.append(
+        {
+            '_op_type': 'index',
+            '_index': 'federal_house_lobbying_disclosures',
+            '_id': hit['_id'],
+            '_source': {
+                'obj': json_from_dict,
+                'processed': processed,
+                'context': {
+                    'last_indexed': datetime.datetime.now(datetime.timezone.utc)
+                }
+            }
+        }
+    )
+    activities = processed.get("activities")
+    if activities is not None:
+        processed.pop("activities")
+        parent = processed
+        for activity in activities:
+            record = {
+                "context": {
+                    "last_indexed": datetime.datetime.now(datetime.timezone.utc),
+                    "parent_id": hit['_id'],
+                },
+                "parent": parent,
+                "child": activity
+            }
+            actions.append({
+                "_op_type": "index",
+                "_index": "federal_house_lobbying_disclosures_nested",
+                "_source": record
+            })
+    return actions
+
+# helper function to get the ids of a page of hits that are already indexed, with one lookup for the whole page
+def get_indexed_ids(ids):
+    if len(ids) == 0:
+        return set()
+    response = es.mget(index="federal_house_lobbying_disclosures", body={"ids": ids}, _source=False)
+    return set([doc["_id"] for doc in response["docs"] if doc.get("found")])
 
 # indexes House lobbying disclosures into ElasticSearch
 def federal_house_lobbying_ingest_get_disclosures(message, context):
@@ -184,7 +319,6 @@ def federal_house_lobbying_ingest_get_disclosures(message, context):
 
     # prep load
     failed_urls = []
-    exit = False
     start_time = time.time()
     continue_until_report_type_changes = None
 
@@ -199,6 +333,10 @@ def federal_house_lobbying_ingest_get_disclosures(message, context):
         if idx < previously_firestore_saved_options_idx:
             continue
 
+        # stop before starting an option that might not finish, so it is picked up again next time
+        if time.time() - start_time > 520:
+            break
+
         # skip options if we already know there will be no results
         if continue_until_report_type_changes == option[1]:
             continue
@@ -207,221 +345,33 @@ def federal_house_lobbying_ingest_get_disclosures(message, context):
 
         # get the rows from the table
         json_data = json_data_builder(*option)
-        r = requests.post(url=house_api_url, headers=headers, data=json_data, verify=False, timeout=5)
+        r = fetcher.post(house_api_url, headers=headers, data=json_data, verify=False)
         hits = r.json().get('filteredHits')
         if r.status_code != 200:
             break
 
-        actions = []
+        # skip filings that are already indexed
+        indexed = get_indexed_ids([hit['_id'] for hit in hits])
+        new_hits = dict()
         for hit in hits:
+            if hit['_id'] not in indexed:
+                new_hits[url_from_hit(hit)] = hit
 
-            if time.time() - start_time > 520:
-                exit = True
-                break
-
-            # process each xml file
-            file_url = url_from_hit(hit)
-            xml_file_text = get_xml_file_text(file_url)
-            if not xml_file_text:
-                failed_urls.append(file_url)
-                continue
-            processed_xml_file_text = preprocess_xml(xml_file_text)
-            try:
-                dict_from_xml = xmltodict.parse(processed_xml_file_text)
-            except:
+        # download and parse the new filings concurrently
+        actions = []
+        for file_url, filing in fetcher.map(list(new_hits), lambda url, text: parse_filing(new_hits[url], text)):
+            if filing is None:
                 failed_urls.append(file_url)
                 continue
-            if "LOBBYINGDISCLOSURE2" in dict_from_xml:
-                json_from_dict = json.loads(json.dumps(dict_from_xml["LOBBYINGDISCLOSURE2"]))
-            else:
-                json_from_dict = json.loads(json.dumps(dict_from_xml["LOBBYINGDISCLOSURE1"]))
-            if json_from_dict.get("signedDate") is not None:
-                try:
-                    json_from_dict["signedDate"] = datetime.datetime.strptime(json_from_dict["signedDate"], '%m/%d/%Y %I:%M:%S %p')
-                except:
-                    try:
-                        json_from_dict["signedDate"] = datetime.datetime.strptime(json_from_dict["signedDate"], '%m/%d/%Y')
-                    except:
-                        raise
-                json_from_dict["signedDate"] = pytz.timezone('US/Eastern').localize(json_from_dict["signedDate"])
-                json_from_dict["signedDate"] = json_from_dict["signedDate"].strftime("%Y-%m-%dT%H:%M:%S%z")
-            if json_from_dict.get("effectiveDate") is not None:
-                try:
-                    json_from_dict["effectiveDate"] = datetime.datetime.strptime(json_from_dict["effectiveDate"], '%m/%d/%Y %I:%M:%S %p')
-                except:
-                    try:
-                        json_from_dict["effectiveDate"] = datetime.datetime.strptime(json_from_dict["effectiveDate"], '%m/%d/%Y')
-                    except:
-                        try:
-                            json_from_dict["effectiveDate"] = datetime.datetime.strptime(json_from_dict["effectiveDate"], '%m/%d/%y')
-                        except:
-                            try:
-                                json_from_dict["effectiveDate"] = datetime.datetime.strptime(json_from_dict["effectiveDate"], '%m-%d-%Y')
-                            except:
-                                try:
-                                    json_from_dict["effectiveDate"] = datetime.datetime.strptime(json_from_dict["effectiveDate"], '%m-%d-%y')
-                                except:
-                                    try:
-                                        json_from_dict["effectiveDate"] = datetime.datetime.strptime(json_from_dict["effectiveDate"], '%m.%d.%Y')
-                                    except:
-                                        try:
-                                            json_from_dict["effectiveDate"] = datetime.datetime.strptime(json_from_dict["effectiveDate"], '%m.%d.%y')
-                                        except:
-                                            try:
-                                                json_from_dict["effectiveDate"] = datetime.datetime.strptime(json_from_dict["effectiveDate"], '%m%d%Y')
-                                            except:
-                                                try:
-                                                    json_from_dict["effectiveDate"] = datetime.datetime.strptime(json_from_dict["effectiveDate"], '%m%d%y')
-                                                except:
-                                                    raise
-                json_from_dict["effectiveDate"] = pytz.timezone('US/Eastern').localize(json_from_dict["effectiveDate"])
-                json_from_dict["effectiveDate"] = json_from_dict["effectiveDate"].strftime("%Y-%m-%dT%H:%M:%S%z")
-            if json_from_dict.get("terminationDate") is not None:
-                try:
-                    json_from_dict["terminationDate"] = datetime.datetime.strptime(json_from_dict["terminationDate"], '%m/%d/%Y %I:%M:%S %p')
-                except:
-                    try:
-                        json_from_dict["terminationDate"] = datetime.datetime.strptime(json_from_dict["terminationDate"], '%m/%d/%Y')
-                    except:
-                        try:
-                            json_from_dict["terminationDate"] = datetime.datetime.strptime(json_from_dict["terminationDate"], '%m/%d/%y')
-                        except:
-                            try:
-                                json_from_dict["terminationDate"] = datetime.datetime.strptime(json_from_dict["terminationDate"], '%m-%d-%Y')
-                            except:
-                                try:
-                                    json_from_dict["terminationDate"] = datetime.datetime.strptime(json_from_dict["terminationDate"], '%m-%d-%y')
-                                except:
-                                    try:
-                                        json_from_dict["terminationDate"] = datetime.datetime.strptime(json_from_dict["terminationDate"], '%m.%d.%Y')
-                                    except:
-                                        try:
-                                            json_from_dict["terminationDate"] = datetime.datetime.strptime(json_from_dict["terminationDate"], '%m.%d.%y')
-                                        except:
-                                            try:
-                                                json_from_dict["terminationDate"] = datetime.datetime.strptime(json_from_dict["terminationDate"], '%m%d%Y')
-                                            except:
-                                                try:
-                                                    json_from_dict["terminationDate"] = datetime.datetime.strptime(json_from_dict["terminationDate"], '%m%d%y')
-                                                except:
-                                                    raise
-                json_from_dict["terminationDate"] = pytz.timezone('US/Eastern').localize(json_from_dict["terminationDate"])
-                json_from_dict["terminationDate"] = json_from_dict["terminationDate"].strftime("%Y-%m-%dT%H:%M:%S%z")
-            if json_from_dict.get("alis", {}).get("ali_info") is not None:
-                if not isinstance(json_from_dict["alis"]["ali_info"], list):
-                    json_from_dict["alis"]["ali_info"] = [json_from_dict["alis"]["ali_info"]]
-                for i in json_from_dict["alis"]["ali_info"]:
-                    if i.get("federal_agencies") is not None:
-                        i["federal_agencies"] = json.dumps(i["federal_agencies"])
-            processed = {
-                "date_submitted": json_from_dict.get("signedDate"),
-                "effective_date": json_from_dict.get("effectiveDate"),
-                "termination_date": json_from_dict.get("terminationDate"),
-                "filing_year": int(json_from_dict.get("reportYear")),
-                "filing_type": json_from_dict.get("reportType"),
-                "client": {
-                    "name": json_from_dict.get("clientName"),
-                    "description": json_from_dict.get("clientGeneralDescription"),
-                    "country": json_from_dict.get("clientCountry"),
-                    "state": json_from_dict.get("clientState"),
-                    "senate_id": json_from_dict.get("senateID").split("-")[1] if "-" in json_from_dict.get("senateID") else json_from_dict.get("senateID"),
-                },
-                "registrant": {
-                    "name": json_from_dict.get("organizationName"),
-                    "description": json_from_dict.get("registrantGeneralDescription"),
-                    "country": json_from_dict.get("country"),
-                    "state": json_from_dict.get("state"),
-                    "senate_id": json_from_dict.get("senateID").split("-")[0] if "-" in json_from_dict.get("senateID") else json_from_dict.get("senateID"),
-                    "house_id": json_from_dict.get("houseID"),
-                    "contact": json_from_dict.get("printedName"),
-                },
-                "url": "https://disclosurespreview.house.gov/ld/ldxmlrelease/" + json_from_dict.get("reportYear") + "/" + json_from_dict.get("reportType") + "/" + hit["_id"] + ".xml"
-            }
-            activities = []
-            if json_from_dict.get("alis", {}).get("ali_info") is not None:
-                for i in json_from_dict.get("alis", {}).get("ali_info"):
-                    if i.get("lobbyists", {}).get("lobbyist") is not None:
-                        for lob in i["lobbyists"]["lobbyist"]:
-                            name = [lob.get("lobbyistFirstName"), lob.get("lobbyistLastName"), lob.get("lobbyistSuffix")]
-                            name = [n for n in name if n is not None]
-                            if len(name) > 0:
-                                row = {
-                                    "lobbyist": {
-                                        "name": " ".join(name).upper()
-                                    }
-                                }
-                                if lob.get("coveredPosition") is not None:
-                                    if lob.get("coveredPosition") != "N/A":
-                                        row["covered_position"] = lob.get("coveredPosition")
-                                if i.get("issueAreaCode") is not None:
-                                    row["issue_area_code"] = i.get("issueAreaCode")
-                                if i.get("specific_issues", {}).get("description") is not None:
-                                    row["specific_issues"] = i.get("specific_issues", {}).get("description")
-                                activities.append(row)
-            elif json_from_dict.get("lobbyists", {}).get("lobbyist") is not None:
-                for lob in json_from_dict["lobbyists"]["lobbyist"]:
-                    name = [lob.get("lobbyistFirstName"), lob.get("lobbyistLastName"), lob.get("lobbyistSuffix")]
-                    name = [n for n in name if n is not None]
-                    if len(name) > 0:
-                        row = {
-                            "lobbyist": {
-                                "name": " ".join(name).upper()
-                            }
-                        }
-                        if lob.get("coveredPosition") is not None:
-                            if lob.get("coveredPosition") != "N/A":
-                                row["covered_position"] = lob.get("coveredPosition")
-                        if json_from_dict.get("alis", {}).get("ali_Code") is not None:
-                            row["issue_area_code"] = [c for c in json_from_dict["alis"]["ali_Code"] if c is not None]
-                        if json_from_dict.get("specific_issues") is not None:
-                            row["specific_issues"] = json_from_dict["specific_issues"]
-                        activities.append(row)
-            if len(activities) > 0:
-                processed["activities"] = activities
-            if es.exists(index="federal_house_lobbying_disclosures", id=hit['_id']) is False:
-                actions.append(
-                    {
-                        '_op_type': 'index',
-                        '_index': 'federal_house_lobbying_disclosures',
-                        '_id': hit['_id'],
-                        '_source': {
-                            'obj': json_from_dict,
-                            'processed': processed,
-                            'context': {
-                                'last_indexed': datetime.datetime.now(datetime.timezone.utc)
-                            }
-                        }
-                    }
-                )
-                activities = processed.get("activities")
-                if activities is not None:
-                    processed.pop("activities")
-                    parent = processed
-                    for activity in activities:
-                        record = {
-                            "context": {
-                                "last_indexed": datetime.datetime.now(datetime.timezone.utc),
-                                "parent_id": hit['_id'],
-                            },
-                            "parent": parent,
-                            "child": activity
-                        }
-                        actions.append({
-                            "_op_type": "index",
-                            "_index": "federal_house_lobbying_disclosures_nested",
-                            "_source": record
-                        })
+            actions.extend(gen_actions(new_hits[file_url], *filing))
 
         if actions:
-            helpers.bulk(es, actions)
+            bulk.write(es, actions)
             logger.info('ELASTICSEARCH UPDATED' + ' - ' + str(len(actions)) + ' docs')
 
         if len(hits) < 100:
             continue_until_report_type_changes = option[1]
 
-        if exit:
-            break
-
     # update Firestore
     update = {
         firestore_idx_name: idx,
@@ -0,0 +1,111 @@
+import time
+import socket
+import threading
+import unittest
+import http.server
+
+import fetcher
+
+# stub host that answers /ok/... with the path, /missing/... with a 404, /error/... with a 500 and /slow/... after a second
+# it records how many requests it was answering at once
+class StubHandler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.respond()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.respond()
+
+    def respond(self):
+        with self.server.lock:
+            self.server.active += 1
+            self.server.max_active = max(self.server.max_active, self.server.active)
+        try:
+            time.sleep(1 if self.path.startswith("/slow/") else self.server.delay)
+            status = 404 if self.path.startswith("/missing/") else (500 if self.path.startswith("/error/") else 200)
+            body = self.path.encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "text/xml")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with self.server.lock:
+                self.server.active -= 1
+
+    def log_message(self, *args):
+        pass
+
+# helper function to start a stub host
+def start_host(delay=0.05):
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.lock = threading.Lock()
+    server.active = 0
+    server.max_active = 0
+    server.delay = delay
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True).start()
+    return server
+
+class TestFetcher(unittest.TestCase):
+
+    def setUp(self):
+        self.hosts = [start_host(), start_host()]
+        self.urls = ["http://127.0.0.1:%d" % host.server_address[1] for host in self.hosts]
+
+    def tearDown(self):
+        for host in self.hosts:
+            host.shutdown()
+            host.server_close()
+
+    def test_map(self):
+        f = fetcher.Fetcher(workers=8, per_host=4)
+        urls = [self.urls[0] + "/ok/" + str(i) for i in range(20)]
+        threads = set()
+        def parse(url, text):
+            threads.add(threading.current_thread())
+            return text
+        results = dict(f.map(urls, parse))
+        self.assertEqual(results, {url: "/ok/" + str(i) for i, url in enumerate(urls)})
+        self.assertNotIn(threading.current_thread(), threads)
+
+    def test_per_host_limit(self):
+        f = fetcher.Fetcher(workers=16, per_host=3)
+        urls = [base + "/ok/" + str(i) for i in range(24) for base in self.urls]
+        start = time.time()
+        self.assertEqual(len(list(f.map(urls, lambda url, text: text))), 48)
+        for host in self.hosts:
+            self.assertEqual(host.max_active, 3)
+        # the hosts are limited apart, so both are answering at once and the run takes as long as one host's share
+        self.assertLess(time.time() - start, 24 / 3 * 0.05 * 1.8)
+
+    def test_post_shares_the_limit(self):
+        f = fetcher.Fetcher(workers=16, per_host=2)
+        threads = [threading.Thread(target=f.post, args=(self.urls[0] + "/ok/post",), kwargs={"data": "{}"}) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.hosts[0].max_active, 2)
+        self.assertEqual(f.post(self.urls[0] + "/ok/post", data="{}").text, "/ok/post")
+
+    def test_failures(self):
+        closed = socket.socket()
+        closed.bind(("127.0.0.1", 0))
+        refused = "http://127.0.0.1:%d/ok/1" % closed.getsockname()[1]
+        closed.close()
+        f = fetcher.Fetcher(workers=8, per_host=4, timeout=0.3)
+        urls = [self.urls[0] + "/missing/1", self.urls[0] + "/error/1", self.urls[0] + "/slow/1", refused, self.urls[1] + "/ok/1"]
+        parsed = []
+        results = dict(f.map(urls, lambda url, text: parsed.append(url) or text))
+        self.assertEqual(results, {urls[0]: None, urls[1]: None, urls[2]: None, urls[3]: None, urls[4]: "/ok/1"})
+        self.assertEqual(parsed, [urls[4]])
+
+    def test_failures_release_the_host(self):
+        # every request times out, and the host still takes new requests afterwards
+        f = fetcher.Fetcher(workers=8, per_host=2, timeout=0.1)
+        self.assertEqual(set(result for url, result in f.map([self.urls[0] + "/slow/" + str(i) for i in range(4)], lambda url, text: text)), {None})
+        self.assertEqual(f.get_text(self.urls[0] + "/ok/after"), "/ok/after")
+
+if __name__ == "__main__":
+    unittest.main()
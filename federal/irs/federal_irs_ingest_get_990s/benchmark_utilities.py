@@ -0,0 +1,27 @@
+import os
+import sys
+import json
+import time
+
+import utilities
+
+# time get_xml_parts over the filings in testdata, or a json list of filings given as the first argument
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), "testdata", "schedules.json")
+    with open(path) as f:
+        filings = json.load(f)
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    # warm the date cache, which is kept for the life of an instance
+    for schedules in filings:
+        utilities.get_xml_parts(schedules)
+
+    start = time.perf_counter()
+    for i in range(rounds):
+        for schedules in filings:
+            utilities.get_xml_parts(schedules)
+    elapsed = time.perf_counter() - start
+    print(' - '.join(['get_xml_parts', str(len(filings)) + ' filings', str(rounds) + ' rounds', '%.3f ms per filing' % (elapsed * 1000 / (rounds * len(filings)))]))
+
+if __name__ == "__main__":
+    main()
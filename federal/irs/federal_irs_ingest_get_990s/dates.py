@@ -0,0 +1,55 @@
+import re
+import datetime
+import functools
+import pytz
+
+eastern = pytz.timezone('US/Eastern')
+
+# patterns that recognize the strings each strptime format could parse, so only the formats that can fit are ever tried
+month = r"\d{1,2}"
+day = r"[ \d]?\d"
+time = r"\d{1,2}:\d{1,2}:\d{1,2}\s+[ap]m"
+patterns = {
+    "%m/%d/%Y %I:%M:%S %p": month + "/" + day + r"/\d{4}\s+" + time,
+    "%m/%d/%Y": month + "/" + day + r"/\d{4}",
+    "%m/%d/%y": month + "/" + day + r"/\d{2}",
+    "%m-%d-%Y": month + "-" + day + r"-\d{4}",
+    "%m-%d-%y": month + "-" + day + r"-\d{2}",
+    "%m.%d.%Y": month + r"\." + day + r"\.\d{4}",
+    "%m.%d.%y": month + r"\." + day + r"\.\d{2}",
+    "%m%d%Y": month + day + r"\d{4}",
+    "%m%d%y": month + day + r"\d{2}",
+    "%m/%d %Y": month + "/" + day + r"\s+\d{4}",
+    "%Y-%m-%d": r"\d{4}-" + month + "-" + day
+}
+compiled_patterns = {f: re.compile(p, re.IGNORECASE) for f, p in patterns.items()}
+
+# formats seen in lobbying filings, in the order they are tried
+submitted_formats = ("%m/%d/%Y %I:%M:%S %p", "%m/%d/%Y")
+filing_formats = ("%m/%d/%Y %I:%M:%S %p", "%m/%d/%Y", "%m/%d/%y", "%m-%d-%Y", "%m-%d-%y", "%m.%d.%Y", "%m.%d.%y", "%m%d%Y", "%m%d%y")
+contribution_formats = ("%m/%d/%Y", "%m/%d/%y", "%m-%d-%Y", "%m-%d-%y", "%m.%d.%Y", "%m.%d.%y", "%m%d%Y", "%m%d%y", "%m/%d %Y")
+iso_formats = ("%Y-%m-%d",)
+
+# helper function to parse a date string with the first format that fits and format it in Eastern time, or None if none fit
+@functools.lru_cache(maxsize=100000)
+def parse_date(value, formats):
+    for f in formats:
+        if compiled_patterns[f].fullmatch(value) is None:
+            continue
+        try:
+            dt = datetime.datetime.strptime(value, f)
+        except ValueError:
+            continue
+        return eastern.localize(dt).strftime("%Y-%m-%dT%H:%M:%S%z")
+    return None
+
+# normalize a date string into Eastern time, trying each of the formats in order, and raise a ValueError if none fit
+def normalize_date(value, formats=filing_formats):
+    dt = parse_date(value, formats)
+    if dt is None:
+        raise ValueError("unrecognized date " + str(value))
+    return dt
+
+# normalize a YYYY-MM-DD date string into Eastern time
+def normalize_iso_date(value):
+    return normalize_date(value, iso_formats)
@@ -0,0 +1,103 @@
+import datetime
+import logging
+
+from irsx.xmlrunner import XMLRunner
+from irsx.filing import InvalidXMLException
+
+import utilities
+import dates
+import xml_cache
+
+logger = logging.getLogger(__name__)
+
+# XMLRunner and xml cache of the current process, set up once per worker
+xml_runner = None
+cache = None
+
+# set up the XMLRunner and xml cache the current process keeps for its whole life
+def init_worker():
+    global xml_runner, cache
+    xml_runner = XMLRunner()
+    cache = xml_cache.from_env()
+
+# helper function to run a filing, reading it through the xml cache if there is one
+def run_filing(object_id, download=True):
+    if cache is not None:
+        return xml_cache.run_filing(cache, xml_runner, object_id, download=download)
+    return xml_runner.run_filing(object_id)
+
+# helper function to extract the parts of a parsed filing along with the index they belong in
+def extract(schedules):
+    xml = utilities.get_xml_parts(schedules)
+
+    if 'IRS990EZ' in xml:
+        index = '990ez'
+    elif 'IRS990PF' in xml:
+        index = '990pf'
+    else:
+        index = '990'
+
+    return index, xml
+
+# parse an (idx, row) pair from the index into (idx, object_id, action), where action is None if the row is skipped and False if the filing failed
+def parse_row(item):
+    idx, row = item
+
+    # process the object id
+    object_id = row[8]
+    if int(object_id[:4]) < 2014: # can't process these
+        return idx, object_id, None
+
+    # process the submission date
+    sub_date = dates.normalize_date(row[4], dates.submitted_formats)
+
+    # grab the filing
+    try:
+        filing = run_filing(object_id)
+        schedules = filing.get_result()
+    except (RuntimeError, InvalidXMLException) as e:
+        logger.error(' - '.join(['ERROR', object_id, str(e)]))
+        return idx, object_id, False
+
+    if schedules is None:
+        return idx, object_id, None
+
+    index, xml = extract(schedules)
+
+    return idx, object_id, {
+        '_op_type': 'index',
+        '_index': 'federal_irs_' + index,
+        '_id': object_id,
+        '_source': {
+            'row': {
+                'return_id': str(row[0]),
+                'filing_type': row[1],
+                'ein': str(row[2]),
+                'tax_period': row[3],
+                'sub_date': sub_date,
+                'taxpayer_name': row[5],
+                'return_type': str(row[6]),
+                'dln': str(row[7]),
+                'object_id': object_id
+            },
+            'obj': xml,
+            'context': {
+                'last_indexed': datetime.datetime.now(datetime.timezone.utc)
+            }
+        }
+    }
+
+# re-extract a filing from the xml cache alone into (object_id, index, xml), where index is None if the filing has nothing to extract and False if it failed
+def replay_object(object_id):
+    try:
+        filing = run_filing(object_id, download=False)
+        schedules = filing.get_result()
+    except (RuntimeError, InvalidXMLException) as e:
+        logger.error(' - '.join(['ERROR', object_id, str(e)]))
+        return object_id, False, None
+
+    if schedules is None:
+        return object_id, None, None
+
+    index, xml = extract(schedules)
+    return object_id, index, xml
@@ -0,0 +1,69 @@
+import os
+import csv
+
+# number of bytes read from the index at a time, each one a range request when reading from Google Cloud Storage
+chunk_size = 8 * 1024 * 1024
+
+# open an index as a seekable binary file along with a version that changes whenever the file does
+# the file is read from IRS_INDEX_PATH if it is set, otherwise it is streamed from Google Cloud Storage with range requests
+def open_index(client, bucket_name, path):
+    local = os.environ.get("IRS_INDEX_PATH")
+    if local is not None:
+        filepath = os.path.join(local, os.path.basename(path))
+        return open(filepath, "rb"), str(os.stat(filepath).st_mtime_ns)
+    blob = client.bucket(bucket_name).get_blob(path)
+    return blob.open("rb", chunk_size=chunk_size), str(blob.generation)
+
+# helper function to stream the lines of a file from a byte offset, with the offset just past each line
+def iter_lines(f, offset):
+    f.seek(offset)
+    buffer = b""
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        buffer += chunk
+        start = 0
+        while True:
+            end = buffer.find(b"\n", start)
+            if end == -1:
+                break
+            offset += end + 1 - start
+            yield buffer[start:end + 1], offset
+            start = end + 1
+        buffer = buffer[start:]
+    if buffer:
+        yield buffer, offset + len(buffer)
+
+# stream the rows of a csv file from a byte offset at the start of a row, with the offset of the row after each one
+# quoted fields can hold newlines, so lines are joined until their quotes are balanced
+def read_rows(f, offset):
+    pending = b""
+    for line, next_offset in iter_lines(f, offset):
+        pending += line
+        if pending.count(b'"') % 2 == 1:
+            continue
+        text = pending.decode("utf-8")
+        pending = b""
+        if text.strip() == "":
+            continue
+        yield next(csv.reader([text], delimiter=',')), next_offset
+
+# get the byte offset of the first row after the header
+def get_start(f):
+    for row, offset in read_rows(f, 0):
+        return offset
+    return 0
+
+# count the rows of an index and find the byte offset of the row at idx, in one pass that keeps memory constant
+def scan(f, idx):
+    start = get_start(f)
+    total_rows = 0
+    offset = start
+    for row, next_offset in read_rows(f, start):
+        total_rows += 1
+        if total_rows == idx:
+            offset = next_offset
+    if idx > total_rows:
+        offset = next_offset if total_rows > 0 else start
+    return total_rows, offset
@@ -1,20 +1,20 @@
-import csv
-import pytz
 import datetime
 import json
 import logging
 import os
 import time
-from io import StringIO
+import argparse
+import threading
+import multiprocessing
 
 import requests
-from elasticsearch import Elasticsearch, helpers
+from elasticsearch import Elasticsearch
 from elasticsearch_dsl import Search
 from google.cloud import firestore, secretmanager, storage
-from irsx.xmlrunner import XMLRunner
-from irsx.filing import InvalidXMLException
 
-import utilities
+import bulk
+import filings
+import index_reader
 
 # format logs
 formatter = '%(asctime)s - %(levelname)s - %(message)s'
@@ -33,10 +33,47 @@ es = Elasticsearch(elastic_host, http_auth=(elastic_username_data, elastic_passw
 db = firestore.Client()
 client = storage.Client()
 
-# indexes IRS 990s into ElasticSearch
-def federal_irs_ingest_get_990s(message, context):
-
-    year = datetime.datetime.today().year
+# number of parsed filings sent to elasticsearch at a time
+bulk_size = 1000
+
+# number of index rows handed to a worker process at a time
+chunk_size = 8
+
+# number of index rows read ahead of the parsed results
+max_pending_rows = 1000
+
+# helper function to parse index rows on a pool of processes, yielding results in index order
+# rows are only read a little ahead of the results, so the index is never held in memory
+def parse_rows(items, processes):
+    if processes <= 1:
+        filings.init_worker()
+        yield from map(filings.parse_row, items)
+        return
+
+    pending = threading.Semaphore(max_pending_rows)
+    stopped = threading.Event()
+
+    # helper function to hold back rows until earlier results have been taken
+    def throttle(items):
+        for item in items:
+            pending.acquire()
+            if stopped.is_set():
+                return
+            yield item
+
+    pool = multiprocessing.Pool(processes, initializer=filings.init_worker)
+    try:
+        for result in pool.imap(filings.parse_row, throttle(items), chunksize=chunk_size):
+            pending.release()
+            yield result
+    finally:
+        stopped.set()
+        pending.release()
+        pool.terminate()
+        pool.join()
+
+# index the 990s of a year on a number of processes, stopping after time_limit seconds if one is given
+def index_990s(year, processes=1, time_limit=None):
 
     # settings pulled from a database
     ref = db.collection('federal').document('irs').collection('990s').document(str(year))
@@ -46,109 +83,83 @@ def federal_irs_ingest_get_990s(message, context):
     else:
         latest_saved_idx = 0
 
-    # prep load
-    xml_runner = XMLRunner()
+    # open the index and find the row to resume from, seeking straight to it unless the index has changed since the last run
     start_time = time.time()
-    bucket = client.get_bucket(gcp_project_id)
-    blob = bucket.get_blob('downloads/federal/irs/index_' + str(year) + '.csv')
-    blob = blob.download_as_string().decode('utf-8')
-    blob = StringIO(blob)
-
-    # load by looping through all the rows in the index
+    f, generation = index_reader.open_index(client, gcp_project_id, 'downloads/federal/irs/index_' + str(year) + '.csv')
+    if settings is not None and settings.get('generation') == generation and settings.get('offset') is not None:
+        total_rows = settings['total_rows']
+        offset = settings['offset']
+    else:
+        total_rows, offset = index_reader.scan(f, latest_saved_idx)
+        logger.info(' - '.join(['INFO', 'index scanned', str(total_rows) + ' rows']))
+
+    # stream the rows that have not been indexed yet, keeping track of where each one ends
+    offsets = dict()
+    def gen_items():
+        for idx, (row, next_offset) in enumerate(index_reader.read_rows(f, offset), start=latest_saved_idx):
+            offsets[idx] = next_offset
+            yield idx, row
+
+    # load by parsing all the rows in the index that have not been indexed yet
+    # results come back in index order, so the checkpoint only ever moves past rows that are done
     actions = []
     failed_object_ids = []
-    reader = csv.reader(blob, delimiter=',')
-    next(reader) # skip header
-    for idx, row in enumerate(reader):
-
-        if time.time() - start_time > 520:
-            break
+    next_idx = latest_saved_idx
+    next_offset = offset
+    for idx, object_id, action in parse_rows(gen_items(), processes):
 
-        # skip previously indexed objectss
-        if idx < latest_saved_idx:
-            continue
-
-        # process the object id
-        object_id = row[8]
-        if int(object_id[:4]) < 2014: # can't process these
-            continue
-
-        # process the submission date
-        sub_date = row[4]
-        try:
-            sub_date = datetime.datetime.strptime(sub_date, '%m/%d/%Y %I:%M:%S %p')
-        except:
-            try:
-                sub_date = datetime.datetime.strptime(sub_date, '%m/%d/%Y')
-            except:
-                raise
-
-        sub_date = pytz.timezone('US/Eastern').localize(sub_date)
-        sub_date = sub_date.strftime("%Y-%m-%dT%H:%M:%S%z")
-
-        # grab the filing
-        try:
-            filing = xml_runner.run_filing(object_id)
-            schedules = filing.get_result()
-        except (RuntimeError, InvalidXMLException) as e:
-            logger.error(object_id, str(e))
+        if action is False:
             failed_object_ids.append(object_id)
-            continue
-
-        if schedules is not None:
-
-            xml = utilities.get_xml_parts(schedules)
-            xml = utilities.clean_xml(xml)
-
-            if 'IRS990EZ' in xml:
-                index = '990ez'
-            elif 'IRS990PF' in xml:
-                index = '990pf'
-            else:
-                index = '990'
-
-            actions.append({
-                '_op_type': 'index',
-                '_index': 'federal_irs_' + index,
-                '_id': object_id,
-                '_source': {
-                    'row': {
-                        'return_id': str(row[0]),
-                        'filing_type': row[1],
-                        'ein': str(row[2]),
-                        'tax_period': row[3],
-                        'sub_date': sub_date,
-                        'taxpayer_name': row[5],
-                        'return_type': str(row[6]),
-                        'dln': str(row[7]),
-                        'object_id': object_id
-                    },
-                    'obj': xml,
-                    'context': {
-                        'last_indexed': datetime.datetime.now(datetime.timezone.utc)
-                    }
-                }
-            })
-
-        if len(actions) >= 1000:
-            helpers.bulk(es, actions)
+        elif action is not None:
+            actions.append(action)
+        next_idx = idx + 1
+        next_offset = offsets.pop(idx)
+
+        if len(actions) >= bulk_size:
+            bulk.write(es, actions)
             logger.info('ELASTICSEARCH UPDATED' + ' - ' + str(len(actions)) + ' docs')
             actions = []
 
+        if time_limit is not None and time.time() - start_time > time_limit:
+            break
+
     # index all docs into elasticsearch
     if actions:
-        helpers.bulk(es, actions)
+        bulk.write(es, actions)
         logger.info('ELASTICSEARCH UPDATED' + ' - ' + str(len(actions)) + ' docs')
+    f.close()
 
     # update Firestore
     update = {
-        "idx": idx,
+        "idx": next_idx,
+        "offset": next_offset,
+        "total_rows": total_rows,
+        "generation": generation,
         "last_updated": datetime.datetime.now(datetime.timezone.utc)
     }
     if len(failed_object_ids) > 0:
         update['failed_object_ids'] = firestore.ArrayUnion(failed_object_ids)
     ref.set(update, merge=True)
 
-    num_remaining_rows = len(list(reader))
-    logger.info('FIRESTORE UPDATED - completed: ' + str(idx) + ', remaining: ' + str(num_remaining_rows))
+    num_remaining_rows = total_rows - next_idx
+    logger.info('FIRESTORE UPDATED - completed: ' + str(next_idx) + ', remaining: ' + str(num_remaining_rows))
     return num_remaining_rows
+
+# indexes IRS 990s into ElasticSearch
+def federal_irs_ingest_get_990s(message, context):
+
+    # get the optional number of processes from the Pub/Sub message
+    processes = 1
+    if 'attributes' in message:
+        if message['attributes'] is not None:
+            if "processes" in message["attributes"]:
+                processes = int(message["attributes"]["processes"])
+
+    return index_990s(datetime.datetime.today().year, processes=processes, time_limit=520)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index a year of IRS 990s into Elasticsearch without a time limit")
+    parser.add_argument("--year", type=int, default=datetime.datetime.today().year, help="year of the index to load")
+    parser.add_argument("--processes", type=int, default=multiprocessing.cpu_count(), help="number of processes parsing filings")
+    args = parser.parse_args()
+    index_990s(args.year, processes=args.processes)
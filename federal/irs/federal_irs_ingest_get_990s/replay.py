@@ -0,0 +1,70 @@
+import os
+import json
+import logging
+import argparse
+import multiprocessing
+
+import filings
+import xml_cache
+
+# format logs
+formatter = '%(asctime)s - %(levelname)s - %(message)s'
+logging.basicConfig(format=formatter, level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# number of object ids handed to a worker process at a time
+chunk_size = 8
+
+# re-extract every filing in the xml cache on a pool of processes, without going to the network
+# yields (object_id, index, xml) the same way as filings.replay_object
+def replay(directory, processes):
+    os.environ["IRS_XML_CACHE_PATH"] = directory
+    object_ids = xml_cache.XMLCache(directory).list()
+    with multiprocessing.Pool(processes, initializer=filings.init_worker) as pool:
+        yield from pool.imap_unordered(filings.replay_object, object_ids, chunksize=chunk_size)
+
+# helper function to turn replayed filings into elasticsearch actions that replace the extracted parts of each doc
+def gen_actions(results, failed):
+    for object_id, index, xml in results:
+        if index is False:
+            failed.append(object_id)
+        elif index is not None:
+            yield {
+                '_op_type': 'update',
+                '_index': 'federal_irs_' + index,
+                '_id': object_id,
+                'doc': {
+                    'obj': xml
+                }
+            }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-run extraction across every filing in the IRS 990 xml cache")
+    parser.add_argument("--cache", default=os.environ.get("IRS_XML_CACHE_PATH"), help="directory of the xml cache")
+    parser.add_argument("--processes", type=int, default=multiprocessing.cpu_count(), help="number of processes parsing filings")
+    parser.add_argument("--output", help="jsonl file to write the extracted filings to")
+    parser.add_argument("--elasticsearch", action="store_true", help="update the extracted filings in elasticsearch, using ELASTIC_HOST, ELASTIC_USERNAME and ELASTIC_PASSWORD")
+    args = parser.parse_args()
+    if args.cache is None:
+        parser.error("--cache or IRS_XML_CACHE_PATH is required")
+
+    failed = []
+    if args.elasticsearch:
+        from elasticsearch import Elasticsearch
+        import bulk
+        es = Elasticsearch(os.environ["ELASTIC_HOST"], http_auth=(os.environ["ELASTIC_USERNAME"], os.environ["ELASTIC_PASSWORD"]), scheme='https', port=443)
+        stats = bulk.write(es, gen_actions(replay(args.cache, args.processes), failed))
+        logger.info(' - '.join(['INFO', 'elasticsearch updated', json.dumps(stats)]))
+    else:
+        output = open(args.output, "w") if args.output is not None else None
+        count = 0
+        for object_id, index, xml in replay(args.cache, args.processes):
+            if index is False:
+                failed.append(object_id)
+            elif index is not None and output is not None:
+                output.write(json.dumps({"object_id": object_id, "index": index, "obj": xml}) + "\n")
+            count += 1
+        if output is not None:
+            output.close()
+        logger.info(' - '.join(['INFO', 'filings replayed', str(count)]))
+    logger.info(' - '.join(['INFO', 'filings failed', str(len(failed))]))
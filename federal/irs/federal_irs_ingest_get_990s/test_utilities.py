@@ -0,0 +1,57 @@
+import os
+import copy
+import json
+import unittest
+
+import utilities
+
+testdata = os.path.join(os.path.dirname(os.path.abspath(__file__)), "testdata")
+
+# helper function to load a fixture from testdata
+def load(name):
+    with open(os.path.join(testdata, name)) as f:
+        return json.load(f)
+
+class TestGetXmlParts(unittest.TestCase):
+
+    def setUp(self):
+        # irsx-shaped schedules of synthetic filings, with parts and groups PARTS keeps and drops and values each cleaning rule has to handle
+        self.filings = load("schedules.json")
+        # what get_xml_parts followed by clean_xml made of the same filings before PARTS
+        self.expected = load("xml_parts.json")
+
+    def test_parity(self):
+        for schedules, expected in zip(self.filings, self.expected):
+            xml = utilities.get_xml_parts(schedules)
+            # compare the dumps, so key order and NaN amounts are checked too
+            self.assertEqual(json.dumps(xml), json.dumps(expected))
+
+    def test_schedules_not_changed(self):
+        filings = copy.deepcopy(self.filings)
+        for schedules in filings:
+            utilities.get_xml_parts(schedules)
+        self.assertEqual(json.dumps(filings), json.dumps(self.filings))
+
+    def test_clean(self):
+        self.assertEqual(utilities.clean({
+            "TotalAmt": "12",
+            "BadAmt": "N/A",
+            "AvgHrsPerWkRt": "40.00",
+            "PeriodBeginDt": "2021-01-01",
+            "BadDt": "01/01/2021",
+            "SupplementalInfoDtl": {"PaidAmt": "1"},
+            "PaidDtAmt": "2021-07-04",
+            "ItemsGrp": [{"OtherAmt": None}]
+        }), {
+            "TotalAmt": 12.0,
+            "BadAmt": "N/A",
+            "AvgHrsPerWkRt": 40.0,
+            "PeriodBeginDt": "2021-01-01T00:00:00-0500",
+            "BadDt": "01/01/2021",
+            "SupplementalInfoDtl": {"PaidAmt": 1.0},
+            "PaidDtAmt": "2021-07-04T00:00:00-0400",
+            "ItemsGrp": [{"OtherAmt": None}]
+        })
+
+if __name__ == "__main__":
+    unittest.main()
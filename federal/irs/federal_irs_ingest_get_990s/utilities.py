@@ -1,199 +1,139 @@
-import datetime
-import pytz
-
+import functools
+
+import dates
+
+# parts and groups kept from each schedule, everything else in a filing is dropped
+# the sections are kept in the order given here, even when a filing has none of their parts
+PARTS = {
+    'ReturnHeader990x': {
+        'schedule_parts': [
+            'returnheader990x_part_i', # filing info
+        ],
+    },
+    'IRS990': {
+        'groups': [
+            'PrgSrvcAccmActyOthr', # activities
+            'Frm990PrtVIISctnA', # people
+            'CntrctrCmpnstn',
+        ],
+        'schedule_parts': [
+            'part_0', # org summary
+            'part_i',
+            'part_iii', # activities
+        ],
+    },
+    'IRS990ScheduleC': {
+        'groups': [
+            'SkdCSctn527PltclOrg', # political contributions
+            'SkdCSpplmntlInfrmtnDtl', # description of activities
+        ],
+        'schedule_parts': [
+            'skedc_part_0', # political expenditures
+            'skedc_part_iia',
+            'skedc_part_iib',
+        ],
+    },
+    'IRS990ScheduleF': {
+        'groups': [
+            'SkdFGrntsTOrgOtsdUS', # grants outside US
+            'SkdFFrgnIndvdlsGrnts',
+        ],
+    },
+    'IRS990ScheduleI': {
+        'groups': [
+            'SkdIRcpntTbl', # grants
+            'SkdIGrntsOthrAsstTIndvInUS',
+        ],
+    },
+    'IRS990ScheduleR': {
+        'groups': [
+            'SkdRIdDsrgrddEntts', # related entities
+            'SkdRIdRltdTxExmptOrg',
+            'SkdRIdRltdOrgTxblPrtnrshp',
+            'SkdRIdRltdOrgTxblCrpTr',
+            'SkdRTrnsctnsRltdOrg',
+            'SkdRUnrltdOrgTxblPrtnrshp',
+        ],
+    },
+    'IRS990EZ': {
+        'groups': [
+            'EZPrgrmSrvcAccmplshmnt', # activities
+            'EZOffcrDrctrTrstEmpl', # people
+            'EZCmpnstnHghstPdEmpl',
+            'EZCmpnstnOfHghstPdCntrct',
+        ],
+        'schedule_parts': [
+            'ez_part_0', # org summary
+            'ez_part_i',
+            'ez_part_iii', # activities
+        ],
+    },
+    'IRS990PF': {
+        'groups': [
+            'PFOffcrDrTrstKyEmpl', # people
+            'PFCmpnstnHghstPdEmpl',
+            'PFCmpnstnOfHghstPdCntrct',
+            'PFGrntOrCntrApprvFrFt', # grants
+            'PFGrntOrCntrbtnPdDrYr',
+            'PFRltnshpSkdDtl', # transfers
+            'PFTrnsfrSkdDtl',
+        ],
+        'schedule_parts': [
+            'pf_part_0', # org summary
+            'pf_part_i',
+            'pf_part_viia', # activities
+            'pf_part_ixa',
+        ],
+    },
+}
+
+# PARTS compiled into a tuple of (section, names) pairs per schedule
+projections = {schedule_name: tuple((section, tuple(names)) for section, names in sections.items()) for schedule_name, sections in PARTS.items()}
+
+# helper function to tell whether the values of a key are numbers, dates or neither
+@functools.lru_cache(maxsize=None)
+def get_kind(key):
+    return ("Amt" in key or "Hrs" in key, "Dt" in key)
+
+# helper function to copy a value, turning amounts and hours into numbers and dates into Eastern time
+def clean(value):
+    if isinstance(value, dict):
+        cleaned = {}
+        for k, v in value.items():
+            if isinstance(v, (dict, list)):
+                cleaned[k] = clean(v)
+                continue
+            number, date = get_kind(k)
+            if number:
+                try:
+                    v = float(v)
+                except (TypeError, ValueError):
+                    pass
+            if date and isinstance(v, str):
+                try:
+                    v = dates.normalize_iso_date(v)
+                except ValueError:
+                    pass
+            cleaned[k] = v
+        return cleaned
+    if isinstance(value, list):
+        return [clean(i) for i in value]
+    return value
+
+# project the schedules of a filing onto PARTS and clean what is kept, in a single pass
 def get_xml_parts(schedules):
 
     xml = {}
     for schedule in schedules:
 
-        schedule_name = schedule.pop('schedule_name')
-
-        if schedule_name == 'ReturnHeader990x':
-
-            xml[schedule_name] = {
-                'schedule_parts': {}
-            }
-
-            # filing info
-            if 'returnheader990x_part_i' in schedule['schedule_parts']:
-                xml[schedule_name]['schedule_parts']['returnheader990x_part_i'] = schedule['schedule_parts']['returnheader990x_part_i']
-
-        elif schedule_name == 'IRS990':
-
-            xml[schedule_name] = {
-                'groups': {},
-                'schedule_parts': {}
-            }
-
-            # org summary
-            if 'part_0' in schedule['schedule_parts']:
-                xml[schedule_name]['schedule_parts']['part_0'] = schedule['schedule_parts']['part_0']
-            if 'part_i' in schedule['schedule_parts']:
-                xml[schedule_name]['schedule_parts']['part_i'] = schedule['schedule_parts']['part_i']
-
-            # activities
-            if 'part_iii' in schedule['schedule_parts']:
-                xml[schedule_name]['schedule_parts']['part_iii'] = schedule['schedule_parts']['part_iii']
-            if 'PrgSrvcAccmActyOthr' in schedule['groups']:
-                xml[schedule_name]['groups']['PrgSrvcAccmActyOthr'] = schedule['groups']['PrgSrvcAccmActyOthr']
-
-            # people
-            if 'Frm990PrtVIISctnA' in schedule['groups']:
-                xml[schedule_name]['groups']['Frm990PrtVIISctnA'] = schedule['groups']['Frm990PrtVIISctnA']
-            if 'CntrctrCmpnstn' in schedule['groups']:
-                xml[schedule_name]['groups']['CntrctrCmpnstn'] = schedule['groups']['CntrctrCmpnstn']
-
-        elif schedule_name == 'IRS990ScheduleC':
-
-            xml[schedule_name] = {
-                'groups': {},
-                'schedule_parts': {}
-            }
-
-            # political expenditures
-            if 'skedc_part_0' in schedule['schedule_parts']:
-                xml[schedule_name]['schedule_parts']['skedc_part_0'] = schedule['schedule_parts']['skedc_part_0']
-            if 'skedc_part_iia' in schedule['schedule_parts']:
-                xml[schedule_name]['schedule_parts']['skedc_part_iia'] = schedule['schedule_parts']['skedc_part_iia']
-            if 'skedc_part_iib' in schedule['schedule_parts']:
-                xml[schedule_name]['schedule_parts']['skedc_part_iib'] = schedule['schedule_parts']['skedc_part_iib']
-
-            # political contributions
-            if 'SkdCSctn527PltclOrg' in schedule['groups']:
-                xml[schedule_name]['groups']['SkdCSctn527PltclOrg'] = schedule['groups']['SkdCSctn527PltclOrg']
-
-            # description of activities
-            if 'SkdCSpplmntlInfrmtnDtl' in schedule['groups']:
-                xml[schedule_name]['groups']['SkdCSpplmntlInfrmtnDtl'] = schedule['groups']['SkdCSpplmntlInfrmtnDtl']
-
-        elif schedule_name == 'IRS990ScheduleF':
-
-            xml[schedule_name] = {
-                'groups': {}
-            }
-
-            # grants outside US
-            if 'SkdFGrntsTOrgOtsdUS' in schedule['groups']:
-                xml[schedule_name]['groups']['SkdFGrntsTOrgOtsdUS'] = schedule['groups']['SkdFGrntsTOrgOtsdUS']
-            if 'SkdFFrgnIndvdlsGrnts' in schedule['groups']:
-                xml[schedule_name]['groups']['SkdFFrgnIndvdlsGrnts'] = schedule['groups']['SkdFFrgnIndvdlsGrnts']
-
-        elif schedule_name == 'IRS990ScheduleI':
+        schedule_name = schedule['schedule_name']
+        projection = projections.get(schedule_name)
+        if projection is None:
+            continue
 
-            xml[schedule_name] = {
-                'groups': {}
-            }
-
-            # grants
-            if 'SkdIRcpntTbl' in schedule['groups']:
-                xml[schedule_name]['groups']['SkdIRcpntTbl'] = schedule['groups']['SkdIRcpntTbl']
-            if 'SkdIGrntsOthrAsstTIndvInUS' in schedule['groups']:
-                xml[schedule_name]['groups']['SkdIGrntsOthrAsstTIndvInUS'] = schedule['groups']['SkdIGrntsOthrAsstTIndvInUS']
-
-        elif schedule_name == 'IRS990ScheduleR':
-
-            xml[schedule_name] = {
-                'groups': {}
-            }
-
-            # related entities
-            if 'SkdRIdDsrgrddEntts' in schedule['groups']:
-                xml[schedule_name]['groups']['SkdRIdDsrgrddEntts'] = schedule['groups']['SkdRIdDsrgrddEntts']
-            if 'SkdRIdRltdTxExmptOrg' in schedule['groups']:
-                xml[schedule_name]['groups']['SkdRIdRltdTxExmptOrg'] = schedule['groups']['SkdRIdRltdTxExmptOrg']
-            if 'SkdRIdRltdOrgTxblPrtnrshp' in schedule['groups']:
-                xml[schedule_name]['groups']['SkdRIdRltdOrgTxblPrtnrshp'] = schedule['groups']['SkdRIdRltdOrgTxblPrtnrshp']
-            if 'SkdRIdRltdOrgTxblCrpTr' in schedule['groups']:
-                xml[schedule_name]['groups']['SkdRIdRltdOrgTxblCrpTr'] = schedule['groups']['SkdRIdRltdOrgTxblCrpTr']
-            if 'SkdRTrnsctnsRltdOrg' in schedule['groups']:
-                xml[schedule_name]['groups']['SkdRTrnsctnsRltdOrg'] = schedule['groups']['SkdRTrnsctnsRltdOrg']
-            if 'SkdRUnrltdOrgTxblPrtnrshp' in schedule['groups']:
-                xml[schedule_name]['groups']['SkdRUnrltdOrgTxblPrtnrshp'] = schedule['groups']['SkdRUnrltdOrgTxblPrtnrshp']
-
-        elif schedule_name == 'IRS990EZ':
-
-            xml[schedule_name] = {
-                'groups': {},
-                'schedule_parts': {}
-            }
-
-            # org summary
-            if 'ez_part_0' in schedule['schedule_parts']:
-                xml[schedule_name]['schedule_parts']['ez_part_0'] = schedule['schedule_parts']['ez_part_0']
-            if 'ez_part_i' in schedule['schedule_parts']:
-                xml[schedule_name]['schedule_parts']['ez_part_i'] = schedule['schedule_parts']['ez_part_i']
-
-            # activities
-            if 'ez_part_iii' in schedule['schedule_parts']:
-                xml[schedule_name]['schedule_parts']['ez_part_iii'] = schedule['schedule_parts']['ez_part_iii']
-            if 'EZPrgrmSrvcAccmplshmnt' in schedule['groups']:
-                xml[schedule_name]['groups']['EZPrgrmSrvcAccmplshmnt'] = schedule['groups']['EZPrgrmSrvcAccmplshmnt']
-
-            # people
-            if 'EZOffcrDrctrTrstEmpl' in schedule['groups']:
-                xml[schedule_name]['groups']['EZOffcrDrctrTrstEmpl'] = schedule['groups']['EZOffcrDrctrTrstEmpl']
-            if 'EZCmpnstnHghstPdEmpl' in schedule['groups']:
-                xml[schedule_name]['groups']['EZCmpnstnHghstPdEmpl'] = schedule['groups']['EZCmpnstnHghstPdEmpl']
-            if 'EZCmpnstnOfHghstPdCntrct' in schedule['groups']:
-                xml[schedule_name]['groups']['EZCmpnstnOfHghstPdCntrct'] = schedule['groups']['EZCmpnstnOfHghstPdCntrct']
-
-        elif schedule_name == 'IRS990PF':
-
-            xml[schedule_name] = {
-                'groups': {},
-                'schedule_parts': {}
-            }
-
-            # org summary
-            if 'pf_part_0' in schedule['schedule_parts']:
-                xml[schedule_name]['schedule_parts']['pf_part_0'] = schedule['schedule_parts']['pf_part_0']
-            if 'pf_part_i' in schedule['schedule_parts']:
-                xml[schedule_name]['schedule_parts']['pf_part_i'] = schedule['schedule_parts']['pf_part_i']
-
-            # activities
-            if 'pf_part_viia' in schedule['schedule_parts']:
-                xml[schedule_name]['schedule_parts']['pf_part_viia'] = schedule['schedule_parts']['pf_part_viia']
-            if 'pf_part_ixa' in schedule['schedule_parts']:
-                xml[schedule_name]['schedule_parts']['pf_part_ixa'] = schedule['schedule_parts']['pf_part_ixa']
-
-            # people
-            if 'PFOffcrDrTrstKyEmpl' in schedule['groups']:
-                xml[schedule_name]['groups']['PFOffcrDrTrstKyEmpl'] = schedule['groups']['PFOffcrDrTrstKyEmpl']
-            if 'PFCmpnstnHghstPdEmpl' in schedule['groups']:
-                xml[schedule_name]['groups']['PFCmpnstnHghstPdEmpl'] = schedule['groups']['PFCmpnstnHghstPdEmpl']
-            if 'PFCmpnstnOfHghstPdCntrct' in schedule['groups']:
-                xml[schedule_name]['groups']['PFCmpnstnOfHghstPdCntrct'] = schedule['groups']['PFCmpnstnOfHghstPdCntrct']
-
-            # grants
-            if 'PFGrntOrCntrApprvFrFt' in schedule['groups']:
-                xml[schedule_name]['groups']['PFGrntOrCntrApprvFrFt'] = schedule['groups']['PFGrntOrCntrApprvFrFt']
-            if 'PFGrntOrCntrbtnPdDrYr' in schedule['groups']:
-                xml[schedule_name]['groups']['PFGrntOrCntrbtnPdDrYr'] = schedule['groups']['PFGrntOrCntrbtnPdDrYr']
-
-            # transfers
-            if 'PFRltnshpSkdDtl' in schedule['groups']:
-                xml[schedule_name]['groups']['PFRltnshpSkdDtl'] = schedule['groups']['PFRltnshpSkdDtl']
-            if 'PFTrnsfrSkdDtl' in schedule['groups']:
-                xml[schedule_name]['groups']['PFTrnsfrSkdDtl'] = schedule['groups']['PFTrnsfrSkdDtl']
-
-    return xml
+        xml[schedule_name] = {}
+        for section, names in projection:
+            values = schedule[section]
+            xml[schedule_name][section] = {name: clean(values[name]) for name in names if name in values}
 
-def clean_xml(xml):
-    for k, v in xml.items():
-        if isinstance(v, dict):
-            xml[k] = clean_xml(v)
-        if isinstance(v, list):
-            xml[k] = [clean_xml(i) for i in v]
-        if "Amt" in k or "Hrs" in k:
-            try:
-                xml[k] = float(v)
-            except:
-                pass
-        if "Dt" in k:
-            try:
-                xml[k] = datetime.datetime.strptime(xml[k], '%Y-%m-%d')
-                xml[k] = pytz.timezone('US/Eastern').localize(xml[k])
-                xml[k] = xml[k].strftime("%Y-%m-%dT%H:%M:%S%z")
-            except:
-                pass
     return xml
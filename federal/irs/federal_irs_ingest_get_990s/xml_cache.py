@@ -0,0 +1,120 @@
+import os
+import gzip
+import uuid
+import hashlib
+import logging
+
+import requests
+from irsx.file_utils import get_s3_URL, get_local_path
+
+logger = logging.getLogger(__name__)
+
+# gzipped on-disk cache of raw 990 xml, keyed by object id
+# filings never change once they are published, so an object id always points to the same content
+# entries are spread over subdirectories by the hash of their object id, and the least recently used are evicted once the cache is over its size
+class XMLCache:
+
+    def __init__(self, directory, max_bytes=10*1024*1024*1024, check_bytes=64*1024*1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.check_bytes = check_bytes
+        self.written = 0
+        os.makedirs(directory, exist_ok=True)
+
+    # helper function to get the path of an entry
+    def get_path(self, object_id):
+        shard = hashlib.sha1(object_id.encode()).hexdigest()[:2]
+        return os.path.join(self.directory, shard, object_id + ".xml.gz")
+
+    # get the raw xml of a filing, or None if it is not cached
+    def get(self, object_id):
+        path = self.get_path(object_id)
+        try:
+            with gzip.open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        os.utime(path)
+        return data
+
+    # add the raw xml of a filing, writing it to a temporary file first so readers never see half an entry
+    def put(self, object_id, data):
+        path = self.get_path(object_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + "." + uuid.uuid4().hex + ".tmp"
+        with gzip.open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        self.written += os.path.getsize(path)
+        if self.written >= self.check_bytes:
+            self.evict()
+            self.written = 0
+
+    # list the object ids in the cache
+    def list(self):
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".xml.gz"):
+                    yield entry.name[:-len(".xml.gz")]
+
+    # remove the least recently used entries until the cache is back under its size
+    def evict(self):
+        entries = []
+        total = 0
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        if total <= self.max_bytes:
+            return 0
+        evicted = 0
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        logger.info(' - '.join(['INFO', 'xml cache evicted', str(evicted) + ' filings']))
+        return evicted
+
+    # get the raw xml of a filing, downloading it into the cache if it is not there yet, or None if it cannot be downloaded
+    def fetch(self, object_id, session=requests):
+        data = self.get(object_id)
+        if data is not None:
+            return data
+        r = session.get(get_s3_URL(object_id), timeout=30)
+        if r.status_code != 200:
+            return None
+        self.put(object_id, r.content)
+        return r.content
+
+# get the cache configured by IRS_XML_CACHE_PATH and IRS_XML_CACHE_BYTES, or None if there is none
+def from_env():
+    directory = os.environ.get("IRS_XML_CACHE_PATH")
+    if directory is None:
+        return None
+    return XMLCache(directory, max_bytes=int(os.environ.get("IRS_XML_CACHE_BYTES", 10*1024*1024*1024)))
+
+# run a filing through an XMLRunner from the cache, putting the xml where irsx looks for it and removing it afterwards
+def run_filing(cache, xml_runner, object_id, download=True):
+    data = cache.fetch(object_id) if download else cache.get(object_id)
+    if data is None:
+        raise RuntimeError("filing not available " + object_id)
+    path = get_local_path(object_id)
+    with open(path, "wb") as f:
+        f.write(data)
+    try:
+        return xml_runner.run_filing(object_id)
+    finally:
+        os.remove(path)
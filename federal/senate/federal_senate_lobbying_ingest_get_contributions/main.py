@@ -4,9 +4,10 @@ import logging
 
 import requests
 from google.cloud import secretmanager
-from elasticsearch import Elasticsearch, helpers
-import pytz
+from elasticsearch import Elasticsearch
 import datetime
+import bulk
+import dates
 
 # format logs
 formatter = '%(asctime)s - %(levelname)s - %(message)s'
@@ -66,9 +67,7 @@ def loop(headers, url):
             for c in filing.get("contribution_items"):
                 dt = c.get("date")
                 if dt is not None:
-                    dt = datetime.datetime.strptime(dt, '%Y-%m-%d')
-                    dt = pytz.timezone('US/Eastern').localize(dt)
-                    dt = dt.strftime("%Y-%m-%dT%H:%M:%S%z")
+                    dt = dates.normalize_iso_date(dt)
                 contributions.append({
                     "lobbyist": processed.get("lobbyist"),
                     "contribution_type": c.get("contribution_type_display"),
@@ -114,7 +113,7 @@ def loop(headers, url):
                         "_source": record
                     })
 
-    helpers.bulk(es, actions)
+    bulk.write(es, actions)
     return r.json().get('next')
 
 # indexes Senate lobbying contributions into ElasticSearch
@@ -0,0 +1,129 @@
+import time
+import random
+import logging
+import threading
+import collections
+import concurrent.futures
+import email.utils
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# status codes worth retrying
+retry_status_codes = (429, 500, 502, 503, 504)
+
+# token bucket that lets requests through at a steady rate, with short bursts up to its capacity
+class TokenBucket:
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    # block until a token is available and take it
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+# helper function to read a Retry-After header as seconds to wait, whether it is given in seconds or as an http date, or None if it is missing or unreadable
+def parse_retry_after(retry_after, now=None):
+    if retry_after is None:
+        return None
+    try:
+        return max(0., float(retry_after))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    now = time.time() if now is None else now
+    return max(0., date.timestamp() - now)
+
+# helper function to get how long to wait before a retry, going by the Retry-After header if there is one and a jittered exponential backoff otherwise
+def get_delay(attempt, retry_after, initial_backoff=2, max_backoff=60):
+    delay = parse_retry_after(retry_after)
+    if delay is not None:
+        return min(max_backoff, delay)
+    return min(max_backoff, initial_backoff * 2 ** attempt) * random.uniform(0.5, 1)
+
+# helper function to get one page of an api, waiting for the rate limit, or None if the page does not exist
+# throttled and failed requests, and requests that could not connect, are retried after their Retry-After header or a bounded exponential backoff
+# once the stop event is set, no more requests are made and a wait for a retry is cut short
+def get_page(session, url, params, bucket, timeout=30, max_retries=5, initial_backoff=2, max_backoff=60, stop=None):
+    stop = threading.Event() if stop is None else stop
+    for attempt in range(max_retries + 1):
+        bucket.acquire()
+        if stop.is_set():
+            raise RuntimeError(' - '.join(['api request stopped', url, str(params.get("page"))]))
+        retry_after = None
+        try:
+            r = session.get(url, params=params, timeout=timeout)
+        except requests.exceptions.RequestException as e:
+            error = type(e).__name__
+        else:
+            if r.status_code == 404:
+                return None
+            if r.status_code not in retry_status_codes:
+                r.raise_for_status()
+                return r.json()
+            error = str(r.status_code)
+            retry_after = r.headers.get("Retry-After")
+        if attempt == max_retries:
+            break
+        delay = get_delay(attempt, retry_after, initial_backoff, max_backoff)
+        logger.warning(' - '.join(['WARNING', 'api request failed', url, str(params.get("page")), error, 'retrying in ' + str(round(delay, 1)) + 's']))
+        if stop.wait(delay):
+            raise RuntimeError(' - '.join(['api request stopped', url, str(params.get("page"))]))
+    raise RuntimeError(' - '.join(['api request failed', url, str(params.get("page")), error]))
+
+# stream numbered pages of an api in order as (page, data) pairs, fetching up to prefetch pages ahead of the reader
+# stops after the last page, the one without a next link
+# when the reader stops early or a page fails, the pages still being fetched are stopped too, so no thread keeps retrying in the background
+def fetch_pages(session, url, params, start, bucket, prefetch=4):
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=prefetch)
+    stop = threading.Event()
+    pending = collections.deque()
+    next_page = start
+
+    # helper function to request the next page in the background
+    def submit():
+        nonlocal next_page
+        pending.append((next_page, executor.submit(get_page, session, url, dict(params, page=next_page), bucket, stop=stop)))
+        next_page += 1
+
+    try:
+        for i in range(prefetch):
+            submit()
+        while len(pending) > 0:
+            page, future = pending.popleft()
+            data = future.result()
+            if data is None:
+                return
+            yield page, data
+            if data.get("next") is None:
+                return
+            submit()
+    finally:
+        stop.set()
+        for page, future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+# helper function to open a keep-alive session with the headers sent on every request
+def get_session(headers):
+    session = requests.Session()
+    session.headers.update(headers)
+    return session
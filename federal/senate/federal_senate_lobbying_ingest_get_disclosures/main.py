@@ -2,10 +2,12 @@ import time
 import datetime
 import logging
 
-import requests
+from google.cloud import firestore
 from google.cloud import secretmanager
-from elasticsearch import Elasticsearch, helpers
+from elasticsearch import Elasticsearch
 import datetime
+import bulk
+import fetcher
 
 # format logs
 formatter = '%(asctime)s - %(levelname)s - %(message)s'
@@ -21,15 +23,32 @@ federal_senate_lobbying_api_key = secrets.access_secret_version(request={"name":
 
 # connect to resources
 es = Elasticsearch(elastic_host, http_auth=(elastic_username_data, elastic_password_data), scheme="https", port=443)
+db = firestore.Client()
 
 # other settings
 index = 'federal_senate_lobbying_disclosures'
 
-# helper loop
-def loop(headers, url):
+# number of filings on each page, the largest page the API allows
+page_size = 25
+
+# number of pages requested ahead of the one being indexed
+prefetch_pages = 4
+
+# rate limit of the API for authenticated requests
+requests_per_minute = 120
+
+# helper function to get the keys of a page of filings that are already indexed, with one lookup for the whole page
+def get_indexed_keys(keys):
+    if len(keys) == 0:
+        return set()
+    response = es.mget(index=index, body={"ids": keys}, _source=False)
+    return set([doc["_id"] for doc in response["docs"] if doc.get("found")])
+
+# helper function to index a page of filings
+def index_page(filings):
     actions = []
-    r = requests.get(url, headers=headers)
-    for filing in r.json()['results']:
+    indexed = get_indexed_keys([filing.get('filing_uuid') for filing in filings])
+    for filing in filings:
         key = filing.get('filing_uuid')
         processed = {
             "date_submitted": filing.get("dt_posted"),
@@ -78,7 +97,7 @@ def loop(headers, url):
                         activities.append(row)
         if len(activities) > 0:
             processed["activities"] = activities
-        if es.exists(index=index, id=key) is False:
+        if key not in indexed:
             actions.append({
                 "_op_type": "index",
                 "_index": index,
@@ -110,26 +129,38 @@ def loop(headers, url):
                         "_source": record
                     })
 
-    helpers.bulk(es, actions)
-    return r.json().get('next')
+    bulk.write(es, actions)
+    return len(actions)
 
 # indexes Senate lobbying disclosures into ElasticSearch
 def federal_senate_lobbying_ingest_get_disclosures(message, context):
-    es.indices.refresh()
-    last_saved_count = int(es.cat.count(index, params={"format": "json"})[0]['count'])
-    next_page = None
-    start_time = time.time()
-    last_saved_page_number = int(last_saved_count / 25)
-    if last_saved_page_number == 0:
-        last_saved_page_number = 1  # start with page 1 for the first time
-    next_page_url = f'https://lda.senate.gov/api/v1/filings/?page_size=25&page={last_saved_page_number}'  # repeat in case the page has new items
-    headers = {
+
+    # get the page to resume from, falling back to the number of indexed filings the first time
+    ref = db.collection('federal').document('senate').collection('lobbying').document('disclosures')
+    settings = ref.get().to_dict() or dict()
+    page = settings.get('page')
+    if page is None:
+        es.indices.refresh()
+        last_saved_count = int(es.cat.count(index, params={"format": "json"})[0]['count'])
+        page = max(1, int(last_saved_count / page_size))
+
+    # walk the pages from the saved one, repeating it in case it has new items
+    session = fetcher.get_session({
         "Authorization": "Token " + federal_senate_lobbying_api_key
-    }
-    while time.time() - start_time < 520:
-        next_page_url = loop(headers, next_page_url)
-        if next_page_url is None:
-            logger.info('FINISHED WITH LAST PAGE')
+    })
+    bucket = fetcher.TokenBucket(requests_per_minute / 60, prefetch_pages)
+    start_time = time.time()
+    finished = True
+    for page, data in fetcher.fetch_pages(session, 'https://lda.senate.gov/api/v1/filings/', {"page_size": page_size}, page, bucket, prefetch=prefetch_pages):
+        count = index_page(data['results'])
+        ref.set({
+            'page': page,
+            'last_updated': datetime.datetime.now(datetime.timezone.utc)
+        }, merge=True)
+        logger.info(' - '.join(['PAGE INDEXED', str(page), str(count) + ' docs']))
+        if time.time() - start_time > 520:
+            finished = False
             break
-        time.sleep(0.2)
+    if finished:
+        logger.info('FINISHED WITH LAST PAGE')
     return True
@@ -0,0 +1,144 @@
+import json
+import time
+import socket
+import email.utils
+import threading
+import unittest
+import http.server
+import urllib.parse
+
+import fetcher
+
+# stub of the api that plays back a list of (status, headers, body) responses for each page and records the pages asked for
+# the last response of a page is repeated, and pages without responses are missing
+class StubHandler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        page = int(urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)["page"][0])
+        with self.server.lock:
+            self.server.requests.append(page)
+            responses = self.server.responses.get(page, [(404, {}, {})])
+            status, headers, body = responses.pop(0) if len(responses) > 1 else responses[0]
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(json.dumps(body).encode())
+
+    def log_message(self, *args):
+        pass
+
+# helper function to get the body of a page, with a next link unless it is the last page
+def make_page(page, last):
+    return {"results": [page], "next": None if page == last else "page=" + str(page + 1)}
+
+class TestFetcher(unittest.TestCase):
+
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.responses = dict()
+        threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True).start()
+        self.url = "http://127.0.0.1:%d/filings/" % self.server.server_address[1]
+        self.session = fetcher.get_session({})
+        self.bucket = fetcher.TokenBucket(1000, 100)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_parse_retry_after(self):
+        now = time.time()
+        self.assertEqual(fetcher.parse_retry_after("7"), 7)
+        self.assertAlmostEqual(fetcher.parse_retry_after(email.utils.formatdate(now + 30, usegmt=True), now=now), 30, delta=1)
+        self.assertEqual(fetcher.parse_retry_after(email.utils.formatdate(now - 30, usegmt=True), now=now), 0)
+        self.assertIsNone(fetcher.parse_retry_after("soon"))
+        self.assertIsNone(fetcher.parse_retry_after(None))
+
+    def test_get_delay(self):
+        self.assertEqual(fetcher.get_delay(0, "3"), 3)
+        self.assertEqual(fetcher.get_delay(0, "600", max_backoff=60), 60)
+        for attempt in range(8):
+            delay = fetcher.get_delay(attempt, None, initial_backoff=2, max_backoff=60)
+            self.assertGreaterEqual(delay, min(60, 2 * 2 ** attempt) / 2)
+            self.assertLessEqual(delay, min(60, 2 * 2 ** attempt))
+
+    def test_retry_after_http_date(self):
+        self.server.responses[1] = [(429, {"Retry-After": email.utils.formatdate(time.time(), usegmt=True)}, {}), (200, {}, make_page(1, 1))]
+        self.assertEqual(fetcher.get_page(self.session, self.url, {"page": 1}, self.bucket), make_page(1, 1))
+        self.assertEqual(self.server.requests, [1, 1])
+
+    def test_retry_server_errors(self):
+        self.server.responses[1] = [(503, {}, {}), (500, {}, {}), (200, {}, make_page(1, 1))]
+        self.assertEqual(fetcher.get_page(self.session, self.url, {"page": 1}, self.bucket, initial_backoff=0.01), make_page(1, 1))
+        self.assertEqual(self.server.requests, [1, 1, 1])
+
+    def test_give_up(self):
+        self.server.responses[1] = [(502, {}, {})]
+        with self.assertRaises(RuntimeError):
+            fetcher.get_page(self.session, self.url, {"page": 1}, self.bucket, max_retries=2, initial_backoff=0.01)
+        self.assertEqual(self.server.requests, [1, 1, 1])
+
+    def test_connection_error(self):
+        closed = socket.socket()
+        closed.bind(("127.0.0.1", 0))
+        url = "http://127.0.0.1:%d/filings/" % closed.getsockname()[1]
+        closed.close()
+        with self.assertRaises(RuntimeError):
+            fetcher.get_page(self.session, url, {"page": 1}, self.bucket, max_retries=1, initial_backoff=0.01)
+
+    def test_client_error(self):
+        self.server.responses[1] = [(401, {}, {})]
+        with self.assertRaises(fetcher.requests.exceptions.HTTPError):
+            fetcher.get_page(self.session, self.url, {"page": 1}, self.bucket)
+        self.assertEqual(self.server.requests, [1])
+
+    def test_missing_page(self):
+        self.assertIsNone(fetcher.get_page(self.session, self.url, {"page": 1}, self.bucket))
+
+    def test_fetch_pages_in_order(self):
+        for page in range(3, 11):
+            self.server.responses[page] = [(200, {}, make_page(page, 10))]
+        self.server.responses[5] = [(503, {"Retry-After": "0"}, {}), (200, {}, make_page(5, 10))]
+        pages = [page for page, data in fetcher.fetch_pages(self.session, self.url, {}, 3, self.bucket, prefetch=4)]
+        self.assertEqual(pages, list(range(3, 11)))
+
+    # helper function to wait for the threads started since before to finish, returning the ones still running
+    # threads the stub starts to answer requests are left out
+    def wait_for_threads(self, before, timeout):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            threads = [thread for thread in threading.enumerate() if thread not in before and "process_request" not in thread.name]
+            if len(threads) == 0:
+                break
+            time.sleep(0.01)
+        return threads
+
+    def test_stop_when_the_reader_stops(self):
+        # pages after the first keep failing, so the threads fetching them are waiting to retry when the reader stops
+        self.server.responses[1] = [(200, {}, make_page(1, 10))]
+        for page in range(2, 11):
+            self.server.responses[page] = [(503, {"Retry-After": "0.5"}, {})]
+        before = set(threading.enumerate())
+        pages = fetcher.fetch_pages(self.session, self.url, {}, 1, self.bucket, prefetch=4)
+        self.assertEqual(next(pages)[0], 1)
+        time.sleep(0.2)
+        pages.close()
+        self.assertEqual(self.wait_for_threads(before, 0.3), [])
+        requests = len(self.server.requests)
+        time.sleep(1)
+        self.assertEqual(len(self.server.requests), requests)
+
+    def test_stop_when_a_page_fails(self):
+        self.server.responses[1] = [(401, {}, {})]
+        for page in range(2, 11):
+            self.server.responses[page] = [(503, {"Retry-After": "0.5"}, {})]
+        before = set(threading.enumerate())
+        with self.assertRaises(fetcher.requests.exceptions.HTTPError):
+            list(fetcher.fetch_pages(self.session, self.url, {}, 1, self.bucket, prefetch=4))
+        self.assertEqual(self.wait_for_threads(before, 0.3), [])
+
+if __name__ == "__main__":
+    unittest.main()
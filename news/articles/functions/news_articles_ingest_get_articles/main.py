@@ -4,12 +4,12 @@ from google.cloud import firestore
 from google.cloud import pubsub
 from elasticsearch import Elasticsearch
 import json
-from furl import furl
-import requests
 from newspaper import Article
 import datetime
 import time
 
+import urls
+
 # format logs
 formatter = '%(asctime)s - %(levelname)s - %(message)s'
 logging.basicConfig(format=formatter, level=logging.DEBUG)
@@ -50,33 +50,6 @@ def parse_proxy(url):
         return url.split('&url=',1)[1]
     return url
 
-# utility to unshorten url
-def unshorten_url(url):
-    if len(url) < 30:
-        try:
-            url = requests.head(url, allow_redirects=True, timeout=5).url
-        except:
-            pass
-    return url
-
-# utility function to strip URLs of the schema, parameters, and www
-def strip_url(url):
-    if "youtube.com/watch" in url:
-        f = furl(url)
-        try:
-            v = f.args['v']
-            url = f.remove(args=True, fragment=True).url
-            url = furl(url).add(args={'v':v}).url
-        except:
-            pass
-    else:
-        url = furl(url).remove(args=True, fragment=True).url
-    if '://www.' in url:
-        url = url.split('://www.',1)[1]
-    elif '://' in url:
-        url = url.split('://',1)[1]
-    return url
-
 # downloads 5 articles and sends to ElasticSearch if the article has not already been scraped
 # updates the Cloud Firestore list of scraped articles
 # calls self with remaining articles
@@ -108,14 +81,17 @@ def news_articles_ingest_get_articles(message, context):
         logger.error(' - '.join(['INVALID SCRAPER', scraper]))
         return False
 
+    # resolve the shortened links of the articles at once
+    unshortened = urls.unshorten_urls(articles)
+
     loop = 0
     for url in articles:
         # throw out articles that are not actually from the domain
         if domain not in url:
             logger.error(' - '.join(['ARTICLE NOT IN DOMAIN', url, domain]))
             continue
-        url = unshorten_url(url)
-        stripped_url = strip_url(url)
+        url = unshortened[url]
+        stripped_url = urls.strip_url(url)
         # check that the article has not already been scraped or failed
         stored = stored_ref.where('url', '==', stripped_url).get()
         failed = failed_ref.where('url', '==', stripped_url).get()
@@ -4,12 +4,12 @@ from google.cloud import firestore
 from google.cloud import pubsub
 from elasticsearch import Elasticsearch
 import json
-from furl import furl
-import requests
 from newspaper import Article
 import datetime
 import time
 
+import urls
+
 # format logs
 formatter = '%(asctime)s - %(levelname)s - %(message)s'
 logging.basicConfig(format=formatter, level=logging.DEBUG)
@@ -48,39 +48,12 @@ def parse_proxy(url):
         return url.split('&url=',1)[1]
     return url
 
-# utility to unshorten url
-def unshorten_url(url):
-    if len(url) < 30:
-        try:
-            url = requests.head(url, allow_redirects=True, timeout=5).url
-        except:
-            pass
-    return url
-
-# utility function to strip URLs of the schema, parameters, and www
-def strip_url(url):
-    if "youtube.com/watch" in url:
-        f = furl(url)
-        try:
-            v = f.args['v']
-            url = f.remove(args=True, fragment=True).url
-            url = furl(url).add(args={'v':v}).url
-        except:
-            pass
-    else:
-        url = furl(url).remove(args=True, fragment=True).url
-    if '://www.' in url:
-        url = url.split('://www.',1)[1]
-    elif '://' in url:
-        url = url.split('://',1)[1]
-    return url
-
 # downloads a single article and sends to ElasticSearch if the article has not already been scraped
 def news_articles_ingest_get_url(message, context):
 
     # get the articles from the Pub/Sub message
     url = message['attributes']['url']
-    url = furl(url).remove(args=True, fragment=True).url
+    url = urls.remove_query(url)
 
     # set up Firestore refs
     stored_ref = db.collection('news').document('articles').collection('scraped')
@@ -89,8 +62,8 @@ def news_articles_ingest_get_url(message, context):
     articles = []
     articles.append(url)
     for url in articles:
-        url = unshorten_url(url)
-        stripped_url = strip_url(url)
+        url = urls.unshorten_url(url)
+        stripped_url = urls.strip_url(url)
         # check that the article has not already been scraped or failed
         stored = stored_ref.where('url', '==', stripped_url).get()
         failed = failed_ref.where('url', '==', stripped_url).get()
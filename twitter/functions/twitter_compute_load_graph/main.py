@@ -9,7 +9,8 @@ import datetime
 import pytz
 
 import cypher
-import utilities
+import urls
+import queues
 
 # format logs
 formatter = '%(asctime)s - %(levelname)s - %(message)s'
@@ -31,8 +32,17 @@ es = Elasticsearch(elastic_host, http_auth=(elastic_username_data, elastic_passw
 driver = GraphDatabase.driver(neo4j_connection, auth=(neo4j_username_data, neo4j_password_data))
 db = firestore.Client()
 
-# helper function to parse tweet
-def parse_tweet(obj):
+# helper function to get the links of a tweet that are not to Twitter
+def get_links(obj):
+    links = []
+    if obj['tweet'].get("entities") is not None:
+        for link in obj['tweet']['entities'].get("urls", []):
+            if 'twitter.com' not in link['expanded_url']:
+                links.append(link['expanded_url'])
+    return links
+
+# helper function to parse tweet, given a dict of where each of its links leads
+def parse_tweet(obj, unshortened):
     parsed = {
         "tweets": [],
         "tweeters": [],
@@ -93,14 +103,12 @@ def parse_tweet(obj):
                     "probability": annotation['probability']
                 })
         # make link objects
-        if "urls" in obj['tweet']['entities']:
-            for link in obj['tweet']['entities']['urls']:
-                if 'twitter.com' not in link['expanded_url']:
-                    clean_url = utilities.strip_url(link['expanded_url'])
-                    parsed["links"].append({
-                        "tweet_id": obj['tweet']['id'],
-                        "url": clean_url
-                    })
+        for link in get_links(obj):
+            clean_url = urls.strip_url(unshortened.get(link, link))
+            parsed["links"].append({
+                "tweet_id": obj['tweet']['id'],
+                "url": clean_url
+            })
     # return parsed tweet
     return parsed
 
@@ -112,6 +120,7 @@ def twitter_compute_load_graph(message, context):
 
     # set up Firestore ref for queue of tweets to load
     ref = db.collection('twitter').document('queues').collection('graph')
+    queue = queues.QueueWriter(db, ref)
 
     # get the optional search term, user_id, or tweet_ids from the Pub/Sub message
     if 'attributes' in message:
@@ -147,10 +156,22 @@ def twitter_compute_load_graph(message, context):
     quotes = []
     replies = []
     retweets = []
-    for doc in docs:
-        document = doc.to_dict()
+    docs = list(docs)
+    documents = [doc.to_dict() for doc in docs]
+
+    # resolve the links of every tweet at once rather than one at a time while parsing
+    links_to_resolve = []
+    for document in documents:
+        links_to_resolve.extend(get_links(document["obj"]))
+        for tw in ["quoted", "replied_to", "retweeted"]:
+            if tw in document["obj"] and "tweet" in document["obj"][tw]:
+                links_to_resolve.extend(get_links(document["obj"][tw]))
+    unshortened = urls.unshorten_urls(links_to_resolve)
+    logger.info(' - '.join(['INFO', 'unique links', str(len(unshortened))]))
+
+    for doc, document in zip(docs, documents):
         # parse the main tweet
-        parsed = parse_tweet(document["obj"])
+        parsed = parse_tweet(document["obj"], unshortened)
         tweets.extend(parsed["tweets"])
         tweeters.extend(parsed["tweeters"])
         hashtags.extend(parsed["hashtags"])
@@ -164,7 +185,7 @@ def twitter_compute_load_graph(message, context):
                     "tweet_id": document['obj']['tweet']['id'],
                     "quote_tweet_id": document['obj']['quoted']['tweet']['id']
                 })
-                parsed_quote = parse_tweet(document["obj"]["quoted"])
+                parsed_quote = parse_tweet(document["obj"]["quoted"], unshortened)
                 tweets.extend(parsed_quote["tweets"])
                 tweeters.extend(parsed_quote["tweeters"])
                 hashtags.extend(parsed_quote["hashtags"])
@@ -179,7 +200,7 @@ def twitter_compute_load_graph(message, context):
                     "tweet_id": document['obj']['tweet']['id'],
                     "reply_tweet_id": document['obj']['replied_to']['tweet']['id']
                 })
-                parsed_reply = parse_tweet(document["obj"]["replied_to"])
+                parsed_reply = parse_tweet(document["obj"]["replied_to"], unshortened)
                 tweets.extend(parsed_reply["tweets"])
                 tweeters.extend(parsed_reply["tweeters"])
                 hashtags.extend(parsed_reply["hashtags"])
@@ -194,7 +215,7 @@ def twitter_compute_load_graph(message, context):
                     "tweet_id": document['obj']['tweet']['id'],
                     "retweet_id": document['obj']['retweeted']['tweet']['id'],
                 })
-                parsed_retweet = parse_tweet(document["obj"]["retweeted"])
+                parsed_retweet = parse_tweet(document["obj"]["retweeted"], unshortened)
                 tweets.extend(parsed_retweet["tweets"])
                 tweeters.extend(parsed_retweet["tweeters"])
                 hashtags.extend(parsed_retweet["hashtags"])
@@ -230,7 +251,7 @@ def twitter_compute_load_graph(message, context):
     # add tweet_ids of tweets that need to be processed to queue
     ids = list(set(ids))
     for id in ids:
-        ref.document(id).set({"last_added": datetime.datetime.now(datetime.timezone.utc)})
+        queue.add(id)
 
     # if using a user_id, mark the user as having been graphed
     if user_id is not None:
@@ -254,10 +275,11 @@ def twitter_compute_load_graph(message, context):
         for action in actions:
             if action["_index"] == "twitter_tweets_new":
                 # remove processed tweets from queue
-                ref.document(action["_id"]).delete()
+                queue.delete(action["_id"])
     if tweet_ids is not None:
         for i in tweet_ids:
-            ref.document(i).delete()
+            queue.delete(i)
+    queue.flush()
 
     logger.info(' - '.join(['TWEETS PROCESSED', str(len([a for a in actions if a["_index"] == "twitter_tweets_new"])), str(len(ids))]))
     return len(actions)
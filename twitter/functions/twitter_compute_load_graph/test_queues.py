@@ -0,0 +1,120 @@
+import time
+import unittest
+
+import queues
+
+# in-memory stand-in for a Firestore client, which keeps documents in a dict and records every batch committed
+class FakeDB:
+
+    def __init__(self):
+        self.documents = dict()
+        self.commits = []
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def collection(self, name):
+        return FakeCollection(name)
+
+class FakeCollection:
+
+    def __init__(self, path):
+        self.path = path
+
+    def document(self, id):
+        return FakeDocument(self.path + "/" + id)
+
+class FakeDocument:
+
+    def __init__(self, path):
+        self.path = path
+
+# stand-in for a Firestore write batch, which refuses more than 500 writes like Firestore does
+class FakeBatch:
+
+    def __init__(self, db):
+        self.db = db
+        self.writes = []
+
+    def set(self, ref, data):
+        self.writes.append(("set", ref.path, data))
+
+    def delete(self, ref):
+        self.writes.append(("delete", ref.path, None))
+
+    def commit(self):
+        if len(self.writes) > 500:
+            raise ValueError("maximum 500 writes allowed per request")
+        for op, path, data in self.writes:
+            if op == "set":
+                self.db.documents[path] = data
+            else:
+                self.db.documents.pop(path, None)
+        self.db.commits.append(self.writes)
+
+class TestQueueWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.db = FakeDB()
+        self.ref = self.db.collection("queue")
+
+    def test_last_op_wins(self):
+        with queues.QueueWriter(self.db, self.ref) as queue:
+            queue.add(1)
+            queue.delete(1)
+            queue.delete(2)
+            queue.add(2)
+            queue.add(3)
+            queue.add(3)
+        self.assertEqual(len(self.db.commits), 1)
+        self.assertEqual([(op, path) for op, path, data in self.db.commits[0]], [("delete", "queue/1"), ("set", "queue/2"), ("set", "queue/3")])
+        self.assertEqual(sorted(self.db.documents), ["queue/2", "queue/3"])
+        self.assertIn("last_added", self.db.documents["queue/2"])
+
+    def test_split_at_max_batch_size(self):
+        with queues.QueueWriter(self.db, self.ref) as queue:
+            for id in range(1234):
+                queue.add(id)
+            self.assertEqual([len(writes) for writes in self.db.commits], [500, 500])
+        self.assertEqual([len(writes) for writes in self.db.commits], [500, 500, 234])
+        self.assertEqual(queue.committed, 1234)
+        self.assertEqual(len(self.db.documents), 1234)
+
+    def test_repeated_ids_do_not_fill_a_batch(self):
+        with queues.QueueWriter(self.db, self.ref) as queue:
+            for i in range(2000):
+                queue.add(i % 10)
+        self.assertEqual([len(writes) for writes in self.db.commits], [10])
+
+    def test_flush_on_exit(self):
+        with queues.QueueWriter(self.db, self.ref) as queue:
+            queue.add(1)
+            queue.delete(2)
+            self.assertEqual(self.db.commits, [])
+        self.assertEqual(len(self.db.commits), 1)
+        self.assertEqual(queue.committed, 2)
+
+    def test_flush_on_exit_after_error(self):
+        with self.assertRaises(RuntimeError):
+            with queues.QueueWriter(self.db, self.ref) as queue:
+                queue.add(1)
+                raise RuntimeError("failed while queueing")
+        self.assertEqual(list(self.db.documents), ["queue/1"])
+
+    def test_flush_after_max_delay(self):
+        with queues.QueueWriter(self.db, self.ref, max_delay=0.05) as queue:
+            queue.add(1)
+            time.sleep(0.1)
+            queue.add(2)
+            self.assertEqual([len(writes) for writes in self.db.commits], [2])
+            queue.add(3)
+        self.assertEqual([len(writes) for writes in self.db.commits], [2, 1])
+
+    def test_nothing_to_flush(self):
+        with queues.QueueWriter(self.db, self.ref) as queue:
+            pass
+        queue.flush()
+        self.assertEqual(self.db.commits, [])
+
+if __name__ == "__main__":
+    unittest.main()
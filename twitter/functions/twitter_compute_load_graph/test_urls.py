@@ -0,0 +1,31 @@
+import os
+import json
+import unittest
+
+import urls
+
+# urls and what strip_url gave for them when it was built on furl 2.1.4, recorded before furl was dropped
+fixture = os.path.join(os.path.dirname(os.path.abspath(__file__)), "testdata", "strip_url.json")
+
+class TestStripUrl(unittest.TestCase):
+
+    def test_matches_furl(self):
+        with open(fixture) as f:
+            recorded = json.load(f)
+        for url, expected in recorded:
+            self.assertEqual(urls.strip_url(url), expected, url)
+
+    def test_default_ports(self):
+        self.assertEqual(urls.strip_url("https://www.nytimes.com:443/x.html?smid=tw"), "nytimes.com/x.html")
+        self.assertEqual(urls.strip_url("http://www.nytimes.com:80/x.html"), "nytimes.com/x.html")
+        self.assertEqual(urls.strip_url("http://www.nytimes.com:443/x.html"), "nytimes.com:443/x.html")
+        self.assertEqual(urls.strip_url("https://example.com:08080/x"), "example.com:8080/x")
+
+    def test_youtube(self):
+        self.assertEqual(urls.strip_url("https://www.youtube.com/watch?v"), "youtube.com/watch?v")
+        self.assertEqual(urls.strip_url("https://www.youtube.com/watch?v="), "youtube.com/watch?v=")
+        self.assertEqual(urls.strip_url("https://www.youtube.com/watch?t=1&v=a%20b#t=10"), "youtube.com/watch?v=a+b")
+        self.assertEqual(urls.strip_url("https://www.youtube.com/watch?t=1"), "youtube.com/watch?t=1")
+
+if __name__ == "__main__":
+    unittest.main()
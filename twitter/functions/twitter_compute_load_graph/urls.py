@@ -0,0 +1,192 @@
+import os
+import re
+import time
+import sqlite3
+import tempfile
+import threading
+import concurrent.futures
+from urllib.parse import quote, quote_plus, unquote, unquote_plus
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# urls shorter than this are taken to be shortened links
+max_short_length = 30
+
+# seconds a resolved link is kept in the cache
+ttl = 30 * 24 * 60 * 60
+
+# number of links resolved at once
+workers = 16
+
+# characters left as they are in a path, on top of letters, digits and -._~
+pchar = "!$&'()*+,;=:@"
+
+# default ports of the schemes links use, which are left out of a url
+default_ports = {"http": 80, "https": 443, "ftp": 21}
+
+# urls with a lowercase scheme and host, no port and a path that needs no escaping, which are left as they are
+plain = re.compile(r"[a-z][a-z0-9+.\-]*://[a-z0-9.\-]+(?:/[A-Za-z0-9\-._~!$&'()*+,;=:@/]*)?")
+
+# an ascii character that is never left as it is in a path, or a percent sign that does not start an escape
+unescaped = re.compile(r"[\x00-\x20\"#<>?\[\\\]^`{|}\x7f]|%(?![0-9A-Fa-f]{2})")
+
+# helper function to escape a path segment, decoding escapes of characters that do not need them
+# a segment that is not already escaped is escaped as it is, percent signs and all
+def normalize_segment(segment):
+    if unescaped.search(segment) is not None:
+        return quote(segment, safe=pchar)
+    return quote(unquote(segment, errors="replace"), safe=pchar)
+
+# helper function to lowercase the host of a netloc and encode it with idna, leaving the user info as it is
+# a port is written as a number and left out if it is the default port of the scheme
+def normalize_netloc(netloc, scheme=None):
+    userinfo, at, hostport = netloc.rpartition("@")
+    if hostport.startswith("["):
+        host, bracket, port = hostport.partition("]")
+        host, port = host + bracket, port
+    else:
+        host, colon, port = hostport.partition(":")
+        port = colon + port
+    host = host.lower()
+    if not host.isascii():
+        try:
+            host = host.encode("idna").decode("ascii")
+        except UnicodeError:
+            pass
+    if port[1:].isdigit():
+        port = "" if int(port[1:]) == default_ports.get(scheme) else ":" + str(int(port[1:]))
+    return userinfo + at + host + port
+
+# remove the query and fragment of a url, writing what is left the same way furl does
+# most urls only need the query and fragment cut off, and the rest are taken apart with plain string operations
+def remove_query(url):
+    if "\t" in url or "\r" in url or "\n" in url:
+        url = url.replace("\t", "").replace("\r", "").replace("\n", "")
+    url = url.split("#", 1)[0].split("?", 1)[0]
+    if plain.fullmatch(url) is not None:
+        return url
+    prefix = ""
+    if "://" in url:
+        scheme, sep, url = url.partition("://")
+        netloc, slash, url = url.partition("/")
+        scheme = scheme.lower()
+        prefix = scheme + sep + normalize_netloc(netloc, scheme) + slash
+    elif url.startswith("//"):
+        netloc, slash, url = url[2:].partition("/")
+        prefix = "//" + normalize_netloc(netloc) + slash
+    return prefix + "/".join(normalize_segment(segment) for segment in url.split("/"))
+
+# helper function to get the first query argument of a url with a name, encoded on its own, or None if it is not there
+# an argument without a value is kept without one, so ?v stays ?v rather than becoming ?v=
+def get_arg(url, name):
+    query = url.split("#", 1)[0].partition("?")[2]
+    for pair in query.split("&"):
+        key, equals, value = pair.partition("=")
+        if unquote_plus(key) == name:
+            return quote_plus(name) + (equals + quote_plus(unquote_plus(value)) if equals else "")
+    return None
+
+# utility function to strip URLs of the schema, parameters, and www
+def strip_url(url):
+    if "youtube.com/watch" in url:
+        v = get_arg(url, "v")
+        if v is not None:
+            url = remove_query(url) + "?" + v
+    else:
+        url = remove_query(url)
+    if '://www.' in url:
+        url = url.split('://www.',1)[1]
+    elif '://' in url:
+        url = url.split('://',1)[1]
+    return url
+
+# cache of shortened links and the urls they resolve to, kept in sqlite so it outlasts an invocation on the same instance and a local run
+class ResolutionCache:
+
+    def __init__(self, path, ttl=ttl):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS resolutions (url TEXT PRIMARY KEY, resolved TEXT NOT NULL, expires REAL NOT NULL)")
+
+    # get the resolved urls of links that have not expired, keyed by link
+    def get_many(self, urls, now=None):
+        now = time.time() if now is None else now
+        urls = list(urls)
+        resolved = dict()
+        with self.lock:
+            for i in range(0, len(urls), 500):
+                chunk = urls[i:i+500]
+                rows = self.connection.execute("SELECT url, resolved FROM resolutions WHERE expires > ? AND url IN (" + ",".join("?" * len(chunk)) + ")", [now] + chunk)
+                resolved.update(rows.fetchall())
+        return resolved
+
+    # add resolved urls, given as (link, resolved url) pairs
+    def put_many(self, items, now=None):
+        now = time.time() if now is None else now
+        with self.lock, self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO resolutions (url, resolved, expires) VALUES (?, ?, ?)", [(url, resolved, now + self.ttl) for url, resolved in items])
+
+    # remove expired links
+    def purge(self, now=None):
+        now = time.time() if now is None else now
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM resolutions WHERE expires <= ?", (now,))
+
+# cache and session of the current process, set up the first time a link is resolved
+cache = None
+session = None
+
+# helper function to set up the cache, at URL_CACHE_PATH if it is set and in the temporary directory otherwise
+def get_cache():
+    global cache
+    if cache is None:
+        cache = ResolutionCache(os.environ.get("URL_CACHE_PATH", os.path.join(tempfile.gettempdir(), "urls.sqlite")))
+        cache.purge()
+    return cache
+
+# helper function to set up a keep-alive session with a connection for each worker
+def get_session():
+    global session
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+    return session
+
+# helper function to follow the redirects of a link, or None if it cannot be followed
+def resolve(url):
+    try:
+        return get_session().head(url, allow_redirects=True, timeout=5).url
+    except Exception:
+        return None
+
+# unshorten a batch of urls, returning a dict of each url to where it leads
+# only urls shorter than max_short_length are followed, cached links are not followed again, and the rest are followed all at once
+def unshorten_urls(urls):
+    unshortened = dict()
+    short = []
+    for url in dict.fromkeys(urls):
+        if len(url) < max_short_length:
+            short.append(url)
+        else:
+            unshortened[url] = url
+    if len(short) == 0:
+        return unshortened
+    cached = get_cache().get_many(short)
+    unshortened.update(cached)
+    short = [url for url in short if url not in cached]
+    if len(short) > 0:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(workers, len(short))) as executor:
+            resolved = list(executor.map(resolve, short))
+        get_cache().put_many([(url, r) for url, r in zip(short, resolved) if r is not None])
+        for url, r in zip(short, resolved):
+            unshortened[url] = r if r is not None else url
+    return unshortened
+
+# utility to unshorten url
+def unshorten_url(url):
+    return unshorten_urls([url])[url]
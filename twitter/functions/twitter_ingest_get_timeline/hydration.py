@@ -0,0 +1,37 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# build lookups of the users and tweets included with an api response, keyed by id
+def get_lookups(includes):
+    users = {user["id"]: user for user in includes.get("users", [])}
+    tweets = {tweet["id"]: tweet for tweet in includes.get("tweets", [])}
+    return users, tweets
+
+# hydrate a tweet into a doc with its author and the tweets it references, returning the doc and the ids of the referenced tweets
+def hydrate(tweet, users, tweets):
+
+    # construct the document
+    doc = {"tweet": tweet}
+    referenced_ids = []
+
+    # hydrate all the missing parts
+    if "author_id" in tweet:
+        if tweet["author_id"] in users:
+            doc["author"] = users[tweet["author_id"]]
+        else:
+            logger.info(' - '.join(['INFO', 'missing included user for tweet', tweet["id"]]))
+    for tw in tweet.get("referenced_tweets", []):
+        doc[tw["type"]] = dict()
+        referenced_ids.append(tw["id"])
+        if tw["id"] not in tweets:
+            logger.info(' - '.join(['INFO', tw["type"], 'missing included tweet', tw["id"]]))
+            continue
+        doc[tw["type"]]["tweet"] = tweets[tw["id"]]
+        if "author_id" in doc[tw["type"]]["tweet"]:
+            if doc[tw["type"]]["tweet"]["author_id"] in users:
+                doc[tw["type"]]["author"] = users[doc[tw["type"]]["tweet"]["author_id"]]
+            else:
+                logger.info(' - '.join(['INFO', tw["type"], 'missing included user for tweet', tw["id"]]))
+
+    return doc, referenced_ids
@@ -2,10 +2,14 @@ import logging
 from google.cloud import secretmanager
 from google.cloud import firestore
 from google.cloud import pubsub
-from elasticsearch import Elasticsearch, helpers
+from elasticsearch import Elasticsearch
 import requests
 import datetime
 import json
+import bulk
+import hydration
+import queues
+import ratelimits
 
 # format logs
 formatter = '%(asctime)s - %(levelname)s - %(message)s'
@@ -26,6 +30,9 @@ es = Elasticsearch(elastic_host, http_auth=(elastic_username_data, elastic_passw
 db = firestore.Client()
 publisher = pubsub.PublisherClient()
 
+# rate limit windows shared with twitter_ingest_queue_get
+windows = ratelimits.FirestoreWindows(db, db.collection('twitter').document('ratelimits').collection('endpoints'))
+
 # get timeline tweets from user id and update Firestore and ElasticSearch
 def twitter_ingest_get_timeline(message, context):
 
@@ -34,6 +41,7 @@ def twitter_ingest_get_timeline(message, context):
 
     # set up Firestore refs
     ref = db.collection('twitter').document('queues').collection('tweet')
+    queue = queues.QueueWriter(db, ref)
 
     # grab latest cursor data
     userdoc = es.get(index="twitter_users_new", id=id, _source_includes=["cursors"])
@@ -83,6 +91,7 @@ def twitter_ingest_get_timeline(message, context):
 
     # get data from API
     r = requests.get(url, headers=headers)
+    ratelimits.observe(windows, 'timeline', r.status_code, r.headers)
     try:
         assert r.status_code == 200
         response = json.loads(r.text)
@@ -96,6 +105,7 @@ def twitter_ingest_get_timeline(message, context):
 
         data = response.get("data", [])
         includes = response.get("includes", {})
+        users, tweets = hydration.get_lookups(includes)
 
         if direction == "older" and len(data) == 1:
             end = True
@@ -110,28 +120,12 @@ def twitter_ingest_get_timeline(message, context):
             max_id = max(max_id, int(tweet["id"]))
             min_id = min(min_id,int(tweet["id"]))
 
-            # construct the document
-            doc = {"tweet": tweet}
-
-            # hydrate all the missing parts
-            if "author_id" in tweet:
-                doc["author"] = [u for u in includes["users"] if u["id"] == tweet["author_id"]][0]
-            if "referenced_tweets" in tweet:
-                for tw in tweet["referenced_tweets"]:
-                    doc[tw["type"]] = dict()
-                    try:
-                        doc[tw["type"]]["tweet"] = [t for t in includes["tweets"] if t["id"] == tw["id"]][0]
-                    except:
-                        logger.info(' - '.join(['INFO', tw["type"], 'missing included tweet', tw["id"]]))
-                        pass
-                    try:
-                        if "author_id" in doc[tw["type"]]["tweet"]:
-                            doc[tw["type"]]["author"] = [u for u in includes["users"] if u["id"] == doc[tw["type"]]["tweet"]["author_id"]][0]
-                    except:
-                        logger.info(' - '.join(['INFO', tw["type"], 'missing included user for tweet', tw["id"]]))
-                        pass
-                    # also add to the tweets Firestore queue
-                    ref.document(tw["id"]).set({"last_added": datetime.datetime.now(datetime.timezone.utc)})
+            # hydrate the author and referenced tweets
+            doc, referenced_ids = hydration.hydrate(tweet, users, tweets)
+
+            # also add the referenced tweets to the tweets Firestore queue
+            for referenced_id in referenced_ids:
+                queue.add(referenced_id)
 
             # process article links
             if "entities" in doc['tweet']:
@@ -204,7 +198,10 @@ def twitter_ingest_get_timeline(message, context):
     })
 
     # bulk update elasticsearch
-    helpers.bulk(es, actions)
+    bulk.write(es, actions)
     logger.info(' - '.join(['DOCS SYNCED TO ELASTICSEARCH', str(len(actions))]))
 
+    # commit what is left in the queue
+    queue.flush()
+
     return id
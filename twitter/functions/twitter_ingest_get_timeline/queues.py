@@ -0,0 +1,58 @@
+import time
+import datetime
+
+# maximum number of writes Firestore takes in one batch
+max_batch_size = 500
+
+# buffers additions to and removals from a Firestore queue collection and commits them as batched writes
+# a batch is committed once it is full or its oldest operation has waited max_delay seconds, and whatever is left when the writer is closed
+# only the last operation on each id is kept, which is the one Firestore would have ended up with anyway
+class QueueWriter:
+
+    def __init__(self, db, ref, max_batch_size=max_batch_size, max_delay=5):
+        self.db = db
+        self.ref = ref
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.pending = dict()
+        self.started = None
+        self.committed = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    # helper function to buffer an operation on an id, flushing if the batch is full or has waited long enough
+    def push(self, id, op):
+        id = str(id)
+        self.pending.pop(id, None)
+        self.pending[id] = op
+        if self.started is None:
+            self.started = time.monotonic()
+        if len(self.pending) >= self.max_batch_size or time.monotonic() - self.started >= self.max_delay:
+            self.flush()
+
+    # add an id to the queue
+    def add(self, id):
+        self.push(id, {"last_added": datetime.datetime.now(datetime.timezone.utc)})
+
+    # remove an id from the queue
+    def delete(self, id):
+        self.push(id, None)
+
+    # commit everything that is buffered
+    def flush(self):
+        if len(self.pending) == 0:
+            return
+        batch = self.db.batch()
+        for id, op in self.pending.items():
+            if op is None:
+                batch.delete(self.ref.document(id))
+            else:
+                batch.set(self.ref.document(id), op)
+        batch.commit()
+        self.committed += len(self.pending)
+        self.pending = dict()
+        self.started = None
@@ -0,0 +1,93 @@
+import os
+import json
+import unittest
+
+import hydration
+
+testdata = os.path.join(os.path.dirname(os.path.abspath(__file__)), "testdata")
+
+# helper function to load a fixture from testdata
+def load(name):
+    with open(os.path.join(testdata, name)) as f:
+        return json.load(f)
+
+# helper function to reduce a hydrated doc to the ids of the tweets and users in it
+def get_ids(doc):
+    ids = dict()
+    for key, value in doc.items():
+        if key in ["tweet", "author"]:
+            ids[key] = value["id"]
+        else:
+            ids[key] = {k: v["id"] for k, v in value.items()}
+    return ids
+
+# list that counts how many times it is scanned
+class CountingList(list):
+
+    def __init__(self, items):
+        super().__init__(items)
+        self.scans = 0
+
+    def __iter__(self):
+        self.scans += 1
+        return super().__iter__()
+
+class TestHydrate(unittest.TestCase):
+
+    def setUp(self):
+        # a 100-tweet response with 150 included users and 200 included tweets, with references to tweets and users that are not included
+        self.response = load("tweets_response.json")
+        # the docs and queued ids the list-scan hydration in main.py made from the same response
+        self.expected = load("tweets_hydrated.json")
+
+    # helper function to hydrate every tweet of the response
+    def hydrate_all(self, includes):
+        users, tweets = hydration.get_lookups(includes)
+        docs = []
+        referenced_ids = []
+        for tweet in self.response["data"]:
+            doc, ids = hydration.hydrate(tweet, users, tweets)
+            docs.append(doc)
+            referenced_ids.extend(ids)
+        return docs, referenced_ids
+
+    def test_parity(self):
+        docs, referenced_ids = self.hydrate_all(self.response["includes"])
+        self.assertEqual([get_ids(doc) for doc in docs], self.expected["docs"])
+        self.assertEqual(referenced_ids, self.expected["referenced_ids"])
+
+        # the hydrated parts are the included objects themselves
+        included = {("users", user["id"]): user for user in self.response["includes"]["users"]}
+        included.update({("tweets", tweet["id"]): tweet for tweet in self.response["includes"]["tweets"]})
+        for doc in docs:
+            for key, value in doc.items():
+                if key == "author":
+                    self.assertIs(value, included[("users", value["id"])])
+                elif key != "tweet":
+                    for k, v in value.items():
+                        self.assertIs(v, included[("users" if k == "author" else "tweets", v["id"])])
+
+    def test_includes_scanned_once(self):
+        includes = {
+            "users": CountingList(self.response["includes"]["users"]),
+            "tweets": CountingList(self.response["includes"]["tweets"])
+        }
+        self.hydrate_all(includes)
+        self.assertEqual(includes["users"].scans, 1)
+        self.assertEqual(includes["tweets"].scans, 1)
+
+    def test_missing_author(self):
+        tweet = {"id": "1", "author_id": "404", "referenced_tweets": [{"type": "quoted", "id": "2"}]}
+        users, tweets = hydration.get_lookups({"tweets": [{"id": "2", "author_id": "405"}]})
+        doc, referenced_ids = hydration.hydrate(tweet, users, tweets)
+        self.assertEqual(doc, {"tweet": tweet, "quoted": {"tweet": {"id": "2", "author_id": "405"}}})
+        self.assertEqual(referenced_ids, ["2"])
+
+    def test_no_includes(self):
+        tweet = {"id": "1", "author_id": "404", "referenced_tweets": [{"type": "retweeted", "id": "2"}]}
+        doc, referenced_ids = hydration.hydrate(tweet, *hydration.get_lookups({}))
+        self.assertEqual(doc, {"tweet": tweet, "retweeted": {}})
+        self.assertEqual(referenced_ids, ["2"])
+
+if __name__ == "__main__":
+    unittest.main()
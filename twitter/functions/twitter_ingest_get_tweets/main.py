@@ -6,6 +6,10 @@ from elasticsearch import Elasticsearch, helpers
 import requests
 import datetime
 import json
+import hydration
+import queues
+import ratelimits
+import bloom
 
 # format logs
 formatter = '%(asctime)s - %(levelname)s - %(message)s'
@@ -26,6 +30,35 @@ es = Elasticsearch(elastic_host, http_auth=(elastic_username_data, elastic_passw
 db = firestore.Client()
 publisher = pubsub.PublisherClient()
 
+# rate limit windows shared with twitter_ingest_queue_get
+windows = ratelimits.FirestoreWindows(db, db.collection('twitter').document('ratelimits').collection('endpoints'))
+
+# size and false positive rate of the filter of tweet ids known to be on api version 2, set bloom_capacity to 0 to always ask Elasticsearch
+# a false positive skips a tweet that still needs to be downloaded, so the rate is kept low
+bloom_capacity = 1000000
+bloom_error_rate = 0.0001
+
+# ids of tweets known to be on api version 2, kept for the life of the instance
+known_ids = bloom.BloomFilter(bloom_capacity, bloom_error_rate) if bloom_capacity > 0 else None
+
+# helper function to get the ids of a chunk that are not on api version 2 yet, with one request to Elasticsearch for the ids the filter does not know
+def get_new_ids(chunk):
+    global known_ids
+    if known_ids is not None and known_ids.full():
+        known_ids = bloom.BloomFilter(bloom_capacity, bloom_error_rate)
+    candidates = [id for id in chunk if known_ids is None or str(id) not in known_ids]
+    if len(candidates) == 0:
+        return []
+    docs = es.mget(index="twitter_tweets_new", body={"ids": [str(id) for id in candidates]}, _source_includes=["context.api_version"])["docs"]
+    new_ids = []
+    for id, doc in zip(candidates, docs):
+        if doc.get("found") is True and doc["_source"].get("context", {}).get("api_version") == 2:
+            if known_ids is not None:
+                known_ids.add(str(id))
+        else:
+            new_ids.append(id)
+    return new_ids
+
 # get a list of tweets and update Firestore and ElasticSearch
 def twitter_ingest_get_tweets(message, context):
 
@@ -36,14 +69,7 @@ def twitter_ingest_get_tweets(message, context):
     chunk = chunk1 + chunk2 + chunk3
 
     # check to make sure tweets don't already exist
-    new_chunk = []
-    for id in chunk:
-        try:
-            doc = es.get(index="twitter_tweets_new", id=id, _source="context.api_version")
-            if doc["_source"]["context"]["api_version"] != 2:
-                new_chunk.append(id)
-        except:
-            new_chunk.append(id)
+    new_chunk = get_new_ids(chunk)
 
     # create chunk string from new chunk
     chunk_string = json.dumps(new_chunk)
@@ -51,6 +77,7 @@ def twitter_ingest_get_tweets(message, context):
 
     # set up Firestore refs
     ref = db.collection('twitter').document('queues').collection('tweet')
+    queue = queues.QueueWriter(db, ref)
 
     # format API settings
     settings = {
@@ -73,6 +100,7 @@ def twitter_ingest_get_tweets(message, context):
 
     # get data from API
     r = requests.get(url, headers=headers)
+    ratelimits.observe(windows, 'tweets', r.status_code, r.headers)
     try:
         assert r.status_code == 200
         response = json.loads(r.text)
@@ -86,31 +114,16 @@ def twitter_ingest_get_tweets(message, context):
 
         data = response.get("data", [])
         includes = response.get("includes", {})
+        users, tweets = hydration.get_lookups(includes)
 
         for tweet in data:
 
-            # construct the document
-            doc = {"tweet": tweet}
-
-            # hydrate all the missing parts
-            if "author_id" in tweet:
-                doc["author"] = [u for u in includes["users"] if u["id"] == tweet["author_id"]][0]
-            if "referenced_tweets" in tweet:
-                for tw in tweet["referenced_tweets"]:
-                    doc[tw["type"]] = dict()
-                    try:
-                        doc[tw["type"]]["tweet"] = [t for t in includes["tweets"] if t["id"] == tw["id"]][0]
-                    except:
-                        logger.info(' - '.join(['INFO', tw["type"], 'missing included tweet', tw["id"]]))
-                        pass
-                    try:
-                        if "author_id" in doc[tw["type"]]["tweet"]:
-                            doc[tw["type"]]["author"] = [u for u in includes["users"] if u["id"] == doc[tw["type"]]["tweet"]["author_id"]][0]
-                    except:
-                        logger.info(' - '.join(['INFO', tw["type"], 'missing included user for tweet', tw["id"]]))
-                        pass
-                    # also add to the tweets Firestore queue
-                    ref.document(tw["id"]).set({"last_added": datetime.datetime.now(datetime.timezone.utc)})
+            # hydrate the author and referenced tweets
+            doc, referenced_ids = hydration.hydrate(tweet, users, tweets)
+
+            # also add the referenced tweets to the tweets Firestore queue
+            for referenced_id in referenced_ids:
+                queue.add(referenced_id)
 
             # process article links
             if "entities" in doc['tweet']:
@@ -159,11 +172,17 @@ def twitter_ingest_get_tweets(message, context):
         # bulk update elasticsearch
         helpers.bulk(es, actions)
         logger.info(' - '.join(['DOCS SYNCED TO ELASTICSEARCH', str(len(actions)), str(len(new_chunk))]))
+        if known_ids is not None:
+            for tweet in data:
+                known_ids.add(tweet["id"])
 
         if len(data) > 0:
             for i in chunk:
                 # delete from Firestore
-                ref.document(str(i)).delete()
+                queue.delete(i)
             logger.info(' - '.join(['COMPLETED', 'tweets deleted from Firestore', str(len(chunk))]))
 
+    # commit what is left in the queue
+    queue.flush()
+
     return id
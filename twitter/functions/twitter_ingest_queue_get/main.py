@@ -6,6 +6,7 @@ from elasticsearch import Elasticsearch, helpers
 from elasticsearch_dsl import Search
 import datetime
 import json
+import ratelimits
 
 # format logs
 formatter = '%(asctime)s - %(levelname)s - %(message)s'
@@ -25,6 +26,13 @@ es = Elasticsearch(elastic_host, http_auth=(elastic_username_data, elastic_passw
 db = firestore.Client()
 publisher = pubsub.PublisherClient()
 
+# rate limit windows recorded by the get functions
+windows = ratelimits.FirestoreWindows(db, db.collection('twitter').document('ratelimits').collection('endpoints'))
+
+# calls per window the Twitter API allows, used until the get functions have recorded the real limits
+timeline_limit = 1500
+tweets_limit = 300
+
 # utility function to divide rows into batches of n
 def chunks(l, n):
     return [l[i:i + n] for i in range(0, len(l), n)]
@@ -33,12 +41,17 @@ def chunks(l, n):
 def twitter_ingest_queue_get(message, context):
 
     # twitter_ingest_get_timeline
-    # grab 1500 user ids from Elasticsearch and deliver to Pub/Sub to retrieve 100 tweets for each user
+    # grab as many of the least recently updated primary user ids as the rate limit window has room for and deliver to Pub/Sub to retrieve 100 tweets for each user
     # Twitter API limit is 1500 calls per 15 mins
-    s = Search(using=es, index="twitter_users_new")
-    q = s.filter('term', context__primary=True).source(False)
-    docs = q[:1500].sort("context.last_updated").execute()
+    available = ratelimits.get_available(windows, 'timeline', timeline_limit)
     ids = []
+    docs = []
+    if available > 0:
+        s = Search(using=es, index="twitter_users_new")
+        q = s.filter('term', context__primary=True).source(False)
+        docs = q[:available].sort("context.last_updated").execute()
+    else:
+        logger.info(' - '.join(['INFO', 'rate limit window used up', 'twitter_ingest_get_timeline']))
     for doc in docs:
         ids.append(doc.meta.id)
     for id in ids:
@@ -46,15 +59,21 @@ def twitter_ingest_queue_get(message, context):
         topic = 'projects/' + gcp_project_id + '/topics/twitter_ingest_get_timeline'
         publisher.publish(topic, b'get twitter timeline', id=id)
         logger.info(' - '.join(['STATUS', 'id sent to twitter_ingest_get_timeline queue', id]))
+    ratelimits.reserve(windows, 'timeline', len(ids), timeline_limit)
     logger.info(' - '.join(['QUEUED', 'twitter_ingest_get_timeline',str(len(ids))]))
 
     # twitter_ingest_get_tweets
-    # grab up to 30000 tweet ids from Firestore and deliver to Pub/Sub in batches of 100
+    # grab as many tweet ids from Firestore as the rate limit window has room for, up to 30000, and deliver to Pub/Sub in batches of 100
     # Twitter API limit is 300 calls per 15 mins
-    ref = db.collection('twitter').document('queues').collection('tweet')
-    yesteryear = datetime.datetime.now(datetime.timezone.utc)-datetime.timedelta(days=365)
-    docs = ref.where('last_added','>',yesteryear).order_by('last_added').limit(30000).select('id').stream()
+    available = ratelimits.get_available(windows, 'tweets', tweets_limit)
     ids = []
+    docs = []
+    if available > 0:
+        ref = db.collection('twitter').document('queues').collection('tweet')
+        yesteryear = datetime.datetime.now(datetime.timezone.utc)-datetime.timedelta(days=365)
+        docs = ref.where('last_added','>',yesteryear).order_by('last_added').limit(min(available*100, 30000)).select('id').stream()
+    else:
+        logger.info(' - '.join(['INFO', 'rate limit window used up', 'twitter_ingest_get_tweets']))
     for doc in docs:
         ids.append(int(doc.id))
     for chunk in chunks(ids, 100):
@@ -65,6 +84,7 @@ def twitter_ingest_queue_get(message, context):
         topic = 'projects/' + gcp_project_id + '/topics/twitter_ingest_get_tweets'
         publisher.publish(topic, b'get twitter tweets', chunk1=json.dumps(chunk1), chunk2=json.dumps(chunk2), chunk3=json.dumps(chunk3))
         logger.info(' - '.join(['STATUS', 'chunk sent to twitter_ingest_get_tweets queue', str(len(chunk))]))
+    ratelimits.reserve(windows, 'tweets', len(chunks(ids, 100)), tweets_limit)
     logger.info(' - '.join(['QUEUED', 'twitter_ingest_get_tweets', str(len(ids))]))
 
     return True
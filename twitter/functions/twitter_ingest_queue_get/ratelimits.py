@@ -0,0 +1,133 @@
+import copy
+import time
+import threading
+
+from google.cloud import firestore
+
+# length of a Twitter API rate limit window in seconds
+window_seconds = 15 * 60
+
+# responses are only recorded every this many calls, or when the window is nearly used up, to keep writes to each window document low
+record_every = 25
+low_water = 50
+
+# helper function to read the rate limit headers of a response as (limit, remaining, reset), or None if they are missing
+def get_headers(headers):
+    try:
+        return int(headers["x-rate-limit-limit"]), int(headers["x-rate-limit-remaining"]), int(headers["x-rate-limit-reset"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+# helper function to get the calls reserved for a window that has ended but had not shown up by then
+# these were queued late in the window and count against the next one, and calls carried into it already that have still not shown up are dropped
+def get_carried(window):
+    return max(0, window["reserved"] - window.get("carried", 0))
+
+# helper function to fold a response into a window
+# messages reserved for the window are taken off as the calls they stand for show up in the remaining count, oldest first
+# a response from a window that has already ended, like one that was slow to come back, says nothing about the current window
+# once a window is used up the calls still reserved for it are throttled and dropped, so none of them are carried into the next one
+def merge_observation(window, limit, remaining, reset, now=None):
+    now = time.time() if now is None else now
+    if reset <= now:
+        return window
+    if window is not None and window["observed"] is True and reset < window["reset"]:
+        return window
+    if remaining == 0:
+        return {"limit": limit, "remaining": 0, "reset": reset, "reserved": 0, "carried": 0, "observed": True}
+    if window is None:
+        return {"limit": limit, "remaining": remaining, "reset": reset, "reserved": 0, "carried": 0, "observed": True}
+    if window["observed"] is False or reset > window["reset"]:
+        if window["observed"] is False:
+            reserved, carried = window["reserved"], window.get("carried", 0)
+        else:
+            reserved = carried = get_carried(window)
+        consumed = limit - remaining
+        return {"limit": limit, "remaining": remaining, "reset": reset, "reserved": max(0, reserved - consumed), "carried": max(0, carried - consumed), "observed": True}
+    if remaining >= window["remaining"]:
+        return window
+    consumed = window["remaining"] - remaining
+    return dict(window, remaining=remaining, reserved=max(0, window["reserved"] - consumed), carried=max(0, window.get("carried", 0) - consumed))
+
+# helper function to add reserved calls to a window, starting a predicted window if the last one has run out
+def merge_reservation(window, count, default_limit, now):
+    if window is None:
+        return {"limit": default_limit, "remaining": default_limit, "reset": int(now) + window_seconds, "reserved": count, "carried": 0, "observed": False}
+    if now >= window["reset"]:
+        carried = get_carried(window)
+        return {"limit": window["limit"], "remaining": window["limit"], "reset": int(now) + window_seconds, "reserved": count + carried, "carried": carried, "observed": False}
+    return dict(window, reserved=window["reserved"] + count)
+
+# get the number of calls to an endpoint that can still be made in the current window without being throttled
+def get_budget(window, default_limit, now=None):
+    now = time.time() if now is None else now
+    if window is None:
+        return default_limit
+    if now >= window["reset"]:
+        return max(0, window["limit"] - get_carried(window))
+    return max(0, window["remaining"] - window["reserved"])
+
+# rate limit windows of api endpoints kept as documents in Firestore, so every function sees the same quota
+class FirestoreWindows:
+
+    def __init__(self, db, collection):
+        self.db = db
+        self.collection = collection
+
+    # get the window of an endpoint, or None if nothing has been recorded
+    def get(self, endpoint):
+        return self.collection.document(endpoint).get().to_dict()
+
+    # replace the window of an endpoint with merge(window) in a transaction
+    def update(self, endpoint, merge):
+        return update_window(self.db.transaction(), self.collection.document(endpoint), merge)
+
+# helper function to read, merge and write a window in a transaction
+@firestore.transactional
+def update_window(transaction, ref, merge):
+    window = merge(ref.get(transaction=transaction).to_dict())
+    if window is not None:
+        transaction.set(ref, window)
+    return window
+
+# stand-in for FirestoreWindows that keeps windows in memory, for running the scheduler locally and in tests
+class MemoryWindows:
+
+    def __init__(self):
+        self.windows = dict()
+        self.lock = threading.Lock()
+
+    # get the window of an endpoint, or None if nothing has been recorded
+    def get(self, endpoint):
+        with self.lock:
+            return copy.deepcopy(self.windows.get(endpoint))
+
+    # replace the window of an endpoint with merge(window)
+    def update(self, endpoint, merge):
+        with self.lock:
+            self.windows[endpoint] = merge(copy.deepcopy(self.windows.get(endpoint)))
+            return copy.deepcopy(self.windows[endpoint])
+
+# record the rate limit headers of a response to an endpoint
+# only every record_every-th call, calls near the end of the window and throttled calls are written, which is enough to keep the budget close
+def observe(windows, endpoint, status_code, headers, now=None):
+    now = time.time() if now is None else now
+    parsed = get_headers(headers)
+    if parsed is None:
+        return None
+    limit, remaining, reset = parsed
+    if reset <= now:
+        return None
+    if status_code != 429 and remaining > low_water and remaining % record_every != 0:
+        return None
+    return windows.update(endpoint, lambda window: merge_observation(window, limit, remaining, reset, now))
+
+# get how many calls to an endpoint can be queued right now
+def get_available(windows, endpoint, default_limit, now=None):
+    return get_budget(windows.get(endpoint), default_limit, now)
+
+# reserve calls to an endpoint for messages that have been queued
+def reserve(windows, endpoint, count, default_limit, now=None):
+    now = time.time() if now is None else now
+    if count > 0:
+        windows.update(endpoint, lambda window: merge_reservation(window, count, default_limit, now))
@@ -0,0 +1,169 @@
+import heapq
+import random
+import unittest
+
+import ratelimits
+
+# stub of a Twitter api endpoint on a simulated clock, with a window that starts at the first call after the last one ran out
+class StubAPI:
+
+    def __init__(self, limit, window_seconds=ratelimits.window_seconds):
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.reset = None
+        self.remaining = limit
+        self.calls = 0
+        self.throttled = []
+
+    # make a call at a time, returning the status code and rate limit headers of the response
+    def call(self, now):
+        if self.reset is None or now >= self.reset:
+            self.reset = int(now) + self.window_seconds
+            self.remaining = self.limit
+        if self.remaining == 0:
+            self.throttled.append(now)
+            status_code = 429
+        else:
+            self.remaining -= 1
+            self.calls += 1
+            status_code = 200
+        return status_code, {"x-rate-limit-limit": str(self.limit), "x-rate-limit-remaining": str(self.remaining), "x-rate-limit-reset": str(self.reset)}
+
+# run queue_get every minute against the stub for a number of minutes, with each queued call made within delay seconds of being queued
+# arrivals calls are waiting to be queued each minute, or an endless backlog if it is None
+# returns the stub and the number of calls queued each minute
+def simulate(api, default_limit, minutes, delay=55, arrivals=None, seed=0):
+    rng = random.Random(seed)
+    windows = ratelimits.MemoryWindows()
+    calls = []
+    queued = []
+    backlog = 0
+    for minute in range(minutes):
+        now = minute * 60.
+        if arrivals is not None:
+            backlog += arrivals
+
+        # make the calls queued earlier that are due
+        while len(calls) > 0 and calls[0] < now:
+            t = heapq.heappop(calls)
+            status_code, headers = api.call(t)
+            ratelimits.observe(windows, "tweets", status_code, headers, now=t)
+
+        # queue as many calls as the budget allows
+        available = ratelimits.get_available(windows, "tweets", default_limit, now=now)
+        if arrivals is not None:
+            available = min(available, backlog)
+            backlog -= available
+        ratelimits.reserve(windows, "tweets", available, default_limit, now=now)
+        queued.append(available)
+        for i in range(available):
+            heapq.heappush(calls, now + rng.uniform(0, delay))
+
+    return api, queued
+
+# helper function to get the headers of a response
+def get_headers(limit, remaining, reset):
+    return {"x-rate-limit-limit": str(limit), "x-rate-limit-remaining": str(remaining), "x-rate-limit-reset": str(reset)}
+
+class TestRateLimits(unittest.TestCase):
+
+    def test_reserve(self):
+        windows = ratelimits.MemoryWindows()
+        self.assertEqual(ratelimits.get_available(windows, "tweets", 300, now=0), 300)
+        ratelimits.reserve(windows, "tweets", 120, 300, now=0)
+        self.assertEqual(ratelimits.get_available(windows, "tweets", 300, now=10), 180)
+        ratelimits.reserve(windows, "tweets", 180, 300, now=10)
+        self.assertEqual(ratelimits.get_available(windows, "tweets", 300, now=20), 0)
+
+    def test_observe_takes_off_reservations(self):
+        windows = ratelimits.MemoryWindows()
+        ratelimits.reserve(windows, "tweets", 100, 300, now=0)
+        ratelimits.observe(windows, "tweets", 200, get_headers(300, 275, 900), now=5)
+        self.assertEqual(windows.get("tweets")["reserved"], 75)
+        self.assertEqual(ratelimits.get_available(windows, "tweets", 300, now=5), 200)
+        ratelimits.observe(windows, "tweets", 200, get_headers(300, 225, 900), now=10)
+        self.assertEqual(windows.get("tweets")["reserved"], 25)
+        self.assertEqual(ratelimits.get_available(windows, "tweets", 300, now=10), 200)
+
+    def test_observe_only_records_some_calls(self):
+        windows = ratelimits.MemoryWindows()
+        self.assertIsNone(ratelimits.observe(windows, "tweets", 200, get_headers(300, 299, 900), now=0))
+        self.assertIsNone(windows.get("tweets"))
+        self.assertIsNotNone(ratelimits.observe(windows, "tweets", 200, get_headers(300, 275, 900), now=0))
+        self.assertIsNotNone(ratelimits.observe(windows, "tweets", 200, get_headers(300, 49, 900), now=0))
+        self.assertEqual(windows.get("tweets")["remaining"], 49)
+
+    def test_window_rollover(self):
+        windows = ratelimits.MemoryWindows()
+        ratelimits.observe(windows, "tweets", 200, get_headers(300, 0, 900), now=100)
+        self.assertEqual(ratelimits.get_available(windows, "tweets", 1500, now=899), 0)
+        self.assertEqual(ratelimits.get_available(windows, "tweets", 1500, now=900), 300)
+        ratelimits.reserve(windows, "tweets", 50, 1500, now=900)
+        window = windows.get("tweets")
+        self.assertEqual((window["limit"], window["reserved"], window["observed"], window["reset"]), (300, 50, False, 1800))
+        ratelimits.observe(windows, "tweets", 200, get_headers(300, 275, 1850), now=950)
+        window = windows.get("tweets")
+        self.assertEqual((window["remaining"], window["reserved"], window["observed"], window["reset"]), (275, 25, True, 1850))
+
+    def test_reservations_carry_over_once(self):
+        windows = ratelimits.MemoryWindows()
+        ratelimits.observe(windows, "tweets", 200, get_headers(300, 100, 900), now=0)
+        ratelimits.reserve(windows, "tweets", 60, 300, now=850)
+        self.assertEqual(ratelimits.get_available(windows, "tweets", 300, now=900), 240)
+        ratelimits.reserve(windows, "tweets", 10, 300, now=900)
+        window = windows.get("tweets")
+        self.assertEqual((window["reserved"], window["carried"], window["reset"]), (70, 60, 1800))
+        self.assertEqual(ratelimits.get_available(windows, "tweets", 300, now=1800), 290)
+        ratelimits.observe(windows, "tweets", 200, get_headers(300, 275, 1830), now=930)
+        window = windows.get("tweets")
+        self.assertEqual((window["reserved"], window["carried"]), (45, 35))
+        self.assertEqual(ratelimits.get_available(windows, "tweets", 300, now=1830), 290)
+
+    def test_used_up_window_drops_reservations(self):
+        windows = ratelimits.MemoryWindows()
+        ratelimits.reserve(windows, "tweets", 1500, 1500, now=0)
+        ratelimits.observe(windows, "tweets", 429, get_headers(300, 0, 900), now=30)
+        window = windows.get("tweets")
+        self.assertEqual((window["limit"], window["reserved"], window["carried"]), (300, 0, 0))
+        self.assertEqual(ratelimits.get_available(windows, "tweets", 1500, now=900), 300)
+
+    def test_stale_observation(self):
+        windows = ratelimits.MemoryWindows()
+        self.assertIsNone(ratelimits.observe(windows, "tweets", 200, get_headers(300, 0, 900), now=900))
+        self.assertIsNone(windows.get("tweets"))
+        ratelimits.observe(windows, "tweets", 200, get_headers(300, 275, 1800), now=950)
+        ratelimits.observe(windows, "tweets", 429, get_headers(300, 0, 900), now=960)
+        self.assertEqual(windows.get("tweets")["remaining"], 275)
+
+    def test_throttled(self):
+        windows = ratelimits.MemoryWindows()
+        ratelimits.observe(windows, "tweets", 200, get_headers(300, 250, 900), now=0)
+        ratelimits.observe(windows, "tweets", 429, get_headers(300, 0, 900), now=10)
+        self.assertEqual(ratelimits.get_available(windows, "tweets", 300, now=10), 0)
+        self.assertEqual(ratelimits.get_available(windows, "tweets", 300, now=900), 300)
+
+    def test_simulation_stays_under_the_limit(self):
+        api, queued = simulate(StubAPI(300), 300, 180)
+        self.assertEqual(api.throttled, [])
+        self.assertGreaterEqual(api.calls, 0.9 * 300 * 180 / 15)
+
+    def test_simulation_with_late_calls(self):
+        api, queued = simulate(StubAPI(300), 300, 180, delay=180)
+        self.assertEqual(api.throttled, [])
+        self.assertGreaterEqual(api.calls, 0.75 * 300 * 180 / 15)
+
+    def test_simulation_with_steady_arrivals(self):
+        for delay in (55, 180):
+            for arrivals in (10, 20, 25):
+                api, queued = simulate(StubAPI(300), 300, 600, delay=delay, arrivals=arrivals)
+                self.assertEqual(api.throttled, [])
+                self.assertGreaterEqual(api.calls, 0.95 * min(arrivals * 600, 300 * 600 / 15))
+
+    def test_simulation_learns_the_limit(self):
+        api, queued = simulate(StubAPI(300), 1500, 180)
+        self.assertLess(max(api.throttled), ratelimits.window_seconds)
+        self.assertLessEqual(max(queued[15:]), 300)
+        self.assertGreaterEqual(api.calls, 0.9 * 300 * 180 / 15)
+
+if __name__ == "__main__":
+    unittest.main()